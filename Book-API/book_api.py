@@ -1,65 +1,416 @@
 # book_api.py - fetches books from API and dumps them into sqlite
 
+import os
+import sys
+import argparse
 import sqlite3
 import requests
 import json
+import hashlib
 import logging
+import time
+import queue
+import threading
+from itertools import islice
+from collections.abc import Mapping
 from typing import List, Dict
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+
+from db_connections import ConnectionManager, DEFAULT_PRAGMAS
+from http_client import ConcurrentFetcher, make_session
+from request_control import RequestController
+from http_cache import ResponseCache
+from metrics import metrics
+from query_cache import QueryCache
+from records import Book
+
 # logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+UPSERT_BOOK_SQL = """
+    INSERT OR REPLACE INTO books (title, author, year, description, content_hash)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# used by sync_books - plain INSERT/UPDATE so unchanged rows are never touched
+# and updated rows keep their created_at
+INSERT_BOOK_SQL = """
+    INSERT INTO books (title, author, year, description, content_hash)
+    VALUES (?, ?, ?, ?, ?)
+"""
+UPDATE_BOOK_SQL = """
+    UPDATE books SET author = ?, year = ?, description = ?, content_hash = ?
+    WHERE title = ?
+"""
+
+# values sqlite can bind as-is
+SQL_VALUE_TYPES = (str, int, float, bytes, type(None))
+
+# secondary indexes for query_books. each one holds title, author and year,
+# so every supported filter/order combination is answered from an index
+# alone without touching the table rows
+QUERY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_books_author_year ON books (author, year, title)",
+    "CREATE INDEX IF NOT EXISTS idx_books_year ON books (year, title, author)",
+    "CREATE INDEX IF NOT EXISTS idx_books_title ON books (title, author, year)",
+]
+
+# order_by values query_books accepts -> ORDER BY columns
+QUERY_ORDERS = {
+    'title': ['title'],
+    'author': ['author', 'year', 'title'],
+    'year': ['year', 'title'],
+}
+
+# full-text index over title + description, only set up with
+# BookAPI(search=True). it's an external content table, so the text lives
+# only in books and these triggers keep the index in step. INSERT OR REPLACE
+# only fires the delete trigger with recursive_triggers on, which BookAPI
+# always sets.
+SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, description, content='books', content_rowid='rowid'
+    )
+"""
+SEARCH_TRIGGERS = {
+    'books_fts_insert': """
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, description)
+            VALUES (new.rowid, new.title, new.description);
+        END
+    """,
+    'books_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, description)
+            VALUES ('delete', old.rowid, old.title, old.description);
+        END
+    """,
+    'books_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, description ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, description)
+            VALUES ('delete', old.rowid, old.title, old.description);
+            INSERT INTO books_fts (rowid, title, description)
+            VALUES (new.rowid, new.title, new.description);
+        END
+    """,
+}
+
+# change log for incremental snapshot exports (common/snapshot.py), only
+# set up with BookAPI(change_log=True). books are updated and deleted in
+# place (store_books replaces, sync_books updates, full_snapshot deletes),
+# so it keeps one row per title holding the sequence number of its last
+# change.
+_LOG_TITLE = ("INSERT INTO books_changes (title) VALUES ({row}.title) "
+              "ON CONFLICT(title) DO UPDATE SET seq = (SELECT MAX(seq) FROM books_changes) + 1;")
+
+CHANGE_LOG_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS books_changes (seq INTEGER PRIMARY KEY, title TEXT NOT NULL UNIQUE)",
+    "CREATE TRIGGER IF NOT EXISTS books_changes_insert AFTER INSERT ON books "
+    "WHEN NEW.title IS NOT NULL BEGIN " + _LOG_TITLE.format(row='NEW') + " END",
+    "CREATE TRIGGER IF NOT EXISTS books_changes_update AFTER UPDATE ON books "
+    "WHEN NEW.title IS NOT NULL BEGIN " + _LOG_TITLE.format(row='NEW') + " END",
+    "CREATE TRIGGER IF NOT EXISTS books_changes_rename AFTER UPDATE OF title ON books "
+    "WHEN OLD.title IS NOT NULL AND OLD.title IS NOT NEW.title BEGIN " + _LOG_TITLE.format(row='OLD') + " END",
+    "CREATE TRIGGER IF NOT EXISTS books_changes_delete AFTER DELETE ON books "
+    "WHEN OLD.title IS NOT NULL BEGIN " + _LOG_TITLE.format(row='OLD') + " END",
+]
+
+class _ProducerFailed:
+    # what _prefetched's producer sends instead of an item when it dies
+    def __init__(self, error):
+        self.error = error
+
+
+def _prefetched(iterable, maxsize):
+    # run the iterable in a background thread and hand items over through a
+    # bounded queue - the producer blocks when the consumer falls behind.
+    # an exception in the producer is raised again in the consumer, and a
+    # consumer that stops early (an error, or just not reading any more)
+    # sets `stop` so the producer gives up instead of blocking forever
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_ProducerFailed(e))
+        else:
+            put(done)
+    
+    worker = threading.Thread(target=produce, name='book-prefetch', daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            if isinstance(item, _ProducerFailed):
+                raise item.error
+            yield item
+        worker.join()
+    finally:
+        stop.set()
+
+
 class BookAPI:
     # this class does the heavy lifting for book stuff
     
-    def __init__(self, db_path="books.db", api_url=None):
+    def __init__(self, db_path="books.db", api_url=None, pragmas=None, cache=None,
+                 read_cache_size=128, http=None, search=False, change_log=False):
         self.db_path = db_path
         # using jsonplaceholder since we don't have a real book API
         self.api_url = api_url or "https://jsonplaceholder.typicode.com/posts"
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        # needed so REPLACE fires the delete triggers of the search index
+        # and change log, in databases that have them
+        self.pragmas['recursive_triggers'] = 'ON'
+        if pragmas:
+            self.pragmas.update(pragmas)
+        # one writer + a few readers, kept open for the life of the object
+        self.db = ConnectionManager(db_path, pragmas=self.pragmas)
+        # results of the read methods, dropped whenever the database changes
+        # (read_cache_size=0 turns it off)
+        self.read_cache = QueryCache(self.db, max_entries=read_cache_size, name='books')
+        # keep-alive session shared by every fetch method
+        self.session = make_session()
+        # retries/backoff, adaptive concurrency and a circuit breaker on top of it
+        self.http = http or RequestController(self.session)
+        # optional ResponseCache - when set, fetch_books_from_api does a
+        # conditional GET and last_fetch_unchanged says if upstream changed
+        self.cache = cache
+        self.last_fetch_unchanged = False
+        # the response behind the last fetch_books_from_api, for
+        # commit_fetch() once its books are stored
+        self.last_response = None
+        # search=True sets up the full-text index; it costs every write an
+        # index update, so it's off unless asked for. search_enabled is also
+        # true for a database that already has the index
+        self.search_requested = search
+        self.search_enabled = False
+        # change_log=True keeps books_changes for incremental snapshot
+        # exports - another write per changed row, so also off unless asked
+        # for (or already there)
+        self.change_log_requested = change_log
+        self.change_log_enabled = False
         self.init_database()
     
     def init_database(self):
         # create the books table - basic schema
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            # using title as primary key so we can easily handle duplicates
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS books (
-                    title TEXT PRIMARY KEY,
-                    author TEXT,
-                    year INTEGER,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.commit()
-            conn.close()
+            with self.db.writer() as conn:
+                # using title as primary key so we can easily handle duplicates
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS books (
+                        title TEXT PRIMARY KEY,
+                        author TEXT,
+                        year INTEGER,
+                        description TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        content_hash TEXT
+                    )
+                """)
+                # older databases don't have the content_hash column yet
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(books)")]
+                if 'content_hash' not in columns:
+                    conn.execute("ALTER TABLE books ADD COLUMN content_hash TEXT")
+                    logger.info("Added content_hash column to books table")
+                for statement in QUERY_INDEXES:
+                    conn.execute(statement)
+                self._init_search(conn)
+                self._init_change_log(conn)
             logger.info("Database initialized successfully")
         except sqlite3.Error as e:
             logger.error(f"Database error: {e}")
             raise
     
+    def _init_search(self, conn):
+        # set up the FTS5 search index if it was asked for (or is already
+        # there) and this sqlite build has FTS5
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'").fetchone()
+        if not existed and not self.search_requested:
+            return
+        try:
+            conn.execute("CREATE VIRTUAL TABLE temp.fts5_check USING fts5(x)")
+            conn.execute("DROP TABLE temp.fts5_check")
+        except sqlite3.OperationalError:
+            logger.warning("SQLite was built without FTS5, search is disabled")
+            return
+        
+        conn.execute(SEARCH_TABLE)
+        for statement in SEARCH_TRIGGERS.values():
+            conn.execute(statement)
+        if not existed:
+            # database from before search was turned on - index what's already there
+            conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+        self.search_enabled = True
+    
+    def _init_change_log(self, conn):
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_changes'").fetchone()
+        if not existed and not self.change_log_requested:
+            return
+        for statement in CHANGE_LOG_SCHEMA:
+            conn.execute(statement)
+        self.change_log_enabled = True
+    
+    def rebuild_search_index(self):
+        """
+        Rebuild the full-text index from the books table. Run this if the
+        index ever gets out of step, e.g. after a VACUUM (which can renumber
+        the rowids the index points at).
+        """
+        if not self.search_enabled:
+            logger.warning("Search is not enabled (BookAPI(search=True)), nothing to rebuild")
+            return
+        with self.db.writer() as conn:
+            conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+        logger.info("Search index rebuilt")
+    
+    def search(self, query, limit=10, offset=0):
+        """
+        Full-text search over titles and descriptions.
+        
+        query uses FTS5 syntax ('dragon', 'dragon AND fire', '"exact phrase"',
+        'drag*', 'title:dragon'). Returns up to limit matches, best first by
+        bm25, as dicts with title/author/year, the bm25 score (lower is
+        better) and a snippet with the matched words in [brackets].
+        """
+        if not self.search_enabled:
+            logger.warning("Search is not enabled (BookAPI(search=True)) or not available in this SQLite build")
+            return []
+        try:
+            return self.read_cache.get(('search', query, limit, offset),
+                                       lambda: self._search(query, limit, offset))
+        except sqlite3.OperationalError as e:
+            # usually a typo in the query syntax
+            logger.error(f"Search failed for {query!r}: {e}")
+            return []
+    
+    def _search(self, query, limit, offset):
+        with metrics.timer('sqlite_seconds', pipeline='books', op='search'), self.db.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute("""
+                SELECT b.title, b.author, b.year,
+                       snippet(books_fts, -1, '[', ']', '...', 12) AS snippet,
+                       bm25(books_fts) AS score
+                FROM books_fts
+                JOIN books b ON b.rowid = books_fts.rowid
+                WHERE books_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """, (query, limit, offset))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def _build_book_query(self, author=None, year_from=None, year_to=None,
+                          order_by='title', descending=False, limit=None, offset=0):
+        # returns (sql, params) for query_books - split out so tests can EXPLAIN it
+        if order_by not in QUERY_ORDERS:
+            raise ValueError(f"order_by must be one of {sorted(QUERY_ORDERS)}, not {order_by!r}")
+        
+        conditions = []
+        params = []
+        if author is not None:
+            authors = [author] if isinstance(author, str) else list(author)
+            conditions.append(f"author IN ({','.join('?' * len(authors))})")
+            params.extend(authors)
+        if year_from is not None:
+            conditions.append("year >= ?")
+            params.append(year_from)
+        if year_to is not None:
+            conditions.append("year <= ?")
+            params.append(year_to)
+        
+        # without stats the planner sometimes prefers walking the title index
+        # over a range search, so pin the index that matches the filter
+        if author is not None:
+            source = "books INDEXED BY idx_books_author_year"
+        elif year_from is not None or year_to is not None:
+            source = "books INDEXED BY idx_books_year"
+        else:
+            source = "books"
+        
+        direction = " DESC" if descending else ""
+        order = ", ".join(column + direction for column in QUERY_ORDERS[order_by])
+        
+        sql = f"SELECT title, author, year FROM {source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order} LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset])
+        return sql, params
+    
+    def query_books(self, author=None, year_from=None, year_to=None,
+                    order_by='title', descending=False, limit=None, offset=0):
+        """
+        Filter books by author and/or an inclusive year range.
+        
+        author can be one name or a list of names. order_by is 'title',
+        'author' (author, year, title) or 'year' (year, title), optionally
+        descending. Returns Book records with title, author and year only - those
+        columns are in every query index, so the table itself is never read
+        (use get_all_books/search for descriptions).
+        """
+        sql, params = self._build_book_query(author, year_from, year_to, order_by,
+                                             descending, limit, offset)
+        try:
+            return self.read_cache.get(('query_books', sql, tuple(params)),
+                                       lambda: self._run_query(sql, params))
+        except sqlite3.Error as e:
+            logger.error(f"Database error during query: {e}")
+            return []
+    
+    def _run_query(self, sql, params):
+        with metrics.timer('sqlite_seconds', pipeline='books', op='query'), self.db.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            cursor.row_factory = Book.row_factory(cursor)
+            return cursor.fetchall()
+    
     def fetch_books_from_api(self):
         # get books from the API - this is the main function
+        self.last_fetch_unchanged = False
+        self.last_response = None
         try:
             logger.info(f"Fetching data from {self.api_url}")
-            response = requests.get(self.api_url, timeout=10)
-            response.raise_for_status()
+            with metrics.timer('stage_seconds', pipeline='books', stage='fetch'):
+                if self.cache is not None:
+                    # not cached until commit_fetch(), i.e. until it's stored
+                    response = self.last_response = self.cache.get(self.http, self.api_url,
+                                                                   timeout=10, defer=True)
+                else:
+                    response = self.http.get(self.api_url, timeout=10)
+                    response.raise_for_status()
+            if self.cache is not None and response.not_modified:
+                # same payload as last run - no point parsing or storing it
+                logger.info("Books unchanged upstream, nothing to do")
+                self.last_fetch_unchanged = True
+                return []
             
-            raw_data = response.json()
-            
-            books = []
-            #only take first 10 to keep it manageable
-            for item in raw_data[:10]:
-                book = {
-                    'title': item.get('title', 'Unknown Title'),
-                    'author': f"Author {item.get('userId', 'Unknown')}",  # making up authors
-                    'year': 2020 + (item.get('id', 1) % 4),  # random years
-                    'description': item.get('body', 'No description available')
-                }
-                books.append(book)
+            with metrics.timer('stage_seconds', pipeline='books', stage='parse'):
+                raw_data = response.json()
+                
+                books = []
+                #only take first 10 to keep it manageable
+                for item in raw_data[:10]:
+                    books.append(self._map_book(item))
+            metrics.inc('rows_fetched_total', len(books), pipeline='books')
             
             logger.info(f"Successfully fetched {len(books)} books")
             return books
@@ -71,6 +422,166 @@ class BookAPI:
             logger.error(f"Failed to parse JSON response: {e}")
             return []
     
+    def _map_book(self, item):
+        # turn one upstream post into a book record
+        return Book(
+            title=item.get('title', 'Unknown Title'),
+            author=f"Author {item.get('userId', 'Unknown')}",  # making up authors
+            year=2020 + (item.get('id', 1) % 4),  # random years
+            description=item.get('body', 'No description available')
+        )
+    
+    def _page_params(self, pagination, page, offset, cursor, page_size):
+        if pagination == 'page':
+            return {'_page': page, '_limit': page_size}
+        if pagination == 'offset':
+            return {'_start': offset, '_limit': page_size}
+        if pagination == 'cursor':
+            params = {'limit': page_size}
+            if cursor is not None:
+                params['cursor'] = cursor
+            return params
+        raise ValueError(f"Unknown pagination mode: {pagination}")
+    
+    def iter_books_from_api(self, page_size=100, pagination='page', max_pages=None):
+        """
+        Generator version of fetch_books_from_api with no 10 book cap.
+        
+        Pages through the endpoint one request at a time and yields mapped
+        Book records as it goes, so only one page is ever held in memory.
+        
+        pagination can be:
+            'page'   - ?_page=N&_limit=size (jsonplaceholder style)
+            'offset' - ?_start=N&_limit=size
+            'cursor' - ?cursor=X&limit=size, response is
+                       {'data': [...], 'next_cursor': X or null}
+        
+        Stops on an empty/short page, a missing next cursor or max_pages. An
+        API error that outlasts the retries in self.http is logged and
+        raised, so a feed that was cut short never looks complete: a
+        store_books_bulk/ingest_from_api or sync_books(full_snapshot=True)
+        consuming it rolls back instead of committing (or deleting) on the
+        strength of part of the feed.
+        """
+        page = 1
+        offset = 0
+        cursor = None
+        total = 0
+        
+        while max_pages is None or page <= max_pages:
+            params = self._page_params(pagination, page, offset, cursor, page_size)
+            try:
+                logger.info(f"Fetching page {page} from {self.api_url}")
+                with metrics.timer('stage_seconds', pipeline='books', stage='fetch'):
+                    response = self.http.get(self.api_url, params=params, timeout=10)
+                    response.raise_for_status()
+                with metrics.timer('stage_seconds', pipeline='books', stage='parse'):
+                    payload = response.json()
+            except requests.RequestException as e:
+                logger.error(f"API request failed on page {page}: {e}")
+                raise
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to parse JSON response on page {page}: {e}")
+                raise
+            
+            if pagination == 'cursor' and isinstance(payload, dict):
+                items = payload.get('data') or []
+                cursor = payload.get('next_cursor')
+            else:
+                items = payload
+            
+            for item in items:
+                yield self._map_book(item)
+            total += len(items)
+            metrics.inc('rows_fetched_total', len(items), pipeline='books')
+            
+            # drop our reference before the next request so the page can be freed
+            del payload
+            
+            if not items:
+                break
+            if pagination == 'cursor':
+                if cursor is None:
+                    break
+            elif len(items) < page_size:
+                break
+            
+            page += 1
+            offset += len(items)
+        
+        logger.info(f"Finished streaming {total} books from API")
+    
+    def fetch_books_concurrently(self, urls=None, pages=None, page_size=100,
+                                 max_workers=8, per_host_limit=4):
+        """
+        Fetch several sources at once and merge them into one list of books.
+        
+        Pass either urls (a list of endpoints/shards, each returning a list of
+        posts) or pages (page numbers of self.api_url, e.g. range(1, 11)).
+        Requests run on a thread pool over the shared session, at most
+        per_host_limit at a time per host. The result is always in input
+        order - source by source, then item by item - no matter which request
+        finished first. Sources that fail are logged and skipped.
+        """
+        if urls is not None:
+            requests_list = list(urls)
+        elif pages is not None:
+            requests_list = [(self.api_url, {'_page': page, '_limit': page_size}) for page in pages]
+        else:
+            requests_list = [self.api_url]
+        
+        fetcher = ConcurrentFetcher(self.session, max_workers=max_workers,
+                                    per_host_limit=per_host_limit, http=self.http)
+        logger.info(f"Fetching {len(requests_list)} sources concurrently")
+        results = fetcher.fetch_all(requests_list)
+        
+        books = []
+        with metrics.timer('stage_seconds', pipeline='books', stage='parse'):
+            for payload in results:
+                if not payload:
+                    continue
+                for item in payload:
+                    books.append(self._map_book(item))
+        metrics.inc('rows_fetched_total', len(books), pipeline='books')
+        
+        logger.info(f"Successfully fetched {len(books)} books from {len(requests_list)} sources")
+        return books
+    
+    def commit_fetch(self, stored=True):
+        """
+        Tell the response cache whether the last fetch_books_from_api made
+        it into the database. Stored: the response is cached and an
+        unchanged feed is a 304 next time. Not stored: it's dropped, so the
+        next run fetches (and stores) it in full.
+        """
+        if self.cache is None or self.last_response is None:
+            return
+        if stored:
+            self.cache.commit(self.last_response)
+        else:
+            self.cache.invalidate(self.api_url)
+        self.last_response = None
+    
+    def ingest_from_api(self, page_size=100, pagination='page', max_pages=None,
+                        chunk_size=1000, prefetch=True):
+        """
+        Stream books straight from the API into the database.
+        
+        store_books_bulk pulls records from iter_books_from_api chunk by chunk.
+        With prefetch on, the fetching runs in a background thread feeding a
+        bounded queue (about two pages deep), so the next page downloads while
+        the current chunk is being written and memory stays flat however big
+        the feed is.
+        
+        Everything is written in one transaction, so if a page fails the
+        error is raised and nothing from this feed is stored.
+        """
+        books = self.iter_books_from_api(page_size=page_size, pagination=pagination,
+                                         max_pages=max_pages)
+        if prefetch:
+            books = _prefetched(books, maxsize=page_size * 2)
+        return self.store_books_bulk(books, chunk_size=chunk_size)
+    
     def store_books(self, books):
         # save books to database
         if not books:
@@ -78,28 +589,21 @@ class BookAPI:
             return 0
         
         stored_count = 0
+        started = time.perf_counter()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with metrics.timer('sqlite_seconds', pipeline='books', op='store'), self.db.writer() as conn:
+                cursor = conn.cursor()
+                
+                for book in books:
+                    try:
+                        # INSERT OR REPLACE is perfect for handling duplicates
+                        cursor.execute(UPSERT_BOOK_SQL, self._book_params(book))
+                        stored_count += 1
+                    except sqlite3.Error as e:
+                        metrics.inc('rows_skipped_total', pipeline='books', reason='db_error')
+                        logger.error(f"Failed to store book '{book.get('title', 'Unknown')}': {e}")
             
-            for book in books:
-                try:
-                    # INSERT OR REPLACE is perfect for handling duplicates
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO books (title, author, year, description)
-                        VALUES (?, ?, ?, ?)
-                    """, (
-                        book.get('title', ''),
-                        book.get('author', ''),
-                        book.get('year', None),
-                        book.get('description', '')
-                    ))
-                    stored_count += 1
-                except sqlite3.Error as e:
-                    logger.error(f"Failed to store book '{book.get('title', 'Unknown')}': {e}")
-            
-            conn.commit()
-            conn.close()
+            self._record_store(stored_count, time.perf_counter() - started)
             logger.info(f"Successfully stored {stored_count} books")
             
         except sqlite3.Error as e:
@@ -108,21 +612,232 @@ class BookAPI:
         
         return stored_count
     
+    def _book_params(self, book):
+        # turn a book dict into the tuple UPSERT_BOOK_SQL expects
+        values = (
+            book.get('title', ''),
+            book.get('author', ''),
+            book.get('year', None),
+            book.get('description', '')
+        )
+        return values + (self._content_hash(values),)
+    
+    def _content_hash(self, values):
+        # fingerprint of a book's contents, lets sync_books spot unchanged rows
+        raw = json.dumps(values, default=str, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def _existing_hashes(self, conn, titles, batch=500):
+        # content hashes for the given titles that are already in the table
+        titles = list(titles)
+        hashes = {}
+        # stay under sqlite's bound variable limit
+        for i in range(0, len(titles), batch):
+            part = titles[i:i + batch]
+            marks = ",".join("?" * len(part))
+            hashes.update(conn.execute(
+                f"SELECT title, content_hash FROM books WHERE title IN ({marks})", part))
+        return hashes
+    
+    def sync_books(self, books, full_snapshot=False, chunk_size=1000):
+        """
+        Incremental alternative to store_books.
+        
+        Compares each book's content hash with the one stored for its title
+        and only writes what actually changed: new titles are inserted,
+        changed ones updated in place (created_at is kept), unchanged ones
+        are skipped without any write at all.
+        
+        With full_snapshot=True the books are treated as the complete
+        catalog, and titles in the table that weren't in it get deleted. A
+        record that fails validation still counts as present, so its stored
+        row is left alone; if one's title can't be read at all, nothing is
+        deleted.
+        
+        Returns a dict of inserted/updated/unchanged/deleted/failed counts.
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'failed': 0}
+        untitled_failures = False
+        
+        started = time.perf_counter()
+        try:
+            with metrics.timer('sqlite_seconds', pipeline='books', op='sync'), self.db.writer() as conn:
+                cursor = conn.cursor()
+                if full_snapshot:
+                    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS sync_seen (title TEXT PRIMARY KEY)")
+                    cursor.execute("DELETE FROM sync_seen")
+                
+                books = iter(books)
+                while True:
+                    chunk = list(islice(books, chunk_size))
+                    if not chunk:
+                        break
+                    
+                    rows = []
+                    seen_failed = []
+                    for book in chunk:
+                        try:
+                            params = self._book_params(book)
+                        except (AttributeError, TypeError):
+                            params = None
+                        if (params is None or params[0] is None
+                                or not all(isinstance(v, SQL_VALUE_TYPES) for v in params)):
+                            counts['failed'] += 1
+                            title = book.get('title') if isinstance(book, Mapping) else None
+                            logger.error(f"Failed to sync book '{title or 'Unknown'}': not a valid book record")
+                            if full_snapshot:
+                                # still in the feed - a bad record mustn't delete its stored row
+                                if isinstance(title, str):
+                                    seen_failed.append((title,))
+                                elif title is not None or not isinstance(book, Mapping):
+                                    untitled_failures = True
+                            continue
+                        rows.append(params)
+                    
+                    existing = self._existing_hashes(cursor, {row[0] for row in rows})
+                    to_insert = []
+                    to_update = []
+                    for title, author, year, description, content_hash in rows:
+                        if title not in existing:
+                            to_insert.append((title, author, year, description, content_hash))
+                            counts['inserted'] += 1
+                        elif existing[title] != content_hash:
+                            to_update.append((author, year, description, content_hash, title))
+                            counts['updated'] += 1
+                        else:
+                            counts['unchanged'] += 1
+                        # a title showing up twice in the feed compares against its latest version
+                        existing[title] = content_hash
+                    
+                    # inserts first - a title inserted and then changed in the same chunk
+                    # needs the row to exist before the update
+                    cursor.executemany(INSERT_BOOK_SQL, to_insert)
+                    cursor.executemany(UPDATE_BOOK_SQL, to_update)
+                    if full_snapshot:
+                        cursor.executemany("INSERT OR IGNORE INTO sync_seen VALUES (?)",
+                                           [(row[0],) for row in rows] + seen_failed)
+                
+                if full_snapshot:
+                    if untitled_failures:
+                        # no telling which stored rows those records were, so delete nothing
+                        logger.warning("Some records without a usable title failed, "
+                                       "skipping the delete step of this snapshot")
+                    else:
+                        cursor.execute("DELETE FROM books WHERE title NOT IN (SELECT title FROM sync_seen)")
+                        counts['deleted'] = cursor.rowcount
+                    cursor.execute("DROP TABLE sync_seen")
+        except sqlite3.Error as e:
+            logger.error(f"Database error during sync: {e}")
+            raise
+        
+        self._record_store(counts['inserted'] + counts['updated'], time.perf_counter() - started)
+        metrics.inc('rows_skipped_total', counts['unchanged'], pipeline='books', reason='unchanged')
+        metrics.inc('rows_skipped_total', counts['failed'], pipeline='books', reason='invalid_record')
+        
+        logger.info(f"Synced books: {counts['inserted']} inserted, {counts['updated']} updated, "
+                    f"{counts['unchanged']} unchanged, {counts['deleted']} deleted, "
+                    f"{counts['failed']} failed")
+        return counts
+    
+    def store_books_bulk(self, books, chunk_size=1000, defer_search=False):
+        """
+        Bulk version of store_books for big feeds.
+        
+        Takes any iterable of book dicts (a list, a generator, ...) and writes
+        them with executemany in chunks of chunk_size, all inside one
+        transaction. Same title = overwrite, just like store_books. If a chunk
+        fails it gets rolled back and retried row by row so the bad rows are
+        counted and logged individually.
+        
+        With defer_search=True and the search index enabled, its triggers are
+        dropped for the transaction and the index is rebuilt once at the end
+        instead of being updated row by row. The rebuild reads the whole
+        table, so this pays off when the feed is a big part of it (an initial
+        load, a full refresh). The triggers are back when the transaction
+        commits or rolls back.
+        
+        Returns a dict with stored/failed counts, elapsed seconds and rows/sec.
+        """
+        stored_count = 0
+        failed_count = 0
+        started = time.perf_counter()
+        
+        try:
+            # the writer runs in autocommit mode with an explicit BEGIN, so we
+            # can wrap each chunk in its own savepoint
+            with metrics.timer('sqlite_seconds', pipeline='books', op='store'), self.db.writer() as conn:
+                cursor = conn.cursor()
+                deferred = defer_search and self.search_enabled
+                if deferred:
+                    for name in SEARCH_TRIGGERS:
+                        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                
+                books = iter(books)
+                while True:
+                    chunk = list(islice(books, chunk_size))
+                    if not chunk:
+                        break
+                    
+                    try:
+                        params = [self._book_params(book) for book in chunk]
+                    except (AttributeError, TypeError):
+                        params = None
+                    
+                    if params is not None:
+                        cursor.execute("SAVEPOINT chunk")
+                        try:
+                            cursor.executemany(UPSERT_BOOK_SQL, params)
+                            cursor.execute("RELEASE chunk")
+                            stored_count += len(chunk)
+                            continue
+                        except sqlite3.Error:
+                            cursor.execute("ROLLBACK TO chunk")
+                            cursor.execute("RELEASE chunk")
+                    
+                    # something in this chunk is bad - go one by one to find it
+                    for book in chunk:
+                        try:
+                            cursor.execute(UPSERT_BOOK_SQL, self._book_params(book))
+                            stored_count += 1
+                        except (sqlite3.Error, AttributeError, TypeError) as e:
+                            failed_count += 1
+                            metrics.inc('rows_skipped_total', pipeline='books',
+                                        reason='db_error' if isinstance(e, sqlite3.Error) else 'invalid_record')
+                            title = book.get('title', 'Unknown') if isinstance(book, Mapping) else 'Unknown'
+                            logger.error(f"Failed to store book '{title}': {e}")
+                
+                if deferred:
+                    for statement in SEARCH_TRIGGERS.values():
+                        cursor.execute(statement)
+                    with metrics.timer('sqlite_seconds', pipeline='books', op='search_rebuild'):
+                        cursor.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+        except sqlite3.Error as e:
+            logger.error(f"Database error during bulk storage: {e}")
+            raise
+        
+        elapsed = time.perf_counter() - started
+        rows_per_sec = stored_count / elapsed if elapsed > 0 else 0.0
+        self._record_store(stored_count, elapsed)
+        logger.info(f"Bulk stored {stored_count} books ({failed_count} failed) "
+                    f"in {elapsed:.2f}s - {rows_per_sec:,.0f} rows/sec")
+        
+        return {
+            'stored': stored_count,
+            'failed': failed_count,
+            'seconds': elapsed,
+            'rows_per_sec': rows_per_sec
+        }
+    
+    def _record_store(self, rows, seconds):
+        metrics.inc('rows_stored_total', rows, pipeline='books')
+        if rows and seconds > 0:
+            metrics.observe('rows_per_second', rows / seconds, pipeline='books', stage='store')
+    
     def get_all_books(self):
-        # get all books from the database
+        # get all books from the database - served from the read cache
+        # until something is written
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  #this makes it easier to work with
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM books ORDER BY title")
-            rows = cursor.fetchall()
-            
-            books = []
-            for row in rows:
-                books.append(dict(row))
-            
-            conn.close()
+            books = self.read_cache.get(('get_all_books',), self._load_all_books)
             logger.info(f"Retrieved {len(books)} books from database")
             return books
             
@@ -130,17 +845,86 @@ class BookAPI:
             logger.error(f"Database error during retrieval: {e}")
             return []
     
-    def display_books(self, books=None):
-        # print books to console in a nice format
+    def _load_all_books(self):
+        with metrics.timer('sqlite_seconds', pipeline='books', op='query'), self.db.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM books ORDER BY title")
+            # Book records read like dicts but take a fraction of the memory
+            cursor.row_factory = Book.row_factory(cursor)
+            return cursor.fetchall()
+    
+    def count_books(self):
+        return self.read_cache.get(('count_books',), self._count_books)
+    
+    def _count_books(self):
+        with self.db.reader() as conn:
+            return conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+    
+    def iter_books(self, fetch_size=1000, after=None):
+        """
+        Iterate over all books in title order without loading the table.
+        
+        Uses keyset pagination - each page is
+        `WHERE title > <last title> ORDER BY title LIMIT fetch_size` on the
+        primary key index - so every page costs the same however deep we
+        are, and only fetch_size rows are in memory at a time. The reader
+        connection goes back to the pool between pages.
+        
+        Pass after=<title> to start after a given title.
+        """
+        last = after
+        if last is None:
+            # NULL titles sort first but can't be used as a keyset bound
+            with self.db.reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM books WHERE title IS NULL")
+                cursor.row_factory = Book.row_factory(cursor)
+                rows = cursor.fetchall()
+            yield from rows
+        
+        while True:
+            with self.db.reader() as conn:
+                cursor = conn.cursor()
+                if last is None:
+                    cursor.execute("SELECT * FROM books WHERE title IS NOT NULL ORDER BY title LIMIT ?",
+                                   (fetch_size,))
+                else:
+                    cursor.execute("SELECT * FROM books WHERE title > ? ORDER BY title LIMIT ?",
+                                   (last, fetch_size))
+                cursor.row_factory = Book.row_factory(cursor)
+                rows = cursor.fetchall()
+            
+            yield from rows
+            if len(rows) < fetch_size:
+                break
+            last = rows[-1]['title']
+    
+    def close(self):
+        # close the shared connections - the object can't be used after this
+        self.db.close()
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def display_books(self, books=None, fetch_size=1000):
+        # print books to console in a nice format - without a list it streams
+        # straight from the database so the first book shows up right away
         if books is None:
-            books = self.get_all_books()
+            total = self.count_books()
+            books = self.iter_books(fetch_size=fetch_size)
+        else:
+            total = len(books)
         
-        if not books:
+        if not total:
             print("No books found.")
             return
         
         print(f"\n{'='*60}")
-        print(f"BOOKS IN DATABASE ({len(books)} total)")
+        print(f"BOOKS IN DATABASE ({total} total)")
         print(f"{'='*60}")
         
         for i, book in enumerate(books, 1):
@@ -158,21 +942,52 @@ class BookAPI:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Fetch books from the API into sqlite")
+    parser.add_argument('--db', default="books.db", help="sqlite database file")
+    parser.add_argument('--rebuild-search', action='store_true',
+                        help="build (or rebuild) the full-text search index and exit")
+    parser.add_argument('--search', metavar='QUERY', help="search the stored books and exit")
+    parser.add_argument('--change-log', action='store_true',
+                        help="keep the books_changes log for incremental snapshot exports")
+    args = parser.parse_args()
+    
+    if args.rebuild_search or args.search:
+        with BookAPI(args.db, search=True) as book_api:
+            if args.rebuild_search:
+                book_api.rebuild_search_index()
+                print("Search index rebuilt")
+            if args.search:
+                for hit in book_api.search(args.search):
+                    print(f"{hit['title']} ({hit['author']}, {hit['year']})")
+                    print(f"   {hit['snippet']}")
+        return
+    
     print("Starting book API data retrieval...")
     
-    book_api = BookAPI()
+    # cache responses between runs so an unchanged feed is just a 304
+    book_api = BookAPI(args.db, cache=ResponseCache(".http_cache"), change_log=args.change_log)
  
     books = book_api.fetch_books_from_api()
     
-    if books:
-        # save them to database
-        stored_count = book_api.store_books(books)
+    if book_api.last_fetch_unchanged:
+        print("Books unchanged since last run, skipping store")
+    elif books:
+        # save them to database, and only then keep the response cached
+        try:
+            stored_count = book_api.store_books(books)
+        except Exception:
+            book_api.commit_fetch(stored=False)
+            raise
+        book_api.commit_fetch(stored=stored_count == len(books))
         print(f"Stored {stored_count} books in database")
 
         book_api.display_books()
     else:
         print("No books fetched from API")
     
+    book_api.close()
+    # only writes anything when DATA_API_METRICS=1
+    metrics.dump('book_api')
     print("\nDone!")
 
 
@@ -0,0 +1,151 @@
+# csv_input.py - opening CSV exports for csv_import.py
+#
+# exports arrive as plain, gzip or zstd files of many gigabytes. plain files
+# are memory-mapped and read line by line straight off the map; compressed
+# ones are decompressed on the fly through big read buffers, never to a
+# temporary file. the format is picked from the file's magic bytes.
+
+import io
+import os
+import gzip
+import mmap
+from contextlib import contextmanager
+
+PLAIN = 'plain'
+GZIP = 'gzip'
+ZSTD = 'zstd'
+FORMATS = (PLAIN, GZIP, ZSTD)
+
+# compressed input is read and decompressed this much at a time
+READ_BUFFER = 4 * 1024 * 1024
+
+_MAGIC = (
+    (b'\x1f\x8b', GZIP),
+    (b'\x28\xb5\x2f\xfd', ZSTD),
+)
+
+
+def detect_format(path):
+    # look at the first bytes rather than trusting the extension
+    with open(path, 'rb') as file:
+        head = file.read(4)
+    for magic, fmt in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    return PLAIN
+
+
+def resolve_format(path, fmt='auto'):
+    if fmt is None or fmt == 'auto':
+        return detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown CSV format {fmt!r}, expected one of {', '.join(FORMATS)} or auto")
+    return fmt
+
+
+class MappedFile:
+    """
+    A plain file mapped read-only into memory, with the bits of the binary
+    file interface the importer uses: iterating yields lines (bytes),
+    tell()/seek() work on byte offsets, and `buffer` is the map itself for
+    slicing. Empty files can't be mapped and just act empty.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    # read-ahead hint: we go through it once, front to back
+                    self._map.madvise(mmap.MADV_SEQUENTIAL)
+            else:
+                self._map = None
+
+    @property
+    def buffer(self):
+        return self._map if self._map is not None else b''
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __iter__(self):
+        if self._map is None:
+            return iter(())
+        return iter(self._map.readline, b'')
+
+    def readline(self):
+        return self._map.readline() if self._map is not None else b''
+
+    def tell(self):
+        return self._map.tell() if self._map is not None else 0
+
+    def seek(self, offset):
+        if self._map is not None:
+            self._map.seek(offset)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _zstd_stream(raw):
+    try:
+        # standard library from python 3.14
+        from compression import zstd
+        return zstd.ZstdFile(raw)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading zstd files needs the zstandard package (pip install zstandard)") from None
+    return zstandard.ZstdDecompressor().stream_reader(raw, read_size=READ_BUFFER)
+
+
+def seek_to(file, offset):
+    # compressed streams that can't seek can still skip ahead by reading
+    try:
+        file.seek(offset)
+    except io.UnsupportedOperation:
+        remaining = offset - file.tell()
+        while remaining > 0:
+            chunk = file.read(min(remaining, READ_BUFFER))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+
+@contextmanager
+def open_csv(path, fmt='auto'):
+    """
+    Open a CSV export for reading as bytes, whatever it's compressed with.
+
+        with open_csv("users.csv.gz") as file:
+            reader = csv.reader(map(bytes.decode, file))
+
+    Yields something iterable line by line with tell(); use seek_to() to
+    jump to an offset. For compressed files offsets are into the
+    decompressed data, and seeking decompresses and throws away everything
+    up to the offset - slower than on a plain file, but nothing is written
+    anywhere.
+    """
+    fmt = resolve_format(path, fmt)
+    if fmt == PLAIN:
+        with MappedFile(path) as file:
+            yield file
+        return
+
+    raw = open(path, 'rb', buffering=READ_BUFFER)
+    try:
+        stream = gzip.GzipFile(fileobj=raw, mode='rb') if fmt == GZIP else _zstd_stream(raw)
+        with io.BufferedReader(stream, buffer_size=READ_BUFFER) as file:
+            yield file
+    finally:
+        raw.close()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# ingest_daemon.py - long-running version of the three one-shot scripts
+#
+# fetches books and student scores on a timer and imports CSV files dropped
+# into a directory, all on one asyncio loop. the schema setup, connections
+# and HTTP session are created once instead of on every cron tick.
+#
+#   python3 Ingest-Daemon/ingest_daemon.py --drop-dir incoming --book-interval 600
+#
+# Ctrl-C / SIGTERM stops the fetchers, writes out everything already queued
+# and then exits. a CSV import in progress stops after its current batch and
+# resumes from its checkpoint on the next start.
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import logging
+import threading
+from itertools import islice
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+sys.path.append(os.path.join(ROOT, 'StudentScore-API'))
+
+from book_api import BookAPI
+from csv_import import CSVImporter, DEFAULT_BATCH_SIZE
+from student_scores_simple import StudentScoreProcessor
+from score_stream import StreamingScoreStats
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# files picked up from the drop directory
+CSV_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst')
+
+# a CSV that still hasn't imported completely after this many tries goes to failed/
+MAX_CSV_ATTEMPTS = 3
+
+metrics.set_buckets('daemon_queue_depth', (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000))
+
+
+class IngestDaemon:
+    """
+    Periodic book/student fetching plus a CSV drop directory, feeding one
+    SQLite writer through a bounded queue.
+
+        daemon = IngestDaemon(drop_dir="incoming", book_interval=600)
+        asyncio.run(daemon.run())      # until stop() / SIGINT / SIGTERM
+
+    Producers:
+        books    - every book_interval seconds, pages through the book API in
+                   a worker thread and queues one page (page_size books) at a
+                   time
+        students - every student_interval seconds, fetches the scores
+        drop dir - every poll_interval seconds, queues CSV files whose size
+                   didn't change since the last look (so half-copied files
+                   are left alone)
+
+    The writer is the only task that touches SQLite (and the score stats
+    checkpoint). Pages go through BookAPI.sync_books, so a re-fetch of an
+    unchanged feed writes nothing. CSV files go through
+    import_csv_fast(resume=True) as a whole - that path already batches,
+    dedups and checkpoints - and are moved to done/ (or failed/ after
+    MAX_CSV_ATTEMPTS). Students are folded into a StreamingScoreStats saved
+    to stats_path after every batch.
+
+    The queue holds at most queue_size items. When the writer falls behind,
+    producers wait on the full queue - the book fetch thread literally stops
+    requesting pages - so memory stays bounded however fast the sources are.
+
+    stop() (thread-safe) stops the producers between pages; everything
+    already queued is still written before run() returns, except CSV files:
+    an import in progress stops after its current batch (csv_batch_size
+    rows), and it and any files not started yet stay in the drop directory
+    to resume from their checkpoints on the next start.
+    """
+
+    def __init__(self, book_db="books.db", users_db="users.db", drop_dir="incoming",
+                 stats_path="student_stats.json", book_api_url=None, student_api_url=None,
+                 book_interval=300, student_interval=300, poll_interval=2,
+                 page_size=500, queue_size=64, csv_batch_size=DEFAULT_BATCH_SIZE):
+        self.drop_dir = drop_dir
+        self.stats_path = stats_path
+        self.book_interval = book_interval
+        self.student_interval = student_interval
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+        self.queue_size = queue_size
+        self.csv_batch_size = csv_batch_size
+
+        # created once for the life of the daemon
+        self.book_api = BookAPI(book_db, api_url=book_api_url)
+        self.importer = CSVImporter(users_db)
+        self.students = StudentScoreProcessor(api_url=student_api_url)
+        if stats_path and os.path.exists(stats_path):
+            self.score_stats = StreamingScoreStats.load(stats_path)
+            logger.info(f"Loaded score stats checkpoint ({self.score_stats.count} scores)")
+        else:
+            self.score_stats = StreamingScoreStats()
+
+        self.stats = {'book_pages': 0, 'books_inserted': 0, 'books_updated': 0,
+                      'student_batches': 0, 'csv_imported': 0, 'csv_failed': 0,
+                      'max_queue_depth': 0}
+        self.queue = None
+        self._loop = None
+        self._stop_event = None
+        self._stopping = threading.Event()
+        self._queued_files = set()
+        self._csv_attempts = {}
+
+    # ---- control ----
+
+    def stop(self):
+        # safe to call from any thread or a signal handler
+        self._stopping.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _sleep(self, seconds):
+        # sleep, but wake up early on stop(); returns True if we're stopping
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self._stop_event.is_set()
+
+    async def _put(self, kind, payload):
+        # waits while the queue is full - this is the backpressure
+        await self.queue.put((kind, payload))
+        depth = self.queue.qsize()
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], depth)
+        metrics.observe('daemon_queue_depth', depth)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self._stopping.is_set():
+            self._stop_event.set()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        os.makedirs(self.drop_dir, exist_ok=True)
+
+        signals = []
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    self._loop.add_signal_handler(signum, self.stop)
+                    signals.append(signum)
+                except (NotImplementedError, RuntimeError):
+                    # no signal support in this loop (e.g. Windows)
+                    pass
+
+        writer = asyncio.create_task(self._writer())
+        producers = [asyncio.create_task(self._book_producer()),
+                     asyncio.create_task(self._student_producer()),
+                     asyncio.create_task(self._watch_drop_dir())]
+        logger.info(f"Ingest daemon started (drop dir: {self.drop_dir})")
+
+        try:
+            await asyncio.gather(*producers)
+        finally:
+            # producers are done - let the writer finish what's queued, then stop it
+            await self.queue.put((None, None))
+            await writer
+            for signum in signals:
+                self._loop.remove_signal_handler(signum)
+            self.close()
+        logger.info(f"Ingest daemon stopped: {self.stats}")
+        return self.stats
+
+    def close(self):
+        if self.stats_path:
+            self.score_stats.save(self.stats_path)
+        self.book_api.close()
+        self.importer.close()
+        self.students.session.close()
+        metrics.dump('ingest_daemon')
+
+    # ---- producers ----
+
+    async def _book_producer(self):
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                pages = await asyncio.to_thread(self._fetch_books, self._loop)
+                logger.info(f"Queued {pages} pages of books")
+            except Exception as e:
+                logger.error(f"Book fetch failed: {e}")
+            if await self._sleep(max(0.0, self.book_interval - (time.perf_counter() - started))):
+                break
+
+    def _fetch_books(self, loop):
+        # runs in a worker thread: page through the API and hand pages to
+        # the loop, blocking whenever the queue is full
+        books = self.book_api.iter_books_from_api(page_size=self.page_size)
+        pages = 0
+        try:
+            while not self._stopping.is_set():
+                page = list(islice(books, self.page_size))
+                if not page:
+                    break
+                asyncio.run_coroutine_threadsafe(self._put('books', page), loop).result()
+                pages += 1
+        finally:
+            books.close()
+        return pages
+
+    async def _student_producer(self):
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                students = await asyncio.to_thread(self.students.fetch_scores)
+                if students:
+                    await self._put('students', students)
+            except Exception as e:
+                logger.error(f"Student fetch failed: {e}")
+            if await self._sleep(max(0.0, self.student_interval - (time.perf_counter() - started))):
+                break
+
+    async def _watch_drop_dir(self):
+        sizes = {}
+        while not self._stop_event.is_set():
+            try:
+                names = sorted(os.listdir(self.drop_dir))
+            except OSError as e:
+                logger.error(f"Can't read drop directory {self.drop_dir}: {e}")
+                names = []
+            for name in names:
+                path = os.path.join(self.drop_dir, name)
+                if not name.endswith(CSV_SUFFIXES) or not os.path.isfile(path) or path in self._queued_files:
+                    continue
+                size = os.path.getsize(path)
+                if sizes.get(path) == size:
+                    # same size as last time - assume whoever wrote it is done
+                    sizes.pop(path)
+                    self._queued_files.add(path)
+                    await self._put('csv', path)
+                else:
+                    sizes[path] = size
+            if await self._sleep(self.poll_interval):
+                break
+
+    # ---- the writer ----
+
+    async def _writer(self):
+        while True:
+            kind, payload = await self.queue.get()
+            try:
+                if kind is None:
+                    return
+                with metrics.timer('stage_seconds', pipeline='daemon', stage=kind):
+                    if kind == 'books':
+                        await asyncio.to_thread(self._write_books, payload)
+                    elif kind == 'students':
+                        await asyncio.to_thread(self._write_students, payload)
+                    elif kind == 'csv':
+                        done = await asyncio.to_thread(self._import_csv, payload)
+                        self._finish_csv(payload, done)
+            except Exception as e:
+                # one bad batch mustn't take the daemon down
+                logger.error(f"Failed to write {kind}: {e}")
+                if kind == 'csv':
+                    self._finish_csv(payload, False)
+            finally:
+                self.queue.task_done()
+
+    def _write_books(self, page):
+        counts = self.book_api.sync_books(page)
+        self.stats['book_pages'] += 1
+        self.stats['books_inserted'] += counts['inserted']
+        self.stats['books_updated'] += counts['updated']
+
+    def _write_students(self, students):
+        self.score_stats.update_students(students)
+        self.stats['student_batches'] += 1
+        if self.stats_path:
+            self.score_stats.save(self.stats_path)
+
+    def _import_csv(self, path):
+        # True once the whole file is in (its checkpoint says completed)
+        if not os.path.exists(path) or self._stopping.is_set():
+            return False
+        # stops between batches once the daemon is told to stop
+        self.importer.import_csv_fast(path, batch_size=self.csv_batch_size, resume=True,
+                                      stop=self._stopping)
+        checkpoint = self.importer.get_checkpoint(path)
+        # no checkpoint at all means an empty file - nothing left to do
+        return checkpoint is None or bool(checkpoint['completed'])
+
+    def _finish_csv(self, path, done):
+        if not done and self._stopping.is_set():
+            # cut short by shutdown, not a failed attempt
+            logger.info(f"{path} left for the next start, it resumes from its checkpoint")
+        elif done:
+            self._move(path, 'done')
+            self.stats['csv_imported'] += 1
+            self._csv_attempts.pop(path, None)
+        else:
+            attempts = self._csv_attempts.get(path, 0) + 1
+            self._csv_attempts[path] = attempts
+            if attempts >= MAX_CSV_ATTEMPTS:
+                logger.error(f"Giving up on {path} after {attempts} attempts")
+                self._move(path, 'failed')
+                self.stats['csv_failed'] += 1
+                self._csv_attempts.pop(path, None)
+            else:
+                logger.warning(f"{path} didn't import completely, will resume on the next poll")
+        # let the watcher see the file again (only matters if it's still there)
+        self._queued_files.discard(path)
+
+    def _move(self, path, folder):
+        if not os.path.exists(path):
+            return
+        target_dir = os.path.join(self.drop_dir, folder)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(path))
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(os.path.basename(path))
+            target = os.path.join(target_dir, f"{stem}-{time.strftime('%Y%m%d%H%M%S')}{ext}")
+        os.replace(path, target)
+        logger.info(f"Moved {path} to {target}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running book/student/CSV ingestion daemon")
+    parser.add_argument('--book-db', default="books.db")
+    parser.add_argument('--users-db', default="users.db")
+    parser.add_argument('--drop-dir', default="incoming", help="directory watched for CSV files")
+    parser.add_argument('--stats', default="student_stats.json", help="score stats checkpoint file")
+    parser.add_argument('--book-url', help="book API endpoint (default: jsonplaceholder posts)")
+    parser.add_argument('--student-url', help="student API endpoint (default: jsonplaceholder users)")
+    parser.add_argument('--book-interval', type=float, default=300, help="seconds between book fetches")
+    parser.add_argument('--student-interval', type=float, default=300, help="seconds between student fetches")
+    parser.add_argument('--poll-interval', type=float, default=2, help="seconds between drop dir scans")
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--queue-size', type=int, default=64, help="max queued pages/batches/files")
+    parser.add_argument('--csv-batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="CSV rows per transaction; shutdown waits for at most one batch")
+    args = parser.parse_args()
+
+    daemon = IngestDaemon(book_db=args.book_db, users_db=args.users_db, drop_dir=args.drop_dir,
+                          stats_path=args.stats, book_api_url=args.book_url,
+                          student_api_url=args.student_url, book_interval=args.book_interval,
+                          student_interval=args.student_interval, poll_interval=args.poll_interval,
+                          page_size=args.page_size, queue_size=args.queue_size,
+                          csv_batch_size=args.csv_batch_size)
+    asyncio.run(daemon.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# score_stats.py - columnar score storage + vectorized statistics
+# used by student_scores.py (and student_scores_simple.py when numpy is around)
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+
+from records import Student
+
+DEFAULT_PERCENTILES = (25, 50, 75, 90, 99)
+
+
+class ScoreTable:
+    """
+    Student scores stored as columns instead of a list of dicts:
+    a list of names plus one int32 numpy array of scores.
+    
+        table = ScoreTable.from_students(students)
+        stats = table.summary()
+        stats['mean'], stats['p90'], stats['histogram']['counts']
+    
+    All the statistics are numpy calls over the score array, so there's no
+    per-student Python work no matter how many scores there are.
+    """
+    
+    def __init__(self, names, scores):
+        self.names = names
+        self.scores = np.asarray(scores, dtype=np.int32)
+        if len(self.names) != len(self.scores):
+            raise ValueError("names and scores must be the same length")
+    
+    @classmethod
+    def from_students(cls, students):
+        names = [student['name'] for student in students]
+        scores = np.fromiter((student['score'] for student in students),
+                             dtype=np.int32, count=len(names))
+        return cls(names, scores)
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def to_students(self):
+        # back to the list of Student records the rest of the code uses
+        return [Student(name, int(score)) for name, score in zip(self.names, self.scores)]
+    
+    def summary(self, percentiles=DEFAULT_PERCENTILES, bins=10, hist_range=None):
+        """
+        Full summary of the scores: count, mean, min, max, std, median,
+        the requested percentiles (as 'p25', 'p90', ...) and a histogram
+        with `bins` equal-width bins ({'counts': [...], 'edges': [...]}).
+        
+        Returns None when there are no scores.
+        """
+        if len(self.scores) == 0:
+            return None
+        
+        scores = self.scores
+        # median + every percentile in one partition pass
+        wanted = sorted(set(percentiles) | {50})
+        values = np.percentile(scores, wanted)
+        by_percentile = dict(zip(wanted, values))
+        counts, edges = np.histogram(scores, bins=bins, range=hist_range)
+        
+        summary = {
+            'count': int(len(scores)),
+            'mean': float(scores.mean()),
+            'min': int(scores.min()),
+            'max': int(scores.max()),
+            'std': float(scores.std()),
+            'median': float(by_percentile[50]),
+            'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+        }
+        for p in percentiles:
+            summary[f'p{p}'] = float(by_percentile[p])
+        return summary
@@ -0,0 +1,290 @@
+# score_stream.py - bounded-memory statistics for score feeds that never fit
+# in memory. plain Python, no numpy needed.
+
+import os
+import json
+import math
+import numbers
+
+
+class QuantileSketch:
+    """
+    Small mergeable quantile sketch (the DDSketch idea).
+    
+    Values are counted in logarithmic buckets, so any quantile comes back
+    within `relative_accuracy` (1% by default) of the true value, using a
+    few hundred buckets whatever the number of values. If it ever needs
+    more than max_buckets, the lowest buckets are folded together, which
+    only costs accuracy at the very low end.
+    """
+    
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+    
+    def _key(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+    
+    def _value(self, key):
+        # middle of the bucket, in the relative sense
+        return 2 * self.gamma ** key / (self.gamma + 1)
+    
+    def add(self, value, weight=1):
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + weight
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + weight
+        else:
+            self.zeros += weight
+        self.count += weight
+        if len(self.positive) + len(self.negative) > self.max_buckets:
+            self._collapse()
+    
+    def _collapse(self):
+        # fold buckets at the low end together until we fit again: the most
+        # negative ones first, then (if the negative side is down to one
+        # bucket) the smallest positive ones
+        extra = len(self.positive) + len(self.negative) - self.max_buckets
+        for store, keys in ((self.negative, sorted(self.negative, reverse=True)),
+                            (self.positive, sorted(self.positive))):
+            folded = min(extra, len(keys) - 1)
+            if folded <= 0:
+                continue
+            merged_into = keys[folded]
+            for key in keys[:folded]:
+                store[merged_into] += store.pop(key)
+            extra -= folded
+    
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can't merge sketches with different accuracy")
+        for key, weight in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + weight
+        for key, weight in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + weight
+        self.zeros += other.zeros
+        self.count += other.count
+        if len(self.positive) + len(self.negative) > self.max_buckets:
+            self._collapse()
+    
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # most negative values first, then zeros, then positives ascending
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+    
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_buckets': self.max_buckets,
+            # json keys have to be strings
+            'positive': {str(k): v for k, v in self.positive.items()},
+            'negative': {str(k): v for k, v in self.negative.items()},
+            'zeros': self.zeros,
+            'count': self.count,
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'], data['max_buckets'])
+        sketch.positive = {int(k): v for k, v in data['positive'].items()}
+        sketch.negative = {int(k): v for k, v in data['negative'].items()}
+        sketch.zeros = data['zeros']
+        sketch.count = data['count']
+        return sketch
+
+
+class StreamingScoreStats:
+    """
+    Online aggregator for an unbounded stream of scores.
+    
+        stats = StreamingScoreStats()
+        for batch in feed:
+            stats.update_batch(batch)
+        stats.summary()
+    
+    Keeps Welford mean/variance, running min/max, a fixed-bin histogram over
+    [hist_min, hist_max] (with under/overflow counters) and a QuantileSketch,
+    all in constant memory. Aggregates built by different workers can be
+    combined with merge(), and the whole state round-trips through
+    to_dict()/from_dict() or save()/load() for checkpointing.
+    """
+    
+    def __init__(self, hist_min=0, hist_max=100, bins=10, relative_accuracy=0.01):
+        if hist_max <= hist_min or bins < 1:
+            raise ValueError("Need hist_max > hist_min and at least one bin")
+        self.hist_min = hist_min
+        self.hist_max = hist_max
+        self.bins = bins
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = [0] * bins
+        self.underflow = 0
+        self.overflow = 0
+        self.sketch = QuantileSketch(relative_accuracy)
+    
+    def update(self, score):
+        # Welford's update - numerically stable, one value at a time
+        if type(score) is not int and type(score) is not float:
+            # numpy scalars and the like would end up in min/max and break save()
+            score = int(score) if isinstance(score, numbers.Integral) else float(score)
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (score - self.mean)
+        
+        if self.min is None or score < self.min:
+            self.min = score
+        if self.max is None or score > self.max:
+            self.max = score
+        
+        if score < self.hist_min:
+            self.underflow += 1
+        elif score > self.hist_max:
+            self.overflow += 1
+        else:
+            width = (self.hist_max - self.hist_min) / self.bins
+            # the top edge belongs to the last bin, like numpy.histogram
+            self.histogram[min(int((score - self.hist_min) / width), self.bins - 1)] += 1
+        
+        self.sketch.add(score)
+    
+    def update_batch(self, scores):
+        # a list, a generator or a numpy array of scores
+        if hasattr(scores, 'tolist'):
+            # whole array to plain Python numbers in one go
+            scores = scores.tolist()
+        for score in scores:
+            self.update(score)
+    
+    def update_students(self, students):
+        for student in students:
+            self.update(student['score'])
+    
+    @property
+    def variance(self):
+        # population variance, same as numpy's default std/var
+        return self._m2 / self.count if self.count else 0.0
+    
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+    
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+    
+    def merge(self, other):
+        """
+        Fold another aggregator's state into this one (Chan et al.'s
+        parallel variance formula), e.g. partial results from workers.
+        """
+        if (other.hist_min, other.hist_max, other.bins) != (self.hist_min, self.hist_max, self.bins):
+            raise ValueError("Can't merge aggregators with different histogram bins")
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.mean, self._m2 = other.mean, other._m2
+        else:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.count += other.count
+        
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self.sketch.merge(other.sketch)
+        return self
+    
+    def summary(self, percentiles=(25, 50, 75, 90, 99)):
+        # same keys as ScoreTable.summary, with approximate percentiles
+        if self.count == 0:
+            return None
+        width = (self.hist_max - self.hist_min) / self.bins
+        summary = {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'std': self.std,
+            'median': self.quantile(0.5),
+            'histogram': {
+                'counts': list(self.histogram),
+                'edges': [self.hist_min + width * i for i in range(self.bins + 1)],
+                'underflow': self.underflow,
+                'overflow': self.overflow,
+            },
+        }
+        for p in percentiles:
+            summary[f'p{p}'] = self.quantile(p / 100)
+        return summary
+    
+    def to_dict(self):
+        return {
+            'hist_min': self.hist_min,
+            'hist_max': self.hist_max,
+            'bins': self.bins,
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self._m2,
+            'min': self.min,
+            'max': self.max,
+            'histogram': self.histogram,
+            'underflow': self.underflow,
+            'overflow': self.overflow,
+            'sketch': self.sketch.to_dict(),
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['hist_min'], data['hist_max'], data['bins'],
+                    data['sketch']['relative_accuracy'])
+        stats.count = data['count']
+        stats.mean = data['mean']
+        stats._m2 = data['m2']
+        stats.min = data['min']
+        stats.max = data['max']
+        stats.histogram = list(data['histogram'])
+        stats.underflow = data['underflow']
+        stats.overflow = data['overflow']
+        stats.sketch = QuantileSketch.from_dict(data['sketch'])
+        return stats
+    
+    def save(self, path):
+        # checkpoint to disk - write then rename so a crash can't leave half a file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
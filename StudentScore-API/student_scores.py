@@ -1,45 +1,92 @@
 # student_scores.py - fetches student scores and makes a bar chart
 # just a simple script to visualize test scores
 
+import os
+import sys
+import random
+import argparse
 import requests
 import json
-import matplotlib.pyplot as plt
-import numpy as np
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+
+from http_client import ConcurrentFetcher, make_session
+from request_control import RequestController
+from records import Student
+from http_cache import ResponseCache
+from metrics import metrics
+from score_stream import StreamingScoreStats
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# above this many students create_bar_chart draws the top N + a histogram
+# instead of one bar per student
+DEFAULT_MAX_BARS = 50
+DEFAULT_TOP_N = 20
+DEFAULT_CHART_BINS = 20
+
+
+def _pyplot():
+    """
+    matplotlib (and numpy with it) takes longer to import than the rest of
+    the script takes to run, and most runs never draw a chart - so it's only
+    imported here, the first time a chart is made. Without a display (cron,
+    containers, CI) the headless Agg backend is picked, unless MPLBACKEND
+    says otherwise.
+    """
+    import matplotlib
+    if ('MPLBACKEND' not in os.environ and sys.platform.startswith('linux')
+            and not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY')):
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
 class StudentScoreProcessor:
     # handles fetching and processing student scores
     
-    def __init__(self, api_url=None):
+    def __init__(self, api_url=None, cache=None, http=None):
         # using jsonplaceholder again since we don't have a real scores API
         # in real life you'd pass in the actual API endpoint
         self.api_url = api_url or "https://jsonplaceholder.typicode.com/users"
+        # keep-alive session so repeated fetches reuse the connection
+        self.session = make_session()
+        # retries/backoff, adaptive concurrency and a circuit breaker on top of it
+        self.http = http or RequestController(self.session)
+        # optional ResponseCache for conditional GETs between runs
+        self.cache = cache
+        self.last_fetch_unchanged = False
     
     def fetch_scores(self):
         """
         Fetch student scores from the API.
         """
+        self.last_fetch_unchanged = False
         try:
             logger.info(f"Fetching data from {self.api_url}")
-            response = requests.get(self.api_url, timeout=10)
-            response.raise_for_status()
+            with metrics.timer('stage_seconds', pipeline='students', stage='fetch'):
+                if self.cache is not None:
+                    response = self.cache.get(self.http, self.api_url, timeout=10)
+                else:
+                    response = self.http.get(self.api_url, timeout=10)
+                    response.raise_for_status()
+            # unchanged upstream still gets reported - the body comes from
+            # the cache, there's just nothing new to download
+            if self.cache is not None and response.not_modified:
+                logger.info("Student data unchanged upstream, using the cached copy")
+                self.last_fetch_unchanged = True
             
-            # jsonplaceholder gives us users, so we'll fake some scores
-            raw_data = response.json()
+            with metrics.timer('stage_seconds', pipeline='students', stage='parse'):
+                # jsonplaceholder gives us users, so we'll fake some scores
+                raw_data = response.json()
             
-            students = []
-            # take first 10 users and give them random scores
-            for i, user in enumerate(raw_data[:10]):
-                # generate random score between 60-100 (more realistic)
-                score = np.random.randint(60, 101)
-                student = {
-                    'name': user.get('name', f'Student {i+1}'),
-                    'score': score
-                }
-                students.append(student)
+                students = []
+                # take first 10 users and give them random scores
+                for i, user in enumerate(raw_data[:10]):
+                    students.append(self._make_student(i, user))
+            metrics.inc('rows_fetched_total', len(students), pipeline='students')
             
             logger.info(f"Successfully fetched {len(students)} student scores")
             return students
@@ -51,6 +98,33 @@ class StudentScoreProcessor:
             logger.error(f"Failed to parse JSON response: {e}")
             return []
     
+    def _make_student(self, i, user):
+        # generate random score between 60-100 (more realistic)
+        score = random.randint(60, 100)
+        return Student(user.get('name', f'Student {i+1}'), score)
+    
+    def fetch_scores_from_urls(self, urls, max_workers=8, per_host_limit=4):
+        """
+        Fetch students from several endpoints/shards at once.
+        
+        Runs the requests concurrently over the shared session (at most
+        per_host_limit per host) and merges the results in the order the
+        urls were given. Failed sources are logged and skipped.
+        """
+        fetcher = ConcurrentFetcher(self.session, max_workers=max_workers,
+                                    per_host_limit=per_host_limit, http=self.http)
+        results = fetcher.fetch_all(urls)
+        
+        students = []
+        with metrics.timer('stage_seconds', pipeline='students', stage='parse'):
+            for payload in results:
+                for user in payload or []:
+                    students.append(self._make_student(len(students), user))
+        metrics.inc('rows_fetched_total', len(students), pipeline='students')
+        
+        logger.info(f"Successfully fetched {len(students)} student scores from {len(results)} sources")
+        return students
+    
     def calculate_average(self, students):
         # calculate average score across all students
         if not students:
@@ -61,12 +135,53 @@ class StudentScoreProcessor:
         logger.info(f"Average score: {average:.2f}")
         return average
     
-    def create_bar_chart(self, students, average=None):
+    def summarize(self, students, percentiles=(25, 50, 75, 90, 99), bins=10):
+        # mean/min/max/std/median/percentiles/histogram in one vectorized pass
+        if not students:
+            return None
+        # numpy only gets loaded once there's something to summarize
+        from score_stats import ScoreTable
+        with metrics.timer('stage_seconds', pipeline='students', stage='stats'):
+            summary = ScoreTable.from_students(students).summary(percentiles=percentiles, bins=bins)
+        logger.info(f"Average score: {summary['mean']:.2f}")
+        return summary
+    
+    def create_bar_chart(self, students, average=None, output='student_scores_chart.png',
+                         fmt=None, dpi=300, max_bars=DEFAULT_MAX_BARS, top_n=DEFAULT_TOP_N,
+                         bins=DEFAULT_CHART_BINS, show=False):
+        """
+        Save a chart of the scores to output and return its path.
+        
+        Up to max_bars students get one labelled bar each. Past that, a bar
+        per student is unreadable and slow to draw, so the chart switches to
+        the top_n highest scores next to a histogram of every score in
+        `bins` bins - drawing cost no longer depends on the number of
+        students. fmt is any format matplotlib can save ('png', 'svg',
+        'pdf', ...; default: from the file extension). Nothing is shown on
+        screen unless show=True.
+        """
         # make a bar chart of student scores
         if not students:
             print("No student data to plot")
-            return
+            return None
+        
+        plt = _pyplot()
+        
+        if len(students) > max_bars:
+            self._draw_aggregated_chart(plt, students, average, top_n, bins)
+        else:
+            self._draw_bar_chart(plt, students, average)
+        
+        # save the plot
+        plt.savefig(output, format=fmt, dpi=dpi, bbox_inches='tight')
+        logger.info(f"Chart saved as '{output}'")
         
+        if show:
+            plt.show()
+        plt.close()
+        return output
+    
+    def _draw_bar_chart(self, plt, students, average):
         # extract names and scores
         names = [student['name'] for student in students]
         scores = [student['score'] for student in students]
@@ -95,16 +210,55 @@ class StudentScoreProcessor:
         
         # adjust layout so labels don't get cut off
         plt.tight_layout()
+    
+    def _draw_aggregated_chart(self, plt, students, average, top_n, bins):
+        # top_n bars + a histogram - a fixed number of artists however many students
+        import numpy as np
         
-        # save the plot
-        plt.savefig('student_scores_chart.png', dpi=300, bbox_inches='tight')
-        logger.info("Chart saved as 'student_scores_chart.png'")
+        scores = np.fromiter((student['score'] for student in students),
+                             dtype=np.int32, count=len(students))
+        top_n = min(top_n, len(scores))
+        # partial sort: only the top_n scores get ordered
+        top = np.argpartition(-scores, top_n - 1)[:top_n]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        counts, edges = np.histogram(scores, bins=bins)
+        
+        fig, (ax_top, ax_hist) = plt.subplots(1, 2, figsize=(14, 6))
+        fig.suptitle(f'Student Test Scores ({len(scores):,} students)', fontsize=16, fontweight='bold')
         
-        # show the plot
-        plt.show()
+        ax_top.barh([students[i]['name'] for i in top][::-1], scores[top][::-1],
+                    color='skyblue', edgecolor='navy', alpha=0.7)
+        ax_top.set_title(f'Top {top_n}')
+        ax_top.set_xlabel('Score')
+        ax_top.grid(axis='x', alpha=0.3)
+        
+        ax_hist.bar(edges[:-1], counts, width=np.diff(edges), align='edge',
+                    color='skyblue', edgecolor='navy', alpha=0.7)
+        ax_hist.set_title('Score distribution')
+        ax_hist.set_xlabel('Score')
+        ax_hist.set_ylabel('Students')
+        ax_hist.grid(axis='y', alpha=0.3)
+        if average is not None:
+            ax_hist.axvline(x=average, color='red', linestyle='--', linewidth=2,
+                            label=f'Average: {average:.1f}')
+            ax_hist.legend()
+        
+        fig.tight_layout()
     
-    def display_summary(self, students, average):
-        # print a summary of the scores
+    def aggregate(self, students, stats=None):
+        """
+        Feed students (any iterable, e.g. an endless generator) into a
+        StreamingScoreStats without keeping them around. Pass an existing
+        aggregator (or one loaded from a checkpoint) to keep adding to it.
+        """
+        stats = stats if stats is not None else StreamingScoreStats()
+        with metrics.timer('stage_seconds', pipeline='students', stage='stats'):
+            stats.update_students(students)
+        return stats
+    
+    def display_summary(self, students, average, summary=None):
+        # print a summary of the scores - pass the dict from summarize() to
+        # avoid rescanning the list for min/max
         if not students:
             print("No student data available")
             return
@@ -114,8 +268,15 @@ class StudentScoreProcessor:
         print(f"{'='*50}")
         print(f"Total students: {len(students)}")
         print(f"Average score: {average:.2f}")
-        print(f"Highest score: {max(student['score'] for student in students)}")
-        print(f"Lowest score: {min(student['score'] for student in students)}")
+        if summary is not None:
+            # already computed in one go, no need to scan the list again
+            print(f"Highest score: {summary['max']}")
+            print(f"Lowest score: {summary['min']}")
+            print(f"Median score: {summary['median']:.1f}")
+            print(f"Std deviation: {summary['std']:.2f}")
+        else:
+            print(f"Highest score: {max(student['score'] for student in students)}")
+            print(f"Lowest score: {min(student['score'] for student in students)}")
         print(f"\nIndividual scores:")
         
         for student in students:
@@ -126,27 +287,44 @@ class StudentScoreProcessor:
 
 def main():
     # main function - does everything
+    parser = argparse.ArgumentParser(description="Fetch student scores and chart them")
+    parser.add_argument('--output', default='student_scores_chart.png', help="chart file to write")
+    parser.add_argument('--format', dest='fmt', help="chart format (png, svg, pdf, ...), default from --output")
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--max-bars', type=int, default=DEFAULT_MAX_BARS,
+                        help="above this many students chart the top N + a histogram")
+    parser.add_argument('--show', action='store_true', help="also open the chart in a window")
+    args = parser.parse_args()
+    
     print("Starting student scores analysis...")
     
-    # create the processor
-    processor = StudentScoreProcessor()
+    # create the processor - responses are cached between runs
+    processor = StudentScoreProcessor(cache=ResponseCache(".http_cache"))
     
     # fetch student scores
     students = processor.fetch_scores()
     
+    if processor.last_fetch_unchanged:
+        print("Student data unchanged since last run, reporting the cached copy")
+    
     if students:
-        # calculate average
-        average = processor.calculate_average(students)
+        # calculate all the stats at once
+        summary = processor.summarize(students)
+        average = summary['mean']
         
         # display summary
-        processor.display_summary(students, average)
+        processor.display_summary(students, average, summary)
         
         # create bar chart
-        processor.create_bar_chart(students, average)
+        processor.create_bar_chart(students, average, output=args.output, fmt=args.fmt,
+                                   dpi=args.dpi, max_bars=args.max_bars, show=args.show)
         
         print("\nAnalysis complete!")
     else:
         print("No student data fetched")
+    
+    # only writes anything when DATA_API_METRICS=1
+    metrics.dump('student_scores')
 
 
 if __name__ == "__main__":
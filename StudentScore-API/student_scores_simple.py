@@ -1,39 +1,87 @@
 # student_scores_simple.py - fetches student scores and shows basic stats
 # version without matplotlib in case it's not installed
 
+import os
+import sys
+import heapq
+import random
 import requests
 import json
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+
+from http_client import ConcurrentFetcher, make_session
+from request_control import RequestController
+from records import Student
+from http_cache import ResponseCache
+from metrics import metrics
+from score_stream import StreamingScoreStats
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# above this many students create_text_chart prints the top N + a histogram
+# instead of one line per student
+DEFAULT_MAX_ROWS = 50
+DEFAULT_TOP_N = 20
+DEFAULT_CHART_BINS = 10
+
+# ScoreTable class, False if numpy isn't installed, None until first asked
+_score_table = None
+
+
+def _load_score_table():
+    # numpy is optional here - use the vectorized stats if it's installed.
+    # it's imported on first use rather than at startup, since plenty of
+    # runs never summarize anything
+    global _score_table
+    if _score_table is None:
+        try:
+            from score_stats import ScoreTable
+            _score_table = ScoreTable
+        except ImportError:
+            _score_table = False
+    return _score_table or None
+
 class StudentScoreProcessor:
     
-    def __init__(self, api_url=None):
+    def __init__(self, api_url=None, cache=None, http=None):
         # using jsonplaceholder again since we don't have a real scores API
         self.api_url = api_url or "https://jsonplaceholder.typicode.com/users"
+        self.session = make_session()
+        # retries/backoff, adaptive concurrency and a circuit breaker on top of it
+        self.http = http or RequestController(self.session)
+        # optional ResponseCache for conditional GETs between runs
+        self.cache = cache
+        self.last_fetch_unchanged = False
     
     def fetch_scores(self):
         """
         Fetch student scores from the API.
         """
+        self.last_fetch_unchanged = False
         try:
             logger.info(f"Fetching data from {self.api_url}")
-            response = requests.get(self.api_url, timeout=10)
-            response.raise_for_status()
+            with metrics.timer('stage_seconds', pipeline='students', stage='fetch'):
+                if self.cache is not None:
+                    response = self.cache.get(self.http, self.api_url, timeout=10)
+                else:
+                    response = self.http.get(self.api_url, timeout=10)
+                    response.raise_for_status()
+            # unchanged upstream still gets reported - the body comes from
+            # the cache, there's just nothing new to download
+            if self.cache is not None and response.not_modified:
+                logger.info("Student data unchanged upstream, using the cached copy")
+                self.last_fetch_unchanged = True
 
-            raw_data = response.json()
+            with metrics.timer('stage_seconds', pipeline='students', stage='parse'):
+                raw_data = response.json()
             
-            students = []
-            for i, user in enumerate(raw_data[:10]):
-                import random
-                score = random.randint(60, 100)
-                student = {
-                    'name': user.get('name', f'Student {i+1}'),
-                    'score': score
-                }
-                students.append(student)
+                students = []
+                for i, user in enumerate(raw_data[:10]):
+                    students.append(self._make_student(i, user))
+            metrics.inc('rows_fetched_total', len(students), pipeline='students')
             
             logger.info(f"Successfully fetched {len(students)} student scores")
             return students
@@ -45,6 +93,32 @@ class StudentScoreProcessor:
             logger.error(f"Failed to parse JSON response: {e}")
             return []
     
+    def _make_student(self, i, user):
+        score = random.randint(60, 100)
+        return Student(user.get('name', f'Student {i+1}'), score)
+    
+    def fetch_scores_from_urls(self, urls, max_workers=8, per_host_limit=4):
+        """
+        Fetch students from several endpoints/shards at once.
+        
+        Runs the requests concurrently over the shared session (at most
+        per_host_limit per host) and merges the results in the order the
+        urls were given. Failed sources are logged and skipped.
+        """
+        fetcher = ConcurrentFetcher(self.session, max_workers=max_workers,
+                                    per_host_limit=per_host_limit, http=self.http)
+        results = fetcher.fetch_all(urls)
+        
+        students = []
+        with metrics.timer('stage_seconds', pipeline='students', stage='parse'):
+            for payload in results:
+                for user in payload or []:
+                    students.append(self._make_student(len(students), user))
+        metrics.inc('rows_fetched_total', len(students), pipeline='students')
+        
+        logger.info(f"Successfully fetched {len(students)} student scores from {len(results)} sources")
+        return students
+    
     def calculate_average(self, students):
         # calculate average score across all students
         if not students:
@@ -55,31 +129,99 @@ class StudentScoreProcessor:
         logger.info(f"Average score: {average:.2f}")
         return average
     
-    def create_text_chart(self, students, average):
+    def summarize(self, students, percentiles=(25, 50, 75, 90, 99), bins=10):
+        """
+        Count, mean, min, max, std, median, percentiles ('p25', ...) and a
+        histogram for the scores. Uses the numpy ScoreTable when numpy is
+        installed, otherwise works it out in plain Python.
+        """
+        if not students:
+            return None
+        ScoreTable = _load_score_table()
+        with metrics.timer('stage_seconds', pipeline='students', stage='stats'):
+            if ScoreTable is not None:
+                summary = ScoreTable.from_students(students).summary(percentiles=percentiles, bins=bins)
+            else:
+                summary = _summarize_python([student['score'] for student in students], percentiles, bins)
+        logger.info(f"Average score: {summary['mean']:.2f}")
+        return summary
+    
+    def create_text_chart(self, students, average, max_rows=DEFAULT_MAX_ROWS,
+                          top_n=DEFAULT_TOP_N, bins=DEFAULT_CHART_BINS, file=None):
+        """
+        Text bar chart of the scores, written to file (default stdout).
+        
+        Up to max_rows students get one bar each. Past that it prints the
+        top_n highest scores and a `bins` bin histogram of all of them
+        instead, so the output stays readable and the time is one pass over
+        the scores. The chart is built in one buffer and written in a single
+        call rather than a print per line.
+        """
         # create a simple text-based chart since matplotlib might not be available
+        file = file or sys.stdout
         if not students:
-            print("No student data to plot")
+            print("No student data to plot", file=file)
             return
         
-        print(f"\n{'='*60}")
-        print("STUDENT SCORES BAR CHART (Text Version)")
-        print(f"{'='*60}")
+        lines = [f"\n{'='*60}"]
+        if len(students) > max_rows:
+            lines.append(f"STUDENT SCORES ({len(students):,} students, text version)")
+            lines.append(f"{'='*60}")
+            self._text_chart_aggregated(lines, students, average, top_n, bins)
+        else:
+            lines.append("STUDENT SCORES BAR CHART (Text Version)")
+            lines.append(f"{'='*60}")
+            self._text_chart_rows(lines, students, average)
+        lines.append(f"{'='*60}\n")
         
+        file.write("\n".join(lines))
+        file.flush()
+    
+    def _text_chart_rows(self, lines, students, average):
+        # one bar per student, scaled to 40 chars max
         max_score = max(student['score'] for student in students)
         
         for student in students:
             bar_length = int((student['score'] / max_score) * 40)  # scale to 40 chars max
             bar = '█' * bar_length
-            print(f"{student['name']:<20} {bar} {student['score']}")
+            lines.append(f"{student['name']:<20} {bar} {student['score']}")
         
         # show average line
         avg_bar_length = int((average / max_score) * 40)
         avg_bar = '─' * avg_bar_length
-        print(f"{'AVERAGE':<20} {avg_bar} {average:.1f}")
+        lines.append(f"{'AVERAGE':<20} {avg_bar} {average:.1f}")
+    
+    def _text_chart_aggregated(self, lines, students, average, top_n, bins):
+        # top_n bars, then the distribution - a fixed number of lines
+        top = heapq.nlargest(top_n, students, key=lambda student: student['score'])
+        max_score = top[0]['score'] or 1
+        lines.append(f"Top {len(top)}:")
+        for student in top:
+            bar = '█' * int((student['score'] / max_score) * 40)
+            lines.append(f"{student['name'][:20]:<20} {bar} {student['score']}")
         
-        print(f"{'='*60}")
+        scores = [student['score'] for student in students]
+        counts, edges = _histogram(scores, min(scores), max(scores), bins)
+        biggest = max(counts) or 1
+        lines.append("")
+        lines.append("Distribution:")
+        for count, low, high in zip(counts, edges, edges[1:]):
+            bar = '█' * int((count / biggest) * 40)
+            lines.append(f"{low:>7.1f} - {high:<7.1f}    {bar} {count:,}")
+        lines.append(f"{'AVERAGE':<20} {average:.1f}")
     
-    def display_summary(self, students, average):
+    def aggregate(self, students, stats=None):
+        """
+        Feed students (any iterable, e.g. an endless generator) into a
+        StreamingScoreStats without keeping them around. Pass an existing
+        aggregator (or one loaded from a checkpoint) to keep adding to it.
+        """
+        stats = stats if stats is not None else StreamingScoreStats()
+        with metrics.timer('stage_seconds', pipeline='students', stage='stats'):
+            stats.update_students(students)
+        return stats
+    
+    def display_summary(self, students, average, summary=None):
         if not students:
             print("No student data available")
             return
@@ -89,8 +231,15 @@ class StudentScoreProcessor:
         print(f"{'='*50}")
         print(f"Total students: {len(students)}")
         print(f"Average score: {average:.2f}")
-        print(f"Highest score: {max(student['score'] for student in students)}")
-        print(f"Lowest score: {min(student['score'] for student in students)}")
+        if summary is not None:
+            # already computed in one go, no need to scan the list again
+            print(f"Highest score: {summary['max']}")
+            print(f"Lowest score: {summary['min']}")
+            print(f"Median score: {summary['median']:.1f}")
+            print(f"Std deviation: {summary['std']:.2f}")
+        else:
+            print(f"Highest score: {max(student['score'] for student in students)}")
+            print(f"Lowest score: {min(student['score'] for student in students)}")
         print(f"\nIndividual scores:")
         
         for student in students:
@@ -99,17 +248,62 @@ class StudentScoreProcessor:
         print(f"{'='*50}")
 
 
+def _percentile(sorted_scores, p):
+    # linear interpolation between closest ranks, same as numpy's default
+    k = (len(sorted_scores) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_scores) - 1)
+    return sorted_scores[low] + (sorted_scores[high] - sorted_scores[low]) * (k - low)
+
+
+def _histogram(scores, low, high, bins):
+    # equal width bins like numpy.histogram, last bin includes the max
+    start, stop = (low, high) if low < high else (low - 0.5, high + 0.5)
+    width = (stop - start) / bins
+    counts = [0] * bins
+    for score in scores:
+        counts[min(int((score - start) / width), bins - 1)] += 1
+    return counts, [start + width * i for i in range(bins + 1)]
+
+
+def _summarize_python(scores, percentiles, bins):
+    # fallback for ScoreTable.summary when numpy isn't installed
+    count = len(scores)
+    mean = sum(scores) / count
+    ordered = sorted(scores)
+    low, high = ordered[0], ordered[-1]
+    
+    counts, edges = _histogram(scores, low, high, bins)
+    
+    summary = {
+        'count': count,
+        'mean': mean,
+        'min': low,
+        'max': high,
+        'std': (sum((score - mean) ** 2 for score in scores) / count) ** 0.5,
+        'median': float(_percentile(ordered, 50)),
+        'histogram': {'counts': counts, 'edges': edges},
+    }
+    for p in percentiles:
+        summary[f'p{p}'] = float(_percentile(ordered, p))
+    return summary
+
+
 def main():
     print("Starting student scores analysis...")
     
-    processor = StudentScoreProcessor()
+    processor = StudentScoreProcessor(cache=ResponseCache(".http_cache"))
 
     students = processor.fetch_scores()
     
+    if processor.last_fetch_unchanged:
+        print("Student data unchanged since last run, reporting the cached copy")
+    
     if students:
-        average = processor.calculate_average(students)
+        summary = processor.summarize(students)
+        average = summary['mean']
         
-        processor.display_summary(students, average)
+        processor.display_summary(students, average, summary)
 
         processor.create_text_chart(students, average)
         
@@ -117,6 +311,9 @@ def main():
         print("Note: For a visual chart, install matplotlib and run student_scores.py")
     else:
         print("No student data fetched")
+    
+    # only writes anything when DATA_API_METRICS=1
+    metrics.dump('student_scores')
 
 
 if __name__ == "__main__":
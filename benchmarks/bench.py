@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# bench.py - reproducible benchmarks for the three pipelines
+#
+# every case runs in its own subprocess (so peak RSS is per case) on seeded
+# synthetic data, and the fetch cases talk to the local mock API instead of
+# jsonplaceholder. results are written as JSON and can be checked against a
+# stored baseline.
+#
+#   python3 benchmarks/bench.py                                  # 10k rows, all cases
+#   python3 benchmarks/bench.py --sizes 10000,100000,1000000 --output results.json
+#   python3 benchmarks/bench.py --baseline benchmarks/baseline.json --threshold 0.3
+#   python3 benchmarks/bench.py --sizes 10000,100000 --save-baseline benchmarks/baseline.json
+
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import logging
+from itertools import islice
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+sys.path.append(os.path.join(ROOT, 'StudentScore-API'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'test'))
+
+# the entry points the one-shot scripts use, plus the streaming/bulk/fast
+# variants built for big inputs
+CASES = ['book_fetch', 'book_fetch_stream', 'book_store', 'book_store_bulk',
+         'csv_import', 'csv_import_fast', 'student_stats']
+DEFAULT_SEED = 1234
+
+# batched cases are split into this many operations, so p50/p99 have the
+# same number of samples at every size
+OPERATIONS = 100
+
+# cases that process the whole input per operation run it MAX_REPEATS
+# times, or as often as fits in REPEAT_BUDGET_SECONDS but at least MIN_REPEATS
+MIN_REPEATS = 5
+MAX_REPEATS = 30
+REPEAT_BUDGET_SECONDS = 10
+
+# throughput/latency/RSS can drift this much (as a fraction) before it
+# counts as a regression
+DEFAULT_THRESHOLD = 0.25
+
+
+def percentile(values, p):
+    # nearest-rank percentile, good enough for latency reporting
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(p / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def batch_rows(size):
+    # rows per operation for the batched cases
+    return max(1, math.ceil(size / OPERATIONS))
+
+
+def repeat(operation):
+    # time operation() (which returns the rows it handled) over and over
+    rows = 0
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < MAX_REPEATS:
+        if len(latencies) >= MIN_REPEATS and time.perf_counter() - started > REPEAT_BUDGET_SECONDS:
+            break
+        op_started = time.perf_counter()
+        rows += operation()
+        latencies.append(time.perf_counter() - op_started)
+    return rows, latencies
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+# ---- synthetic data ----
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+         'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'labore', 'magna', 'aliqua']
+
+
+def synthetic_books(count, seed):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            'title': f'Synthetic Book {i:08d}',
+            'author': f'Author {rng.randint(1, 5000)}',
+            'year': rng.randint(1950, 2025),
+            'description': ' '.join(rng.choices(WORDS, k=rng.randint(10, 50)))
+        }
+
+
+def write_synthetic_csv(path, count, seed):
+    # ~10% invalid emails, ~20% duplicates, rest unique
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['name', 'email'])
+        for i in range(count):
+            kind = rng.random()
+            if kind < 0.1:
+                email = f'broken{i}@'
+            elif kind < 0.3 and i:
+                email = f'user{rng.randrange(i)}@example.com'
+            else:
+                email = f'user{i}@example.com'
+            writer.writerow([f'User {i}', email])
+
+
+def synthetic_scores(count, seed):
+    import numpy as np
+    return np.random.default_rng(seed).integers(60, 101, count)
+
+
+# ---- cases ----
+# each returns (rows processed, list of per-operation latencies in seconds);
+# the latencies cover all the timed work, so throughput is rows / their sum
+
+def run_book_fetch(size, seed, workdir):
+    # BookAPI.fetch_books_from_api: one GET of the whole feed, parsed in
+    # full (it keeps the first 10 books), repeated
+    from book_api import BookAPI
+    from mock_api import MockAPIServer, SyntheticPosts
+
+    with MockAPIServer(posts=SyntheticPosts(size, seed=seed)) as server:
+        book_api = BookAPI(os.path.join(workdir, 'fetch.db'), api_url=server.url('posts'))
+
+        def fetch():
+            if not book_api.fetch_books_from_api():
+                # one response holds the whole feed and has 10 seconds to arrive
+                raise RuntimeError(f"fetch_books_from_api failed with {size:,} posts")
+            return size
+
+        rows, latencies = repeat(fetch)
+        book_api.close()
+    return rows, latencies
+
+
+def run_book_fetch_stream(size, seed, workdir):
+    # BookAPI.iter_books_from_api, one operation per page
+    from book_api import BookAPI
+    from mock_api import MockAPIServer, SyntheticPosts
+
+    page_size = batch_rows(size)
+    latencies = []
+    rows = 0
+    with MockAPIServer(posts=SyntheticPosts(size, seed=seed)) as server:
+        book_api = BookAPI(os.path.join(workdir, 'fetch.db'), api_url=server.url('posts'))
+        books = book_api.iter_books_from_api(page_size=page_size)
+        while True:
+            started = time.perf_counter()
+            page = sum(1 for _ in islice(books, page_size))
+            if not page:
+                break
+            latencies.append(time.perf_counter() - started)
+            rows += page
+        book_api.close()
+    return rows, latencies
+
+
+def _run_store(size, seed, workdir, store):
+    from book_api import BookAPI
+
+    book_api = BookAPI(os.path.join(workdir, 'store.db'))
+    books = synthetic_books(size, seed)
+    chunk = batch_rows(size)
+    latencies = []
+    rows = 0
+    while True:
+        batch = list(islice(books, chunk))
+        if not batch:
+            break
+        started = time.perf_counter()
+        rows += store(book_api, batch)
+        latencies.append(time.perf_counter() - started)
+    book_api.close()
+    return rows, latencies
+
+
+def run_book_store(size, seed, workdir):
+    # BookAPI.store_books, one call per batch
+    return _run_store(size, seed, workdir, lambda book_api, batch: book_api.store_books(batch))
+
+
+def run_book_store_bulk(size, seed, workdir):
+    # BookAPI.store_books_bulk, one call per batch
+    return _run_store(size, seed, workdir,
+                      lambda book_api, batch: book_api.store_books_bulk(batch, chunk_size=len(batch))['stored'])
+
+
+def run_csv_import(size, seed, workdir):
+    # CSVImporter.import_csv on the whole file into a fresh database, repeated
+    from csv_import import CSVImporter
+
+    csv_path = os.path.join(workdir, 'users.csv')
+    write_synthetic_csv(csv_path, size, seed)
+    runs = []
+
+    def import_file():
+        db_path = os.path.join(workdir, f'users{len(runs)}.db')
+        with CSVImporter(db_path) as importer:
+            imported, skipped = importer.import_csv(csv_path)
+        runs.append(db_path)
+        return imported + skipped
+
+    rows, latencies = repeat(import_file)
+    for db_path in runs:
+        os.remove(db_path)
+    return rows, latencies
+
+
+def run_csv_import_fast(size, seed, workdir):
+    from csv_import import CSVImporter
+
+    csv_path = os.path.join(workdir, 'users.csv')
+    write_synthetic_csv(csv_path, size, seed)
+
+    importer = CSVImporter(os.path.join(workdir, 'users.db'))
+    # latency = time between consecutive batch commits (read + validate + write)
+    marks = [time.perf_counter()]
+    write_batch = importer._write_batch
+
+    def timed_write(valid):
+        result = write_batch(valid)
+        marks.append(time.perf_counter())
+        return result
+
+    importer._write_batch = timed_write
+    imported, skipped = importer.import_csv_fast(csv_path, batch_size=batch_rows(size))
+    importer.close()
+    latencies = [b - a for a, b in zip(marks, marks[1:])]
+    return imported + skipped, latencies
+
+
+def run_student_stats(size, seed, workdir):
+    # StudentScoreProcessor.summarize over all the students, repeated
+    from student_scores_simple import StudentScoreProcessor
+    from records import Student
+
+    processor = StudentScoreProcessor(api_url='http://127.0.0.1:9/users')
+    students = [Student('Student', int(score)) for score in synthetic_scores(size, seed)]
+    rows, latencies = repeat(lambda: processor.summarize(students)['count'])
+    processor.session.close()
+    return rows, latencies
+
+
+RUNNERS = {
+    'book_fetch': run_book_fetch,
+    'book_fetch_stream': run_book_fetch_stream,
+    'book_store': run_book_store,
+    'book_store_bulk': run_book_store_bulk,
+    'csv_import': run_csv_import,
+    'csv_import_fast': run_csv_import_fast,
+    'student_stats': run_student_stats,
+}
+
+
+def run_one(case, size, seed):
+    # runs inside the child process, prints one JSON result line
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as workdir:
+        rows, latencies = RUNNERS[case](size, seed, workdir)
+    # timed work only - generating the data and starting servers don't count
+    elapsed = sum(latencies)
+    return {
+        'case': case,
+        'size': size,
+        'rows': rows,
+        'seconds': round(elapsed, 4),
+        'throughput_rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        'operations': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run_isolated(case, size, seed):
+    # the case's result, or None (with the reason printed) if it failed
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-one', case, str(size), '--seed', str(seed)],
+        capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        error = (process.stderr.strip().splitlines() or ['no output'])[-1]
+        print(f"{case:<17} {size:>10,} rows  failed: {error}")
+        return None
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+# ---- baseline comparison ----
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of regression messages. Throughput may drop, and p99 and
+    peak RSS may grow, by at most `threshold` (a fraction) vs the baseline.
+    """
+    expected = {(r['case'], r['size']): r for r in baseline['results']}
+    problems = []
+    for result in results:
+        base = expected.get((result['case'], result['size']))
+        if base is None:
+            continue
+        name = f"{result['case']}@{result['size']}"
+        if result['throughput_rows_per_sec'] < base['throughput_rows_per_sec'] * (1 - threshold):
+            problems.append(f"{name}: throughput {result['throughput_rows_per_sec']:,.0f} rows/sec "
+                            f"vs baseline {base['throughput_rows_per_sec']:,.0f}")
+        if result['p99_ms'] > base['p99_ms'] * (1 + threshold):
+            problems.append(f"{name}: p99 {result['p99_ms']:.1f}ms vs baseline {base['p99_ms']:.1f}ms")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+            problems.append(f"{name}: peak RSS {result['peak_rss_mb']:.0f}MB "
+                            f"vs baseline {base['peak_rss_mb']:.0f}MB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the book, CSV and student score pipelines")
+    parser.add_argument('--sizes', default='10000',
+                        help="comma separated row counts, e.g. 10000,100000,1000000,10000000")
+    parser.add_argument('--cases', default=','.join(CASES), help="comma separated subset of " + ','.join(CASES))
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--baseline', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed regression as a fraction (default 0.25)")
+    parser.add_argument('--save-baseline', metavar='PATH', help="write the results as a new baseline")
+    parser.add_argument('--run-one', nargs=2, metavar=('CASE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        case, size = args.run_one
+        print(json.dumps(run_one(case, int(size), args.seed)))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    cases = [case.strip() for case in args.cases.split(',')]
+    unknown = set(cases) - set(RUNNERS)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    results = []
+    for size in sizes:
+        for case in cases:
+            result = run_isolated(case, size, args.seed)
+            if result is None:
+                continue
+            results.append(result)
+            print(f"{case:<17} {size:>10,} rows  {result['throughput_rows_per_sec']:>14,.0f} rows/sec  "
+                  f"p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+                  f"RSS {result['peak_rss_mb']:>7.1f}MB")
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"Wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.threshold)
+        if problems:
+            print("\nRegressions against baseline:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
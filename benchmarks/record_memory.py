@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# record_memory.py - bytes per record: plain dicts (before) vs the slotted
+# record types in common/records.py (after)
+#
+# books and users are read back from a seeded sqlite db both ways - the old
+# sqlite3.Row + dict(row), and the Book/User row factories - and students
+# are built from the same names and scores. tracemalloc counts everything
+# the result list keeps alive, values included, so the difference between
+# the two columns is the container overhead saved.
+#
+#   python3 benchmarks/record_memory.py
+#   python3 benchmarks/record_memory.py --rows 1000000 --output records.json
+
+import os
+import sys
+import json
+import random
+import sqlite3
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'common'))
+
+from records import Book, User, Student
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit']
+
+
+def seeded_db(rows, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE books (title TEXT PRIMARY KEY, author TEXT, year INTEGER, "
+                 "description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, content_hash TEXT)")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+                 "email TEXT UNIQUE NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    conn.executemany("INSERT INTO books (title, author, year, description, content_hash) VALUES (?, ?, ?, ?, ?)",
+                     ((f'Book {i}', f'Author {rng.randint(1, 500)}', rng.randint(1950, 2025),
+                       ' '.join(rng.choices(WORDS, k=12)), f'{rng.getrandbits(160):040x}')
+                      for i in range(rows)))
+    conn.executemany("INSERT INTO users (name, email) VALUES (?, ?)",
+                     ((f'User {i}', f'user{i}@example.com') for i in range(rows)))
+    return conn
+
+
+def measure(build):
+    # bytes still allocated once build() returns, i.e. what its result holds
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, len(result)
+
+
+def read_dicts(conn, table):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f"SELECT * FROM {table}")
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def read_records(conn, table, record_type):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM {table}")
+    cursor.row_factory = record_type.row_factory(cursor)
+    return cursor.fetchall()
+
+
+def run(rows, seed):
+    conn = seeded_db(rows, seed)
+    rng = random.Random(seed)
+    names = [f'Student {i}' for i in range(rows)]
+    scores = [rng.randint(60, 100) for _ in range(rows)]
+
+    cases = {
+        'book': (lambda: read_dicts(conn, 'books'), lambda: read_records(conn, 'books', Book)),
+        'user': (lambda: read_dicts(conn, 'users'), lambda: read_records(conn, 'users', User)),
+        'student': (lambda: [{'name': name, 'score': score} for name, score in zip(names, scores)],
+                    lambda: [Student(name, score) for name, score in zip(names, scores)]),
+    }
+    results = []
+    for kind, (as_dicts, as_records) in cases.items():
+        dict_bytes, count = measure(as_dicts)
+        record_bytes, _ = measure(as_records)
+        results.append({
+            'record': kind,
+            'rows': count,
+            'dict_bytes_per_record': round(dict_bytes / count, 1),
+            'record_bytes_per_record': round(record_bytes / count, 1),
+            'saved_percent': round(100 * (1 - record_bytes / dict_bytes), 1),
+        })
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per record, dicts vs slotted records")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help="write results JSON here")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.seed)
+    print(f"{'record':<8} {'rows':>10} {'dict B/rec':>12} {'record B/rec':>13} {'saved':>7}")
+    for result in results:
+        print(f"{result['record']:<8} {result['rows']:>10,} {result['dict_bytes_per_record']:>12.1f} "
+              f"{result['record_bytes_per_record']:>13.1f} {result['saved_percent']:>6.1f}%")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'rows': args.rows, 'seed': args.seed, 'results': results}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# db_connections.py - shared sqlite connection handling for the Book API
+# and CSV import tools
+#
+# opening a new sqlite3 connection per method call means paying for the
+# connect, the pragmas and the schema parse every time. this keeps one
+# long-lived writer connection plus a small pool of readers around instead.
+
+import sqlite3
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# WAL + NORMAL sync is the usual "fast but still safe" combo,
+# cache_size is negative so it's in KiB
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+}
+
+
+class ConnectionManager:
+    """
+    One writer connection plus a pool of read connections for a sqlite file.
+    
+        db = ConnectionManager("books.db")
+        with db.writer() as conn:
+            conn.execute("INSERT ...")   # committed when the block exits
+        with db.reader() as conn:
+            rows = conn.execute("SELECT ...").fetchall()
+        db.close()
+    
+    Pragmas are applied once per connection when it's opened, and every
+    connection keeps a prepared statement cache (cached_statements) so
+    repeated queries skip the SQL compile step.
+    
+    The writer is shared by all threads behind a lock. Readers are handed out
+    from a pool of at most max_readers connections; a thread that asks for
+    one while they're all busy waits for one to come back.
+    
+    data_version() changes whenever anything is committed to the database,
+    by us or by another process, which is what QueryCache keys on.
+    """
+    
+    def __init__(self, db_path, pragmas=None, max_readers=4, cached_statements=256, timeout=30):
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.max_readers = max_readers
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._idle_readers = queue.LifoQueue()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        
+        # bumped after every commit made through writer()
+        self.write_generation = 0
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        
+        # an in-memory db only exists inside one connection, so readers
+        # have to go through the writer connection there
+        self._shared_memory = db_path == ':memory:'
+    
+    def _connect(self):
+        # autocommit mode - writer() does BEGIN/COMMIT itself, which also
+        # lets callers use savepoints inside a write
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+    
+    def _get_writer(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection manager is closed")
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+    
+    @contextmanager
+    def writer(self):
+        # yields the writer connection inside a transaction. nested writer()
+        # blocks just join the outer transaction.
+        with self._write_lock:
+            conn = self._get_writer()
+            if conn.in_transaction:
+                yield conn
+                return
+            
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            else:
+                if conn.in_transaction:
+                    conn.execute("COMMIT")
+                self.write_generation += 1
+    
+    @contextmanager
+    def reader(self):
+        if self._shared_memory:
+            with self._write_lock:
+                yield self._get_writer()
+            return
+        
+        conn = self._checkout_reader()
+        try:
+            yield conn
+        finally:
+            # don't hand a connection back with a read transaction still open
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if self._closed:
+                conn.close()
+            else:
+                self._idle_readers.put(conn)
+    
+    def _checkout_reader(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection manager is closed")
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._readers_lock:
+            if len(self._readers) < self.max_readers:
+                conn = self._connect()
+                self._readers.append(conn)
+                return conn
+        
+        # pool is full, wait for someone to give one back
+        return self._idle_readers.get()
+    
+    def data_version(self):
+        """
+        Returns a value that changes whenever the database changes.
+        
+        Our own commits bump write_generation. Commits from other processes
+        (or other ConnectionManagers on the same file) show up in
+        PRAGMA data_version, which sqlite changes for a connection whenever
+        some *other* connection commits - so it's read on a small connection
+        of its own that never writes and never waits on the writer lock.
+        """
+        if self._shared_memory:
+            # nobody else can see an in-memory db, our own counter is enough
+            return (self.write_generation, 0)
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection manager is closed")
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                                                     isolation_level=None, check_same_thread=False)
+            external = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+        return (self.write_generation, external)
+    
+    def close(self):
+        self._closed = True
+        with self._version_lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._idle_readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._readers_lock:
+            self._readers = []
+        logger.debug(f"Closed connections for {self.db_path}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
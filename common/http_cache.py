@@ -0,0 +1,212 @@
+# http_cache.py - on-disk HTTP response cache with conditional GETs
+#
+# stores each response body next to its ETag/Last-Modified and sends
+# If-None-Match/If-Modified-Since on the next request, so an unchanged
+# upstream costs a 304 instead of the full payload.
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    # what ResponseCache.get hands back - just enough of requests.Response
+
+    def __init__(self, url, content, not_modified=False, from_cache=False, key=None):
+        self.url = url
+        self.content = content
+        # cache key, for ResponseCache.commit()
+        self.key = key
+        # True when the body is the same one we had last time (a 304, or
+        # still inside the TTL) - callers can skip parsing/storing entirely
+        self.not_modified = not_modified
+        # True when no request went out at all (TTL hit)
+        self.from_cache = from_cache
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    Pluggable response cache shared by BookAPI and StudentScoreProcessor.
+    
+        cache = ResponseCache(".http_cache", ttl=300)
+        response = cache.get(session, url)
+        if response.not_modified:
+            ...  # nothing changed upstream
+    
+    Modes:
+        default   - conditional GET every time; if ttl is set, responses
+                    younger than ttl seconds are served without a request
+        ttl_only  - no validators at all, entries are fresh for ttl seconds
+                    and then fully refetched (for servers without ETags)
+    
+    The cache is bounded to max_bytes of bodies on disk; when it goes over,
+    the least recently used entries are evicted first.
+    
+    With get(..., defer=True) a new body is only held in memory until the
+    caller has stored it and calls commit(response); if storing fails,
+    invalidate(url) drops it. Otherwise a failed store would leave the
+    validators on disk and every later run would get a 304 for data that
+    never made it into the database.
+    """
+
+    def __init__(self, cache_dir=".http_cache", ttl=None, ttl_only=False, max_bytes=50 * 1024 * 1024):
+        if ttl_only and not ttl:
+            raise ValueError("ttl_only mode needs a ttl")
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.ttl_only = ttl_only
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        # key -> (url, response) fetched with defer=True, not yet committed
+        self._pending = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, url, params):
+        raw = url + "?" + json.dumps(sorted((params or {}).items()), default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".body", base + ".meta"
+
+    def _load(self, key):
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def _touch(self, key):
+        # bump the access time used for LRU eviction
+        body_path, _ = self._paths(key)
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+
+    def _save(self, key, url, response):
+        body_path, meta_path = self._paths(key)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'stored_at': time.time(),
+            'size': len(response.content),
+        }
+        # write to temp files first so a crash never leaves half an entry
+        with open(body_path + ".tmp", 'wb') as f:
+            f.write(response.content)
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(body_path + ".tmp", body_path)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._evict()
+
+    def _mark_fresh(self, key, meta):
+        _, meta_path = self._paths(key)
+        meta['stored_at'] = time.time()
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._touch(key)
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".body"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-len(".body")]))
+            total += stat.st_size
+
+        # oldest access first
+        entries.sort()
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            logger.debug(f"Evicted cache entry {key}")
+
+    def get(self, session, url, params=None, timeout=10, defer=False):
+        """
+        GET url through the cache. Raises requests exceptions like a normal
+        session.get + raise_for_status would.
+        
+        defer=True keeps a new body out of the cache until commit().
+        """
+        key = self._key(url, params)
+        meta, body = self._load(key)
+
+        if meta is not None and self.ttl and time.time() - meta['stored_at'] < self.ttl:
+            self.hits += 1
+            self._touch(key)
+            logger.info(f"Cache hit for {url} (within TTL)")
+            return CachedResponse(url, body, not_modified=True, from_cache=True)
+
+        headers = {}
+        if meta is not None and not self.ttl_only:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = session.get(url, params=params, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and meta is not None:
+            self.revalidated += 1
+            self._mark_fresh(key, meta)
+            logger.info(f"{url} not modified (304), using cached copy")
+            return CachedResponse(url, body, not_modified=True)
+
+        response.raise_for_status()
+        self.misses += 1
+        if defer:
+            self._pending[key] = (url, response)
+        else:
+            self._save(key, url, response)
+        return CachedResponse(url, response.content, key=key)
+
+    def commit(self, response):
+        # keep a body fetched with defer=True, now that it's been stored
+        pending = self._pending.pop(response.key, None)
+        if pending is not None:
+            self._save(response.key, *pending)
+
+    def invalidate(self, url, params=None):
+        # forget url entirely, so the next get() fetches the full body again
+        key = self._key(url, params)
+        self._pending.pop(key, None)
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".body", ".meta", ".tmp")):
+                os.remove(os.path.join(self.cache_dir, name))
+
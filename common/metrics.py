@@ -0,0 +1,258 @@
+# metrics.py - tiny counters/timers/histograms layer shared by all three tools
+#
+# everything reports into the module level `metrics` registry. it's off by
+# default and then every call returns straight away, so leaving the
+# instrumentation in costs next to nothing. turn it on with
+# DATA_API_METRICS=1 (or metrics.enable()) and dump a snapshot as
+# Prometheus text or JSON.
+
+import os
+import json
+import time
+import threading
+import logging
+from bisect import bisect_left
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "data_api_"
+
+# upper bounds (seconds) for timers - 1ms up to 30s
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        # one slot per bucket plus +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class _NullTimer:
+    # what timer() hands out while metrics are off - does nothing at all
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        for hook in self.metrics.hooks:
+            hook('start', self.name, self.labels, None)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        self.metrics.observe(self.name, elapsed, **self.labels)
+        for hook in self.metrics.hooks:
+            hook('stop', self.name, self.labels, elapsed)
+        return False
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    Registry of counters and histograms, keyed by name + labels.
+
+        metrics.inc('rows_skipped_total', 3, reason='invalid')
+        metrics.observe('rows_per_second', 12000, pipeline='books')
+        with metrics.timer('stage_seconds', stage='store', pipeline='books'):
+            ...
+        metrics.write_prometheus('metrics/books.prom')
+
+    Timers are histograms of seconds. Hooks added with add_hook(fn) are
+    called as fn(event, name, labels, seconds) with event 'start'/'stop'
+    around every timed block, which is where an external profiler (a
+    cProfile toggle, tracing spans, ...) can attach.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.hooks = []
+        self._counters = {}
+        self._histograms = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def set_buckets(self, name, buckets):
+        # custom histogram buckets for one metric (default: TIME_BUCKETS)
+        self._buckets[name] = tuple(buckets)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self._buckets.get(name, TIME_BUCKETS))
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def snapshot(self):
+        # plain dict copy of everything recorded so far
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': h.count,
+                    'sum': h.sum,
+                    'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'], _cumulative(h.counts))),
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {'timestamp': time.time(), 'counters': counters, 'histograms': histograms}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        # Prometheus text exposition format
+        snapshot = self.snapshot()
+        lines = []
+        seen_types = set()
+
+        def type_line(name, kind):
+            if name not in seen_types:
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                seen_types.add(name)
+
+        for counter in snapshot['counters']:
+            type_line(counter['name'], 'counter')
+            lines.append(f"{PREFIX}{counter['name']}{_format_labels(counter['labels'])} {counter['value']}")
+
+        for histogram in snapshot['histograms']:
+            name = histogram['name']
+            type_line(name, 'histogram')
+            for bound, count in histogram['buckets'].items():
+                labels = dict(histogram['labels'], le=bound)
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels)} {count}")
+            labels = _format_labels(histogram['labels'])
+            lines.append(f"{PREFIX}{name}_sum{labels} {histogram['sum']}")
+            lines.append(f"{PREFIX}{name}_count{labels} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _write_atomic(path, self.to_prometheus())
+
+    def write_json(self, path):
+        _write_atomic(path, self.to_json())
+
+    def dump(self, name, directory=None):
+        """
+        Write <name>.prom and <name>.json into directory (default:
+        $DATA_API_METRICS_DIR or ./metrics). Does nothing when disabled.
+        """
+        if not self.enabled:
+            return
+        directory = directory or os.environ.get('DATA_API_METRICS_DIR', 'metrics')
+        os.makedirs(directory, exist_ok=True)
+        self.write_prometheus(os.path.join(directory, f"{name}.prom"))
+        self.write_json(os.path.join(directory, f"{name}.json"))
+        logger.info(f"Wrote metrics to {directory}/{name}.prom and .json")
+
+
+def _cumulative(counts):
+    total = 0
+    result = []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def record_response(response, *args, **kwargs):
+    """
+    requests response hook - make_session installs it so every HTTP call
+    reports its latency, status and body size.
+    """
+    if not metrics.enabled:
+        return
+    host = urlparse(response.url).netloc
+    metrics.inc('http_requests_total', host=host, status=response.status_code)
+    metrics.observe('http_request_seconds', response.elapsed.total_seconds(), host=host)
+    metrics.inc('http_bytes_received_total', len(response.content), host=host)
+
+
+# the shared registry everything reports into
+metrics = Metrics(enabled=os.environ.get('DATA_API_METRICS', '') not in ('', '0'))
+metrics.set_buckets('rows_per_second', (100, 1000, 10000, 50000, 100000, 250000, 500000, 1000000))
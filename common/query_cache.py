@@ -0,0 +1,93 @@
+# query_cache.py - in-process LRU cache for read query results
+#
+# the serving path calls get_all_books/get_all_users/query_books over and
+# over while writes are rare, so each result is kept until the database
+# changes instead of being re-read and turned into dicts every time.
+
+import threading
+import logging
+from collections import OrderedDict
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    LRU cache of query results for one ConnectionManager.
+
+        cache = QueryCache(db, max_entries=128)
+        books = cache.get(('query_books', sql, tuple(params)), load_function)
+
+    Entries are keyed by whatever hashable key the caller builds from the
+    query and its parameters. Every lookup first checks db.data_version();
+    if anything was committed since the entries were loaded - through our
+    writer or by another process - the whole cache is dropped. That costs
+    one PRAGMA per call, far less than re-running the query.
+
+    Cached results are shared between callers, so get() hands back a
+    shallow copy of lists; treat the records in them as read-only.
+    max_entries=0 turns caching off.
+    """
+
+    def __init__(self, db, max_entries=128, name='query'):
+        self.db = db
+        self.max_entries = max_entries
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        # cached value for key, or load() it and remember it
+        if self.max_entries <= 0:
+            return load()
+
+        version = self.db.data_version()
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                    self._entries.clear()
+                self._version = version
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc('query_cache_total', cache=self.name, result='hit')
+                return self._copy(self._entries[key])
+            self.misses += 1
+        metrics.inc('query_cache_total', cache=self.name, result='miss')
+
+        value = load()
+
+        with self._lock:
+            # a write landed while we were loading - the value may already be
+            # stale, so don't keep it
+            if version == self._version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return self._copy(value)
+
+    def _copy(self, value):
+        return list(value) if isinstance(value, list) else value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'entries': len(self._entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,338 @@
+# request_control.py - retries, adaptive concurrency and circuit breaking
+# for the API clients (books and student scores)
+#
+# one 429 or slow page used to cost the whole run: every fetch made a
+# single attempt and gave up on any RequestException. RequestController
+# sits between the fetch code and the session and keeps going at whatever
+# rate the upstream actually allows.
+
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# worth another try after a backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# the upstream telling us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+# with no explicit latency_target, latency counts as "too high" once it's
+# latency_tolerance times the best seen, and at least this much above it
+LATENCY_SLACK = 0.05
+
+
+class CircuitOpenError(requests.ConnectionError):
+    # raised instead of sending a request to a host whose breaker is open.
+    # a ConnectionError, so the existing `except RequestException` handling applies
+    pass
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delta seconds or an HTTP
+    date), or None if there isn't a usable one.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    How many times to try and how long to wait in between.
+
+    Backoff is exponential with full jitter - a random wait between 0 and
+    base_delay * 2^(retry - 1), capped at max_delay - so clients that got
+    throttled together don't all come back at the same moment. A
+    Retry-After header on the response wins over that (up to
+    max_retry_after), plus a little jitter on top.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.25, max_delay=10, max_retry_after=60,
+                 retry_statuses=RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = tuple(retry_statuses)
+
+    def backoff(self, retry):
+        # retry is 1 for the first retry
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+    def delay(self, retry, response=None):
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after) + random.uniform(0, self.base_delay)
+        return self.backoff(retry)
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit for one host that finds the upstream's capacity by
+    itself, TCP style: additive increase, multiplicative decrease.
+
+        limiter.acquire()
+        ... request ...
+        limiter.release(latency, overloaded)
+
+    Every request that comes back fine and fast grows the limit by
+    1/limit, so about one extra slot per round of requests. A throttled or
+    failed request, a smoothed latency above the target, or an error rate
+    above error_threshold multiplies it by backoff (0.5). Decreases are at
+    most one per smoothed round trip, so a burst of 429s from one window
+    only halves the limit once.
+
+    The error rate is averaged over about error_window responses, so one
+    stray failure doesn't count against it but a steady trickle of them
+    keeps the limit coming down until they stop. error_threshold=None
+    leaves it out.
+
+    latency_target is in seconds; left as None it's derived from the
+    fastest latency seen (see LATENCY_SLACK).
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, backoff=0.5,
+                 latency_target=None, latency_tolerance=2.0, smoothing=0.2,
+                 error_threshold=0.05, error_window=50, clock=time.monotonic):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.error_threshold = error_threshold
+        self.error_window = error_window
+        self.clock = clock
+        self.in_flight = 0
+        self.latency = None
+        self.min_latency = None
+        self.error_rate = 0.0
+        self.decreases = 0
+        self._last_decrease = float('-inf')
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, overloaded=False):
+        with self._cond:
+            self.in_flight -= 1
+            s = self.smoothing
+            self.latency = latency if self.latency is None else (1 - s) * self.latency + s * latency
+            self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+            e = 1 / self.error_window
+            self.error_rate = (1 - e) * self.error_rate + e * (1.0 if overloaded else 0.0)
+
+            if overloaded or self.latency > self._target() or self._too_many_errors():
+                now = self.clock()
+                if now - self._last_decrease >= self.latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _too_many_errors(self):
+        return self.error_threshold is not None and self.error_rate > self.error_threshold
+
+    def _target(self):
+        if self.latency_target is not None:
+            return self.latency_target
+        return max(self.min_latency * self.latency_tolerance, self.min_latency + LATENCY_SLACK)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host that keeps failing.
+
+    closed    - normal. failure_threshold failures in a row open it
+    open      - every request fails fast with CircuitOpenError, for reset_timeout seconds
+    half_open - one probe request goes through; success closes the
+                breaker, failure opens it again
+
+    Failures are connection errors, timeouts and 5xx. A 429 says the host
+    is up, just busy, so it neither trips nor resets the breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def retry_in(self):
+        # seconds until an open breaker lets a probe through
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_throttled(self):
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    metrics.inc('http_circuit_opened_total')
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class RequestController:
+    """
+    Retrying, self-throttling GETs over a shared session.
+
+        http = RequestController(session)
+        response = http.get(url, params={'_page': 2})
+
+    get() has the same shape as session.get, so it can be handed to
+    anything that takes a session (ResponseCache.get does). Per host it
+    keeps an AIMDLimiter, which bounds the requests in flight, and a
+    CircuitBreaker. Failed attempts - connection errors, timeouts and
+    RETRY_STATUSES - are retried according to the RetryPolicy.
+
+    Once the attempts run out, the last response comes back as it is
+    (raise_for_status still raises) or the last exception is re-raised.
+    limiter_options/breaker_options go to the per-host AIMDLimiter and
+    CircuitBreaker. sleep is there for tests.
+    """
+
+    def __init__(self, session=None, retry=None, timeout=10, limiter_options=None,
+                 breaker_options=None, sleep=time.sleep):
+        if session is None:
+            # imported here because http_client uses this module
+            from http_client import make_session
+            session = make_session()
+        self.session = session
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout
+        self.limiter_options = limiter_options or {}
+        self.breaker_options = breaker_options or {}
+        self.sleep = sleep
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _controls(self, host):
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = (AIMDLimiter(**self.limiter_options),
+                                     CircuitBreaker(**self.breaker_options))
+            return self._hosts[host]
+
+    def limiter(self, url):
+        return self._controls(urlparse(url).netloc)[0]
+
+    def breaker(self, url):
+        return self._controls(urlparse(url).netloc)[1]
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        host = urlparse(url).netloc
+        limiter, breaker = self._controls(host)
+        attempt = 0
+        while True:
+            attempt += 1
+            if not breaker.allow():
+                metrics.inc('http_circuit_rejected_total', host=host)
+                raise CircuitOpenError(f"Circuit open for {host}, next try in {breaker.retry_in():.1f}s")
+
+            response = error = None
+            limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers,
+                                            timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except BaseException:
+                limiter.release(time.perf_counter() - started)
+                breaker.record_throttled()
+                raise
+            status = response.status_code if response is not None else None
+
+            failed = error is not None or status >= 500
+            limiter.release(time.perf_counter() - started, failed or status in THROTTLE_STATUSES)
+            if failed:
+                breaker.record_failure()
+            elif status == 429:
+                breaker.record_throttled()
+            else:
+                breaker.record_success()
+
+            if (error is None and status not in self.retry.retry_statuses) \
+                    or attempt >= self.retry.max_attempts:
+                if error is not None:
+                    raise error
+                return response
+
+            delay = self.retry.delay(attempt, response)
+            reason = str(status) if error is None else type(error).__name__
+            metrics.inc('http_retries_total', host=host, reason=reason)
+            logger.warning(f"{reason} from {url}, retrying in {delay:.2f}s "
+                           f"(attempt {attempt + 1}/{self.retry.max_attempts})")
+            if response is not None:
+                response.close()
+            self.sleep(delay)
+
+    def stats(self):
+        with self._hosts_lock:
+            hosts = dict(self._hosts)
+        return {host: {'limit': round(limiter.limit, 2), 'in_flight': limiter.in_flight,
+                       'latency': limiter.latency, 'error_rate': round(limiter.error_rate, 3),
+                       'circuit': breaker.state}
+                for host, (limiter, breaker) in hosts.items()}
@@ -0,0 +1,512 @@
+# snapshot.py - columnar snapshot of books.db / users.db for analytics
+#
+# get_all_books/get_all_users build a dict per row, which is what the tools
+# want but is a lot of objects for analysis over whole tables. this writes
+# both tables into one file of typed column arrays (strings dictionary
+# encoded) that Snapshot memory-maps and hands to numpy without copying.
+#
+#   python3 common/snapshot.py --books books.db --users users.db --output snapshot.dat
+#
+# running it again on the same file only reads the rows that changed.
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import logging
+import argparse
+from array import array
+
+from db_connections import ConnectionManager
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DAPISNAP'
+VERSION = 1
+# magic, version, reserved, header offset, header length - then padding up to ALIGN
+PREFIX = struct.Struct('<8sIIQQ')
+# every column block starts on a 64 byte boundary
+ALIGN = 64
+
+INT = 'int64'
+STRING = 'string'
+# stored in int columns for NULL
+NULL_INT = -2 ** 63
+# stored in string code columns for NULL
+NULL_CODE = -1
+
+# an incremental refresh that would touch more than this share of the rows
+# just re-exports the table
+REFRESH_MAX_CHANGED = 0.5
+
+# timestamps go out as unix seconds; rows with a NULL title can't be keyed
+# in the change log, so they're left out
+TABLES = {
+    'books': {
+        'columns': [('title', STRING), ('author', STRING), ('year', INT),
+                    ('description', STRING), ('created_at', INT)],
+        'select': "SELECT title, author, year, description, "
+                  "CAST(strftime('%s', created_at) AS INTEGER) FROM books WHERE title IS NOT NULL",
+    },
+    'users': {
+        'columns': [('id', INT), ('name', STRING), ('email', STRING), ('created_at', INT)],
+        'select': "SELECT id, name, email, CAST(strftime('%s', created_at) AS INTEGER) FROM users",
+    },
+}
+
+_np = None
+
+
+def _numpy():
+    # numpy is optional - without it columns come back as memoryviews
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = False
+    return _np or None
+
+
+def _pad(out):
+    position = out.tell()
+    if position % ALIGN:
+        out.write(bytes(ALIGN - position % ALIGN))
+    return out.tell()
+
+
+def _write_block(out, values):
+    # the file is little-endian whatever machine wrote it
+    offset = _pad(out)
+    if sys.byteorder == 'big' and isinstance(values, array) and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    out.write(values)
+    return [offset, out.tell() - offset]
+
+
+def _read_array(buffer, block, typecode):
+    offset, nbytes = block
+    values = array(typecode)
+    values.frombytes(buffer[offset:offset + nbytes])
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+
+class _IntColumn:
+    kind = INT
+
+    def __init__(self):
+        self.values = array('q')
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        self.values.append(NULL_INT if value is None else value)
+
+    def take(self, keep):
+        values = self.values
+        self.values = array('q', [values[i] for i in keep])
+
+    def write(self, out):
+        return {'kind': INT, 'data': _write_block(out, self.values)}
+
+    def load(self, snapshot, meta):
+        self.values = _read_array(snapshot._mmap, meta['data'], 'q')
+
+
+class _StringColumn:
+    # int32 codes per row plus the distinct strings they point at
+    kind = STRING
+
+    def __init__(self):
+        self.codes = array('i')
+        self.values = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(NULL_CODE)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def take(self, keep):
+        # keep only the rows in keep, and drop dictionary entries nothing uses any more
+        old_codes, old_values = self.codes, self.values
+        self.codes, self.values, self.index = array('i'), [], {}
+        for i in keep:
+            code = old_codes[i]
+            self.append(None if code == NULL_CODE else old_values[code])
+
+    def write(self, out):
+        encoded = [value.encode('utf-8') for value in self.values]
+        offsets = array('Q', [0])
+        total = 0
+        for value in encoded:
+            total += len(value)
+            offsets.append(total)
+        return {
+            'kind': STRING,
+            'data': _write_block(out, self.codes),
+            'dictionary': {
+                'size': len(encoded),
+                'offsets': _write_block(out, offsets),
+                'bytes': _write_block(out, b''.join(encoded)),
+            },
+        }
+
+    def load(self, snapshot, meta):
+        self.codes = _read_array(snapshot._mmap, meta['data'], 'i')
+        self.values = snapshot._decode_dictionary(meta['dictionary'])
+        self.index = {value: code for code, value in enumerate(self.values)}
+
+
+_COLUMN_TYPES = {INT: _IntColumn, STRING: _StringColumn}
+
+
+class _TableBuilder:
+    # one table's columns being built up in memory before they're written
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = {name: _COLUMN_TYPES[kind]() for name, kind in TABLES[table]['columns']}
+
+    @property
+    def rows(self):
+        return len(next(iter(self.columns.values())))
+
+    @classmethod
+    def from_snapshot(cls, snapshot, table):
+        builder = cls(table)
+        for name, column in builder.columns.items():
+            column.load(snapshot, snapshot._column_meta(table, name))
+        return builder
+
+    def append_rows(self, rows):
+        appends = [column.append for column in self.columns.values()]
+        added = 0
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+            added += 1
+        return added
+
+    def take(self, keep):
+        for column in self.columns.values():
+            column.take(keep)
+
+    def write(self, out):
+        return {'rows': self.rows,
+                'columns': {name: column.write(out) for name, column in self.columns.items()}}
+
+
+def _export_books(db, previous):
+    """
+    Returns (builder, watermark, mode, rows read from sqlite). previous is
+    the old Snapshot to refresh from, or None for a full export.
+    """
+    select = TABLES['books']['select']
+    with db.reader() as conn:
+        # one read transaction, so the log position matches the rows we read
+        conn.execute("BEGIN")
+        # the books_changes log is kept by BookAPI(change_log=True) - the
+        # export only reads it. without it there's no telling what changed
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                            "AND name = 'books_changes'").fetchone():
+            builder = _TableBuilder('books')
+            return builder, None, 'full', builder.append_rows(conn.execute(select))
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM books_changes").fetchone()[0]
+        since = previous.header['tables']['books']['watermark'] if previous else None
+        # a log that went backwards means a different/rebuilt database
+        if since is not None and since <= seq:
+            changed = conn.execute("SELECT COUNT(*) FROM books_changes WHERE seq > ?",
+                                   (since,)).fetchone()[0]
+            if changed == 0:
+                return _TableBuilder.from_snapshot(previous, 'books'), seq, 'unchanged', 0
+            if changed <= previous.rows('books') * REFRESH_MAX_CHANGED:
+                builder = _TableBuilder.from_snapshot(previous, 'books')
+                titles = {row[0] for row in conn.execute(
+                    "SELECT title FROM books_changes WHERE seq > ?", (since,))}
+                # drop the old version of every changed title, then read the
+                # current one (deleted titles just don't come back)
+                column = builder.columns['title']
+                values = column.values
+                builder.take([i for i, code in enumerate(column.codes) if values[code] not in titles])
+                read = builder.append_rows(conn.execute(
+                    select + " AND title IN (SELECT title FROM books_changes WHERE seq > ?)", (since,)))
+                return builder, seq, 'incremental', read
+
+        builder = _TableBuilder('books')
+        read = builder.append_rows(conn.execute(select))
+        return builder, seq, 'full', read
+
+
+def _export_users(db, previous):
+    # users only ever get appended (INSERT OR IGNORE), so the highest id
+    # exported is all the refresh needs
+    select = TABLES['users']['select']
+    with db.reader() as conn:
+        conn.execute("BEGIN")
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+        since = previous.header['tables']['users']['watermark'] if previous else None
+        if since is not None and since <= max_id:
+            builder = _TableBuilder.from_snapshot(previous, 'users')
+            if since == max_id:
+                return builder, max_id, 'unchanged', 0
+            read = builder.append_rows(conn.execute(select + " WHERE id > ? ORDER BY id", (since,)))
+            return builder, max_id, 'incremental', read
+
+        builder = _TableBuilder('users')
+        read = builder.append_rows(conn.execute(select + " ORDER BY id"))
+        return builder, max_id, 'full', read
+
+
+_EXPORTERS = {'books': _export_books, 'users': _export_users}
+
+
+def export_snapshot(path, books_db=None, users_db=None, full=False):
+    """
+    Write books_db and/or users_db to the snapshot file at path.
+
+    If path already holds a snapshot of the same databases, each table is
+    refreshed from it: books through the books_changes log (only titles
+    changed since the last export are read back), users from the highest id
+    exported. The log is kept by BookAPI(change_log=True); without it books
+    are always exported in full. Tables that changed too much, or whose database looks
+    rebuilt, are exported in full, as is everything with full=True.
+
+    Users are assumed append-only - rows deleted or edited in users.db
+    after they were exported only show up after a full export.
+
+    The new file is written next to the old one and swapped in with
+    os.replace, so open Snapshots keep reading the old version.
+
+    Returns {table: {'rows': ..., 'read': ..., 'mode': 'full' | 'incremental' | 'unchanged'}}.
+    """
+    sources = {'books': books_db, 'users': users_db}
+    sources = {table: os.path.abspath(db_path) for table, db_path in sources.items() if db_path}
+    if not sources:
+        raise ValueError("Nothing to export - pass books_db and/or users_db")
+    for db_path in sources.values():
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(db_path)
+
+    previous = None
+    if not full and os.path.exists(path):
+        try:
+            previous = Snapshot(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Can't refresh from {path} ({e}), exporting everything")
+
+    summary = {}
+    tables = {}
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as out:
+            out.write(bytes(ALIGN))
+            for table, db_path in sources.items():
+                old = None
+                if previous is not None and previous.header['tables'].get(table, {}).get('source') == db_path:
+                    old = previous
+                with metrics.timer('stage_seconds', pipeline='snapshot', stage=table), \
+                        ConnectionManager(db_path) as db:
+                    builder, watermark, mode, read = _EXPORTERS[table](db, old)
+                meta = builder.write(out)
+                meta.update(source=db_path, watermark=watermark, mode=mode)
+                tables[table] = meta
+                summary[table] = {'rows': builder.rows, 'read': read, 'mode': mode}
+                metrics.inc('rows_exported_total', read, table=table, mode=mode)
+                logger.info(f"Snapshot {table}: {builder.rows} rows ({mode}, {read} read from sqlite)")
+
+            header = json.dumps({'version': VERSION, 'created_at': time.time(),
+                                 'tables': tables}).encode('utf-8')
+            header_offset = _pad(out)
+            out.write(header)
+            out.seek(0)
+            out.write(PREFIX.pack(MAGIC, VERSION, 0, header_offset, len(header)))
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        if previous is not None:
+            previous.close()
+
+    os.replace(temp_path, path)
+    return summary
+
+
+class Snapshot:
+    """
+    Read side of a snapshot file, memory-mapped.
+
+        with Snapshot("snapshot.dat") as snap:
+            years = snap.column('books', 'year')        # numpy int64 array, no copy
+            authors = snap.column('books', 'author')    # int32 codes...
+            snap.dictionary('books', 'author')          # ...into this list of strings
+            by_author = authors == snap.code('books', 'author', 'Author 3')
+            snap.strings('books', 'title')              # decoded, one str per row
+            snap.refresh()                              # pull in what changed since
+
+    Int columns hold NULL_INT for NULL, string codes NULL_CODE (-1).
+    Timestamps are unix seconds. Row order has no meaning - an incremental
+    refresh appends changed rows at the end.
+
+    column() is a view straight into the mapped file; without numpy it's a
+    memoryview (which np.asarray or any buffer-protocol reader can take).
+    Arrays handed out keep the mapping alive after close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < PREFIX.size:
+            raise ValueError(f"{self.path} is not a snapshot file")
+        magic, version, _, header_offset, header_length = PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a snapshot file")
+        if version != VERSION:
+            raise ValueError(f"{self.path} is snapshot version {version}, expected {VERSION}")
+        self.header = json.loads(self._mmap[header_offset:header_offset + header_length])
+        self._dictionaries = {}
+        self._indexes = {}
+
+    @property
+    def tables(self):
+        return list(self.header['tables'])
+
+    @property
+    def created_at(self):
+        return self.header['created_at']
+
+    def rows(self, table):
+        return self._table_meta(table)['rows']
+
+    def columns(self, table):
+        return list(self._table_meta(table)['columns'])
+
+    def _table_meta(self, table):
+        try:
+            return self.header['tables'][table]
+        except KeyError:
+            raise KeyError(f"No table {table!r} in {self.path}") from None
+
+    def _column_meta(self, table, name):
+        try:
+            return self._table_meta(table)['columns'][name]
+        except KeyError:
+            raise KeyError(f"No column {name!r} in {table}") from None
+
+    def _view(self, block, typecode, dtype):
+        offset, nbytes = block
+        np = _numpy()
+        if np is not None:
+            return np.frombuffer(self._mmap, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize,
+                                 offset=offset)
+        # memoryview casts use the machine's byte order - fine on little-endian
+        return memoryview(self._mmap)[offset:offset + nbytes].cast(typecode)
+
+    def column(self, table, name):
+        # int64 values, or int32 dictionary codes for string columns
+        meta = self._column_meta(table, name)
+        if meta['kind'] == INT:
+            return self._view(meta['data'], 'q', '<i8')
+        return self._view(meta['data'], 'i', '<i4')
+
+    def _decode_dictionary(self, meta):
+        offsets = _read_array(self._mmap, meta['offsets'], 'Q')
+        start = meta['bytes'][0]
+        raw = self._mmap[start:start + meta['bytes'][1]]
+        return [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(meta['size'])]
+
+    def dictionary(self, table, name):
+        # the distinct strings of a string column, in code order
+        key = (table, name)
+        if key not in self._dictionaries:
+            meta = self._column_meta(table, name)
+            if meta['kind'] != STRING:
+                raise TypeError(f"{table}.{name} is not a string column")
+            self._dictionaries[key] = self._decode_dictionary(meta['dictionary'])
+        return self._dictionaries[key]
+
+    def code(self, table, name, value):
+        # the code value has in a string column, None if it never occurs
+        key = (table, name)
+        if key not in self._indexes:
+            self._indexes[key] = {v: code for code, v in enumerate(self.dictionary(table, name))}
+        return self._indexes[key].get(value)
+
+    def strings(self, table, name):
+        # decoded column - builds one str per row, so use codes where you can
+        values = self.dictionary(table, name)
+        return [values[code] if code != NULL_CODE else None
+                for code in self.column(table, name).tolist()]
+
+    def refresh(self, full=False):
+        """
+        Re-export from the databases this snapshot was made from (see
+        export_snapshot) and remap the new file. Returns the export summary.
+        """
+        sources = {table: meta['source'] for table, meta in self.header['tables'].items()}
+        self.close()
+        try:
+            summary = export_snapshot(self.path, books_db=sources.get('books'),
+                                      users_db=sources.get('users'), full=full)
+        finally:
+            self._open()
+        return summary
+
+    def close(self):
+        self._dictionaries = {}
+        self._indexes = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # column arrays still point into the map; it's unmapped once they're gone
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export books.db/users.db to a columnar snapshot file")
+    parser.add_argument('--books', help="books database to export")
+    parser.add_argument('--users', help="users database to export")
+    parser.add_argument('--output', default="snapshot.dat", help="snapshot file (refreshed if it exists)")
+    parser.add_argument('--full', action='store_true', help="re-export everything instead of refreshing")
+    args = parser.parse_args()
+    if not args.books and not args.users:
+        parser.error("pass --books and/or --users")
+
+    summary = export_snapshot(args.output, books_db=args.books, users_db=args.users, full=args.full)
+    for table, info in summary.items():
+        print(f"{table}: {info['rows']} rows ({info['mode']}, {info['read']} read)")
+    metrics.dump('snapshot')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# mock_api.py - tiny local stand-in for the JSONPlaceholder endpoints
+# so the fetch code can be tested without hitting the internet
+
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+def make_posts(count):
+    return [
+        {
+            'userId': (i % 10) + 1,
+            'id': i + 1,
+            'title': f'post title {i + 1}',
+            'body': f'post body {i + 1}'
+        }
+        for i in range(count)
+    ]
+
+
+class SyntheticPosts:
+    """
+    Lazy, seeded stand-in for a huge list of posts - slicing it builds just
+    the posts asked for, so the mock can serve millions without holding them.
+    The same seed always gives the same posts.
+    """
+
+    WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing',
+             'elit', 'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'labore']
+
+    def __init__(self, count, seed=0):
+        self.count = count
+        self.seed = seed
+
+    def __len__(self):
+        return self.count
+
+    def _post(self, i):
+        rng = random.Random(self.seed * 1_000_003 + i)
+        return {
+            'userId': rng.randint(1, 10),
+            'id': i + 1,
+            'title': ' '.join(rng.choices(self.WORDS, k=4)) + f' {i + 1}',
+            'body': ' '.join(rng.choices(self.WORDS, k=rng.randint(10, 30)))
+        }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._post(i) for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self._post(index)
+
+
+def make_users(count):
+    return [{'id': i + 1, 'name': f'User {i + 1}'} for i in range(count)]
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        # keep test output quiet
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        resource = parsed.path.strip('/').split('/')[0]
+
+        data = self.server.resources.get(resource)
+        if data is None:
+            self.send_json({'error': 'not found'}, status=404)
+            return
+
+        self.server.hits.append(self.path)
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            # injected throttling: queued faults first, then the concurrency cap
+            fault = self.server.faults.pop(0) if self.server.faults else None
+            if fault is None and self.server.max_concurrent and \
+                    self.server.in_flight > self.server.max_concurrent:
+                fault = 429
+            if fault is not None:
+                self.server.throttled += 1
+        try:
+            if self.server.delay:
+                time.sleep(self.server.delay)
+            if fault is not None:
+                self.send_fault(fault)
+            else:
+                self.send_resource(data, query)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def send_fault(self, status):
+        body = json.dumps({'error': 'slow down' if status == 429 else 'unavailable'}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.retry_after is not None:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_resource(self, data, query):
+        if 'cursor' in query or 'limit' in query:
+            # cursor style: {'data': [...], 'next_cursor': ...}
+            start = int(query.get('cursor', ['0'])[0] or 0)
+            limit = int(query.get('limit', ['10'])[0])
+            page = data[start:start + limit]
+            next_cursor = str(start + limit) if start + limit < len(data) else None
+            self.send_json({'data': page, 'next_cursor': next_cursor})
+            return
+
+        # jsonplaceholder style: _page/_limit or _start/_limit, plain list
+        if '_limit' in query:
+            limit = int(query['_limit'][0])
+            if '_page' in query:
+                start = (int(query['_page'][0]) - 1) * limit
+            else:
+                start = int(query.get('_start', ['0'])[0])
+            data = data[start:start + limit]
+
+        # [:] turns a SyntheticPosts into a real list (and copies a list)
+        self.send_json(data[:])
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+
+        # conditional GET support so the response cache can be tested
+        if status == 200:
+            if self.server.send_etag and self.headers.get('If-None-Match') == etag:
+                self.send_not_modified()
+                return
+            if (self.server.last_modified and not self.headers.get('If-None-Match')
+                    and self.headers.get('If-Modified-Since') == self.server.last_modified):
+                self.send_not_modified()
+                return
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.send_etag:
+            self.send_header('ETag', etag)
+        if self.server.last_modified:
+            self.send_header('Last-Modified', self.server.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_not_modified(self):
+        self.server.not_modified += 1
+        self.send_response(304)
+        self.end_headers()
+
+
+class MockAPIServer:
+    """
+    Runs the mock API on a random local port in a background thread.
+
+        with MockAPIServer(num_posts=250) as server:
+            BookAPI(api_url=server.url('posts'))
+    """
+
+    def __init__(self, num_posts=100, num_users=10, delay=0, send_etag=True,
+                 last_modified='Mon, 06 Jan 2025 10:00:00 GMT', posts=None,
+                 faults=None, max_concurrent=None, retry_after=None):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), MockAPIHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.resources = {
+            'posts': posts if posts is not None else make_posts(num_posts),
+            'users': make_users(num_users),
+        }
+        self.httpd.hits = []
+        # delay (seconds) makes each request slow so concurrency is visible
+        self.httpd.delay = delay
+        self.httpd.lock = threading.Lock()
+        self.httpd.in_flight = 0
+        self.httpd.max_in_flight = 0
+        self.httpd.send_etag = send_etag
+        self.httpd.last_modified = last_modified
+        self.httpd.not_modified = 0
+        # throttling stand-in: faults is a list of statuses (429, 503...) sent
+        # to the next requests in order; past max_concurrent requests in
+        # flight the extra ones get a 429. both send Retry-After if given
+        self.httpd.faults = list(faults or [])
+        self.httpd.max_concurrent = max_concurrent
+        self.httpd.retry_after = retry_after
+        self.httpd.throttled = 0
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs={'poll_interval': 0.05}, daemon=True)
+
+    @property
+    def hits(self):
+        return self.httpd.hits
+
+    @property
+    def resources(self):
+        # change these to simulate upstream updates
+        return self.httpd.resources
+
+    @property
+    def not_modified(self):
+        # how many 304s were sent
+        return self.httpd.not_modified
+
+    @property
+    def throttled(self):
+        # how many 429/5xx were injected
+        return self.httpd.throttled
+
+    @property
+    def faults(self):
+        # append statuses here to inject more failures mid-test
+        return self.httpd.faults
+
+    @property
+    def max_in_flight(self):
+        return self.httpd.max_in_flight
+
+    def url(self, resource):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/{resource}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,55 @@
+# test_bench.py - sanity checks for the benchmark harness (not the numbers)
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from bench import compare, percentile, run_one, synthetic_books, CASES, OPERATIONS, MIN_REPEATS
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([5], 99) == 5
+    assert percentile([], 50) == 0.0
+
+
+def test_synthetic_data_is_seeded():
+    first = list(synthetic_books(50, seed=9))
+    assert first == list(synthetic_books(50, seed=9))
+    assert first != list(synthetic_books(50, seed=10))
+
+
+def test_compare_flags_regressions():
+    base = {'case': 'csv_import', 'size': 1000, 'throughput_rows_per_sec': 1000.0,
+            'p99_ms': 10.0, 'peak_rss_mb': 50.0}
+    baseline = {'results': [base]}
+    
+    ok = dict(base, throughput_rows_per_sec=900.0, p99_ms=11.0)
+    assert compare([ok], baseline, 0.25) == []
+    
+    slow = dict(base, throughput_rows_per_sec=500.0, p99_ms=30.0, peak_rss_mb=100.0)
+    assert len(compare([slow], baseline, 0.25)) == 3
+    
+    # sizes missing from the baseline are ignored
+    assert compare([dict(slow, size=5)], baseline, 0.25) == []
+
+
+def test_run_one_reports_everything():
+    for case in CASES:
+        result = run_one(case, 500, seed=1)
+        assert result['rows'] >= 500, case
+        assert result['throughput_rows_per_sec'] > 0
+        assert result['p99_ms'] >= result['p50_ms'] > 0
+        assert result['peak_rss_mb'] > 0
+        # enough samples for the percentiles to mean something
+        assert result['operations'] >= min(MIN_REPEATS, OPERATIONS), case
+
+
+if __name__ == "__main__":
+    test_percentile()
+    test_synthetic_data_is_seeded()
+    test_compare_flags_regressions()
+    test_run_one_reports_everything()
+    print("Benchmark harness tests passed")
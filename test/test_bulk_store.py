@@ -0,0 +1,70 @@
+# test_bulk_store.py - checks the bulk write path in book_api.py
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Book-API'))
+
+from book_api import BookAPI
+
+TEST_DB = "test_bulk_books.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def make_books(count):
+    # generator on purpose, store_books_bulk should take any iterable
+    for i in range(count):
+        yield {
+            'title': f'Book {i}',
+            'author': f'Author {i % 7}',
+            'year': 2000 + (i % 20),
+            'description': f'Description for book {i}'
+        }
+
+
+def test_bulk_store_chunks_and_overwrites():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    
+    result = book_api.store_books_bulk(make_books(2500), chunk_size=1000)
+    assert result['stored'] == 2500
+    assert result['failed'] == 0
+    assert result['rows_per_sec'] > 0
+    
+    # same title again should overwrite, not add a row
+    book_api.store_books_bulk([{'title': 'Book 1', 'author': 'Someone Else',
+                                'year': 1999, 'description': 'changed'}])
+    books = book_api.get_all_books()
+    assert len(books) == 2500
+    book = next(b for b in books if b['title'] == 'Book 1')
+    assert book['author'] == 'Someone Else'
+    
+    book_api.close()
+    cleanup()
+
+
+def test_bulk_store_counts_bad_rows():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    
+    books = list(make_books(10))
+    books.insert(3, "not a book")  # can't even build params for this
+    books.insert(6, {'title': 'Bad description', 'description': ['lists', 'cant', 'bind']})
+    
+    result = book_api.store_books_bulk(books, chunk_size=4)
+    assert result['stored'] == 10
+    assert result['failed'] == 2
+    assert len(book_api.get_all_books()) == 10
+    
+    book_api.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_bulk_store_chunks_and_overwrites()
+    test_bulk_store_counts_bad_rows()
+    print("Bulk store tests passed")
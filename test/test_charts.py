@@ -0,0 +1,61 @@
+# test_charts.py - bar/text charts switch to top-N + histogram for big cohorts
+
+import sys
+import os
+import io
+import random
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'StudentScore-API'))
+
+import student_scores
+import student_scores_simple
+
+
+def make_students(count, seed=5):
+    rng = random.Random(seed)
+    return [{'name': f'Student {i}', 'score': rng.randint(60, 100)} for i in range(count)]
+
+
+def test_text_chart_small_is_one_line_per_student():
+    students = make_students(10)
+    out = io.StringIO()
+    student_scores_simple.StudentScoreProcessor().create_text_chart(students, 80.0, file=out)
+    text = out.getvalue()
+    assert "BAR CHART" in text
+    for student in students:
+        assert student['name'] in text
+    assert "AVERAGE" in text
+
+
+def test_text_chart_large_is_bounded():
+    students = make_students(200_000)
+    students[1234]['score'] = 101  # make the top entry predictable
+    out = io.StringIO()
+    started = time.perf_counter()
+    student_scores_simple.StudentScoreProcessor().create_text_chart(students, 80.0, top_n=5, bins=4, file=out)
+    assert time.perf_counter() - started < 5
+
+    lines = out.getvalue().splitlines()
+    # header + 5 top rows + 4 bins + a few labels, not 200k lines
+    assert len(lines) < 25
+    assert "Student 1234" in lines[5]
+    counts = [int(line.rsplit(' ', 1)[1].replace(',', '')) for line in lines if ' - ' in line]
+    assert sum(counts) == 200_000
+
+
+def test_bar_chart_aggregated_headless(tmp_path):
+    processor = student_scores.StudentScoreProcessor()
+    students = make_students(100_000)
+
+    output = str(tmp_path / 'big.svg')
+    started = time.perf_counter()
+    assert processor.create_bar_chart(students, 80.0, output=output, max_bars=50) == output
+    assert time.perf_counter() - started < 10
+    svg = open(output).read()
+    assert svg.lstrip().startswith('<?xml')
+
+    # small cohorts keep one bar per student, format picked explicitly
+    small = str(tmp_path / 'small.chart')
+    processor.create_bar_chart(make_students(5), 80.0, output=small, fmt='png', dpi=50)
+    with open(small, 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'
@@ -0,0 +1,79 @@
+# test_concurrent_fetch.py - concurrent multi-source fetching against the local mock API
+
+import sys
+import os
+import time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'StudentScore-API'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from book_api import BookAPI
+from student_scores_simple import StudentScoreProcessor
+from http_client import ConcurrentFetcher
+from mock_api import MockAPIServer
+
+TEST_DB = "test_concurrent_books.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def test_fetch_all_keeps_input_order_and_host_limit():
+    with MockAPIServer(num_posts=100, delay=0.05) as server:
+        fetcher = ConcurrentFetcher(max_workers=8, per_host_limit=3)
+        requests_list = [(server.url('posts'), {'_page': page, '_limit': 10})
+                         for page in range(10, 0, -1)]
+        
+        started = time.perf_counter()
+        results = fetcher.fetch_all(requests_list)
+        elapsed = time.perf_counter() - started
+        
+        first_ids = [page[0]['id'] for page in results]
+        assert first_ids == [91, 81, 71, 61, 51, 41, 31, 21, 11, 1]
+        assert server.max_in_flight <= 3
+        # 10 slow requests, 3 at a time - well under the serial 0.5s
+        assert elapsed < 0.45
+
+
+def test_failed_source_is_skipped():
+    with MockAPIServer(num_posts=20) as server:
+        fetcher = ConcurrentFetcher()
+        results = fetcher.fetch_all([server.url('posts'), server.url('nope')])
+        assert len(results[0]) == 20
+        assert results[1] is None
+
+
+def test_book_api_pages_concurrently():
+    cleanup()
+    with MockAPIServer(num_posts=95) as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'))
+        books = book_api.fetch_books_concurrently(pages=range(1, 11), page_size=10)
+        assert [book['title'] for book in books] == [f'post title {i}' for i in range(1, 96)]
+        
+        books = book_api.fetch_books_concurrently(urls=[server.url('posts'), server.url('posts')])
+        assert len(books) == 190
+        book_api.close()
+    cleanup()
+
+
+def test_student_scores_from_several_urls():
+    with MockAPIServer(num_users=15) as server:
+        processor = StudentScoreProcessor()
+        students = processor.fetch_scores_from_urls([server.url('users')] * 3)
+        assert len(students) == 45
+        assert students[0]['name'] == 'User 1'
+        assert students[15]['name'] == 'User 1'
+        assert all(60 <= student['score'] <= 100 for student in students)
+
+
+if __name__ == "__main__":
+    test_fetch_all_keeps_input_order_and_host_limit()
+    test_failed_source_is_skipped()
+    test_book_api_pages_concurrently()
+    test_student_scores_from_several_urls()
+    print("Concurrent fetch tests passed")
@@ -0,0 +1,90 @@
+# test_connections.py - checks the shared sqlite connection manager
+
+import sys
+import os
+import threading
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+
+from db_connections import ConnectionManager
+
+TEST_DB = "test_connections.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def test_writer_commits_and_rolls_back():
+    cleanup()
+    with ConnectionManager(TEST_DB) as db:
+        with db.writer() as conn:
+            conn.execute("CREATE TABLE items (name TEXT PRIMARY KEY)")
+            conn.execute("INSERT INTO items VALUES ('kept')")
+        
+        try:
+            with db.writer() as conn:
+                conn.execute("INSERT INTO items VALUES ('lost')")
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        
+        with db.reader() as conn:
+            names = [row[0] for row in conn.execute("SELECT name FROM items")]
+        assert names == ['kept']
+        
+        # pragmas were applied to the connection
+        with db.reader() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    cleanup()
+
+
+def test_connections_are_reused_and_bounded():
+    cleanup()
+    db = ConnectionManager(TEST_DB, max_readers=2)
+    with db.writer() as first:
+        pass
+    with db.writer() as second:
+        pass
+    assert first is second
+    
+    seen = set()
+    
+    def read():
+        for _ in range(20):
+            with db.reader() as conn:
+                conn.execute("SELECT 1").fetchone()
+                seen.add(id(conn))
+    
+    threads = [threading.Thread(target=read) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert 1 <= len(seen) <= 2
+    
+    db.close()
+    try:
+        with db.reader():
+            pass
+        assert False, "closed manager should refuse new connections"
+    except Exception:
+        pass
+    cleanup()
+
+
+def test_memory_database_shares_writer():
+    with ConnectionManager(':memory:') as db:
+        with db.writer() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.execute("INSERT INTO t VALUES (1)")
+        with db.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+
+if __name__ == "__main__":
+    test_writer_commits_and_rolls_back()
+    test_connections_are_reused_and_bounded()
+    test_memory_database_shares_writer()
+    print("Connection manager tests passed")
@@ -33,6 +33,7 @@ def main():
     
     print(f"Test results: {imported} imported, {skipped} skipped")
     importer.display_users()
+    importer.close()
     
     os.remove('test_users.csv')
     os.remove('test_users.db')
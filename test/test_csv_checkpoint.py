@@ -0,0 +1,145 @@
+# test_csv_checkpoint.py - import_csv_fast/import_csv_parallel commit a
+# checkpoint with every batch and can resume after a crash
+
+import sys
+import os
+import csv
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+
+from csv_import import CSVImporter
+
+TEST_DB = "test_csv_checkpoint.db"
+CLEAN_DB = "test_csv_checkpoint_clean.db"
+TEST_CSV = "test_csv_checkpoint.csv"
+
+
+def cleanup():
+    for db in (TEST_DB, CLEAN_DB):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db + suffix):
+                os.remove(db + suffix)
+    if os.path.exists(TEST_CSV):
+        os.remove(TEST_CSV)
+
+
+def write_csv(rows=2000, quoted_newlines=True):
+    with open(TEST_CSV, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'email'])
+        for i in range(rows):
+            if i % 7 == 0:
+                email = 'broken@'
+            elif i % 5 == 0:
+                email = f'user{i // 2}@example.com'
+            else:
+                email = f'user{i}@example.com'
+            # a quoted newline now and then - offsets must still land on record starts
+            name = f'User {i}\nJr.' if quoted_newlines and i % 97 == 0 else f'Üser {i}'
+            writer.writerow([name, email])
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(importer, batches):
+    # make _write_batch blow up once `batches` batches went through
+    write_batch = importer._write_batch
+    calls = []
+
+    def failing(valid):
+        calls.append(len(valid))
+        if len(calls) > batches:
+            raise Crash("simulated crash")
+        return write_batch(valid)
+
+    importer._write_batch = failing
+
+
+def clean_result(method, **kwargs):
+    with CSVImporter(CLEAN_DB) as importer:
+        result = getattr(importer, method)(TEST_CSV, **kwargs)
+        return result, importer.last_import_stats, importer.count_users()
+
+
+def test_fast_import_resumes_after_crash():
+    cleanup()
+    write_csv()
+    expected, expected_stats, expected_users = clean_result('import_csv_fast', batch_size=300)
+
+    importer = CSVImporter(TEST_DB)
+    crash_after(importer, 3)
+    partial = importer.import_csv_fast(TEST_CSV, batch_size=300)
+    checkpoint = importer.get_checkpoint(TEST_CSV)
+    # what's committed is exactly what the checkpoint says
+    assert partial == (checkpoint['imported'], checkpoint['skipped'])
+    assert sum(partial) == 900
+    assert importer.count_users() == checkpoint['imported']
+    assert not checkpoint['completed']
+    assert 0 < checkpoint['byte_offset'] < os.path.getsize(TEST_CSV)
+    importer.close()
+
+    # a new run picks up at the checkpoint and only reads what's left
+    importer = CSVImporter(TEST_DB)
+    seen = []
+    write_batch = importer._write_batch
+    importer._write_batch = lambda valid: (seen.append(len(valid)), write_batch(valid))[1]
+    assert importer.import_csv_fast(TEST_CSV, batch_size=300, resume=True) == expected
+    assert importer.last_import_stats == expected_stats
+    assert importer.count_users() == expected_users
+    assert importer.get_checkpoint(TEST_CSV)['completed']
+    assert sum(seen) < 2000 - 900
+
+    # resuming a finished file doesn't touch it again
+    crash_after(importer, 0)
+    assert importer.import_csv_fast(TEST_CSV, resume=True) == expected
+    importer.close()
+    cleanup()
+
+
+def test_parallel_import_resumes_after_crash():
+    cleanup()
+    # the parallel path splits on raw newlines, so no quoted ones here
+    write_csv(quoted_newlines=False)
+    expected, expected_stats, expected_users = clean_result('import_csv_fast')
+
+    importer = CSVImporter(TEST_DB)
+    crash_after(importer, 2)
+    importer.import_csv_parallel(TEST_CSV, workers=2, chunk_bytes=5000)
+    assert 0 < importer.get_checkpoint(TEST_CSV)['byte_offset'] < os.path.getsize(TEST_CSV)
+    importer.close()
+
+    with CSVImporter(TEST_DB) as importer:
+        result = importer.import_csv_parallel(TEST_CSV, workers=2, chunk_bytes=5000, resume=True)
+        assert result == expected
+        assert importer.last_import_stats == expected_stats
+        assert importer.count_users() == expected_users
+    cleanup()
+
+
+def test_changed_file_starts_over():
+    cleanup()
+    write_csv(500)
+    with CSVImporter(TEST_DB) as importer:
+        crash_after(importer, 2)
+        assert sum(importer.import_csv_fast(TEST_CSV, batch_size=100)) == 200
+        assert importer.get_checkpoint(TEST_CSV)['byte_offset'] > 0
+
+    write_csv(600)
+    with CSVImporter(TEST_DB) as importer:
+        imported, skipped = importer.import_csv_fast(TEST_CSV, batch_size=100, resume=True)
+        assert imported + skipped == 600
+    cleanup()
+
+
+def test_no_resume_starts_from_scratch():
+    cleanup()
+    write_csv(500)
+    with CSVImporter(TEST_DB) as importer:
+        first = importer.import_csv_fast(TEST_CSV, batch_size=100)
+        # importing the same file again without resume re-reads everything,
+        # so every valid row is now a duplicate
+        imported, skipped = importer.import_csv_fast(TEST_CSV, batch_size=100)
+        assert imported == 0 and skipped == sum(first)
+    cleanup()
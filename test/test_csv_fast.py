@@ -0,0 +1,95 @@
+# test_csv_fast.py - the fast import path should skip/import exactly what import_csv does
+
+import sys
+import os
+import csv
+import random
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'CSV-Import'))
+
+from csv_import import CSVImporter
+
+TEST_CSV = "test_fast_users.csv"
+SLOW_DB = "test_slow_users.db"
+FAST_DB = "test_fast_users.db"
+
+
+def cleanup():
+    for path in (TEST_CSV, SLOW_DB, FAST_DB):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def create_messy_csv(rows, seed=42):
+    rng = random.Random(seed)
+    with open(TEST_CSV, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['name', 'email'])
+        for i in range(rows):
+            kind = rng.random()
+            if kind < 0.1:
+                writer.writerow([f'User {i}', 'not-an-email'])
+            elif kind < 0.15:
+                writer.writerow(['  ', f'blank{i}@example.com'])
+            elif kind < 0.45:
+                # duplicate of an earlier email, sometimes across batches
+                writer.writerow([f'User {i}', f'user{rng.randint(0, i)}@example.com'])
+            else:
+                writer.writerow([f' User {i} ', f' user{i}@example.com '])
+
+
+def test_fast_path_matches_import_csv():
+    cleanup()
+    create_messy_csv(5000)
+    
+    slow = CSVImporter(SLOW_DB)
+    fast = CSVImporter(FAST_DB)
+    expected = slow.import_csv(TEST_CSV)
+    result = fast.import_csv_fast(TEST_CSV, batch_size=700)
+    
+    assert result == expected
+    assert sum(result) == 5000
+    assert fast.get_all_users()[0]['name'] == slow.get_all_users()[0]['name']
+    
+    # running it again imports nothing, everything is a duplicate
+    assert fast.import_csv_fast(TEST_CSV) == (0, 5000)
+    
+    slow.close()
+    fast.close()
+    cleanup()
+
+
+def test_headers_read_like_import_csv():
+    # odd headers: a space after the comma, and a repeated column
+    for header in ('name, email', 'email,name,email', ' name,email'):
+        cleanup()
+        with open(TEST_CSV, 'w', encoding='utf-8') as file:
+            file.write(header + '\n')
+            for i in range(50):
+                file.write(f'user{i}@example.com,User {i},other{i}@example.com\n')
+        results = []
+        for method in ('import_csv', 'import_csv_fast', 'import_csv_parallel'):
+            for path in (SLOW_DB, FAST_DB):
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+            with CSVImporter(FAST_DB) as importer:
+                results.append((getattr(importer, method)(TEST_CSV),
+                                [(user['name'], user['email']) for user in importer.get_all_users()]))
+        assert results[0] == results[1] == results[2], header
+    cleanup()
+
+
+def test_missing_file():
+    cleanup()
+    importer = CSVImporter(FAST_DB)
+    assert importer.import_csv_fast("does_not_exist.csv") == (0, 0)
+    importer.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_fast_path_matches_import_csv()
+    test_headers_read_like_import_csv()
+    test_missing_file()
+    print("Fast CSV import tests passed")
@@ -0,0 +1,182 @@
+# test_csv_input.py - gzip/zstd CSVs import straight from the compressed
+# file, plain ones through a memory map, with the same results either way
+
+import sys
+import os
+import csv
+import gzip
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+
+from csv_import import CSVImporter
+from csv_input import detect_format, resolve_format, open_csv, seek_to, MappedFile, PLAIN, GZIP, ZSTD
+
+TEST_DB = "test_csv_input.db"
+PLAIN_CSV = "test_csv_input.csv"
+GZIP_CSV = "test_csv_input.csv.gz"
+ZSTD_CSV = "test_csv_input.csv.zst"
+
+
+def cleanup_db():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def cleanup():
+    cleanup_db()
+    for path in (PLAIN_CSV, GZIP_CSV, ZSTD_CSV):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_csvs(rows=1500):
+    with open(PLAIN_CSV, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'email'])
+        for i in range(rows):
+            email = 'broken@' if i % 9 == 0 else f'user{i % 1200}@example.com'
+            writer.writerow([f'Üser {i}', email])
+    with open(PLAIN_CSV, 'rb') as f:
+        data = f.read()
+    with gzip.open(GZIP_CSV, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def run(method, csv_file, **kwargs):
+    cleanup_db()
+    with CSVImporter(TEST_DB) as importer:
+        result = getattr(importer, method)(csv_file, **kwargs)
+        return result, importer.count_users()
+
+
+def test_detects_format_from_content():
+    cleanup()
+    write_csvs(10)
+    assert detect_format(PLAIN_CSV) == PLAIN
+    assert detect_format(GZIP_CSV) == GZIP
+    with open(ZSTD_CSV, 'wb') as f:
+        f.write(b'\x28\xb5\x2f\xfd' + b'\0' * 8)
+    assert detect_format(ZSTD_CSV) == ZSTD
+    # the name doesn't matter
+    os.replace(GZIP_CSV, ZSTD_CSV)
+    assert resolve_format(ZSTD_CSV) == GZIP
+    assert resolve_format(ZSTD_CSV, 'plain') == PLAIN
+    try:
+        resolve_format(PLAIN_CSV, 'bzip2')
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    cleanup()
+
+
+def test_gzip_imports_match_plain():
+    cleanup()
+    write_csvs()
+    for method in ('import_csv', 'import_csv_fast', 'import_csv_parallel'):
+        expected = run(method, PLAIN_CSV)
+        assert run(method, GZIP_CSV) == expected, method
+        assert expected[1] == expected[0][0] > 0
+    cleanup()
+
+
+def test_open_csv_reads_the_same_lines():
+    cleanup()
+    data = write_csvs(200)
+    for path in (PLAIN_CSV, GZIP_CSV):
+        with open_csv(path) as file:
+            assert b''.join(file) == data
+        with open_csv(path) as file:
+            file.readline()
+            offset = file.tell()
+        with open_csv(path) as file:
+            seek_to(file, offset)
+            assert b''.join(file) == data[offset:]
+    cleanup()
+
+
+def test_mapped_file():
+    cleanup()
+    data = write_csvs(50)
+    with MappedFile(PLAIN_CSV) as file:
+        assert len(file) == len(data)
+        assert file.readline() == data[:data.index(b'\n') + 1]
+        assert file.tell() == data.index(b'\n') + 1
+        assert file.buffer[5:20] == data[5:20]
+        file.seek(0)
+        assert list(file) == data.splitlines(keepends=True)
+
+    # empty files can't be mmapped but still read as empty
+    open(PLAIN_CSV, 'wb').close()
+    with MappedFile(PLAIN_CSV) as file:
+        assert len(file) == 0 and list(file) == [] and file.readline() == b''
+    for method in ('import_csv', 'import_csv_fast', 'import_csv_parallel'):
+        assert run(method, PLAIN_CSV) == ((0, 0), 0), method
+    cleanup()
+
+
+class Crash(Exception):
+    pass
+
+
+def test_gzip_fast_import_resumes():
+    cleanup()
+    write_csvs()
+    expected = run('import_csv_fast', PLAIN_CSV, batch_size=200)
+
+    cleanup_db()
+    importer = CSVImporter(TEST_DB)
+    write_batch = importer._write_batch
+    calls = []
+
+    def failing(valid):
+        calls.append(len(valid))
+        if len(calls) > 2:
+            raise Crash("simulated crash")
+        return write_batch(valid)
+
+    importer._write_batch = failing
+    importer.import_csv_fast(GZIP_CSV, batch_size=200)
+    checkpoint = importer.get_checkpoint(GZIP_CSV)
+    # offsets are into the decompressed data
+    assert 0 < checkpoint['byte_offset'] < os.path.getsize(PLAIN_CSV)
+    importer.close()
+
+    with CSVImporter(TEST_DB) as importer:
+        # the parallel path hands compressed files to import_csv_fast
+        result = importer.import_csv_parallel(GZIP_CSV, resume=True)
+        assert (result, importer.count_users()) == expected
+        assert importer.get_checkpoint(GZIP_CSV)['completed']
+    cleanup()
+
+
+def test_zstd():
+    cleanup()
+    data = write_csvs(300)
+    try:
+        from compression import zstd
+        compress = zstd.compress
+    except ImportError:
+        try:
+            import zstandard
+            compress = zstandard.ZstdCompressor().compress
+        except ImportError:
+            compress = None
+
+    if compress is None:
+        # no zstd module: a clear error in the log, nothing imported
+        with open(ZSTD_CSV, 'wb') as f:
+            f.write(b'\x28\xb5\x2f\xfd' + b'\0' * 8)
+        try:
+            with open_csv(ZSTD_CSV):
+                pass
+            assert False, "expected ImportError"
+        except ImportError as e:
+            assert 'zstandard' in str(e)
+        assert run('import_csv_fast', ZSTD_CSV) == ((0, 0), 0)
+    else:
+        with open(ZSTD_CSV, 'wb') as f:
+            f.write(compress(data))
+        assert run('import_csv_fast', ZSTD_CSV) == run('import_csv_fast', PLAIN_CSV)
+    cleanup()
@@ -0,0 +1,78 @@
+# test_csv_parallel.py - parallel import totals must match the serial paths exactly
+
+import sys
+import os
+import random
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'CSV-Import'))
+
+from csv_import import CSVImporter, _split_ranges
+
+TEST_CSV = "test_parallel_users.csv"
+DBS = ["test_parallel_serial.db", "test_parallel_fast.db", "test_parallel.db"]
+
+
+def cleanup():
+    for path in [TEST_CSV] + DBS:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def create_csv(rows, seed=7):
+    rng = random.Random(seed)
+    lines = ["name,email"]
+    for i in range(rows):
+        kind = rng.random()
+        if kind < 0.05:
+            lines.append("")  # blank line
+        elif kind < 0.15:
+            lines.append(f"User {i},broken@")
+        elif kind < 0.5:
+            # duplicates that usually land in a different chunk
+            lines.append(f"User {i},user{rng.randint(0, i)}@example.com")
+        else:
+            lines.append(f'"Last, First {i}",user{i}@example.com')
+    with open(TEST_CSV, 'w', encoding='utf-8', newline='') as file:
+        file.write("\r\n".join(lines) + "\r\n")
+
+
+def test_ranges_are_newline_aligned():
+    cleanup()
+    create_csv(1000)
+    header, ranges = _split_ranges(TEST_CSV, chunk_bytes=500)
+    assert header == b"name,email\r\n"
+    with open(TEST_CSV, 'rb') as file:
+        data = file.read()
+    assert ranges[0][0] == len(header)
+    assert ranges[-1][1] == len(data)
+    for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start
+        assert data[end - 1:end] == b"\n"
+    cleanup()
+
+
+def test_parallel_matches_serial():
+    cleanup()
+    create_csv(4000)
+    
+    serial = CSVImporter(DBS[0])
+    fast = CSVImporter(DBS[1])
+    parallel = CSVImporter(DBS[2])
+    
+    expected = serial.import_csv(TEST_CSV)
+    assert fast.import_csv_fast(TEST_CSV, batch_size=333) == expected
+    assert parallel.import_csv_parallel(TEST_CSV, workers=3, chunk_bytes=2000) == expected
+    
+    # same rows kept - first occurrence of each email wins
+    rows = lambda importer: [(u['name'], u['email']) for u in importer.get_all_users()]
+    assert rows(parallel) == rows(serial)
+    
+    for importer in (serial, fast, parallel):
+        importer.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_ranges_are_newline_aligned()
+    test_parallel_matches_serial()
+    print("Parallel CSV import tests passed")
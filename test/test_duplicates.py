@@ -45,6 +45,7 @@ def test_duplicates():
     book_api.display_books()
     
     # clean up test database
+    book_api.close()
     import os
     if os.path.exists("test_books.db"):
         os.remove("test_books.db")
@@ -0,0 +1,201 @@
+# test_email_dedup.py - duplicate emails dropped by the UNIQUE index, split
+# into duplicates within the file vs already in the database
+
+import sys
+import os
+import csv
+import sqlite3
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+
+from csv_import import CSVImporter
+
+TEST_DB = "test_email_dedup.db"
+TEST_CSV = "test_email_dedup.csv"
+EXISTING = 300
+
+
+def cleanup():
+    for path in (TEST_DB, TEST_DB + "-wal", TEST_DB + "-shm", TEST_CSV):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_csv():
+    # 1000 rows: emails 0-199 are already in the db, every 4th row repeats
+    # an email from earlier in the file, and every 10th is invalid
+    with open(TEST_CSV, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'email'])
+        for i in range(1000):
+            if i % 10 == 9:
+                email = 'not-an-email'
+            elif i % 4 == 3:
+                email = f'user{i - 3}@example.com'
+            else:
+                email = f'user{i}@example.com'
+            writer.writerow([f'User {i}', email])
+
+
+def expected_counts():
+    seen = set()
+    counts = {'invalid': 0, 'in_file': 0, 'in_db': 0, 'imported': 0}
+    with open(TEST_CSV, newline='') as f:
+        for row in csv.DictReader(f):
+            email = row['email']
+            if '@' not in email:
+                counts['invalid'] += 1
+            elif int(email[4:].split('@')[0]) < 200:
+                # already stored - counts against the db however often it repeats
+                counts['in_db'] += 1
+            elif email in seen:
+                counts['in_file'] += 1
+            else:
+                counts['imported'] += 1
+                seen.add(email)
+    return counts
+
+
+def seed(importer):
+    # the even emails under 400 plus some unrelated ones
+    with importer.db.writer() as conn:
+        conn.executemany("INSERT INTO users (name, email) VALUES (?, ?)",
+                         [(f'Old {i}', f'user{i}@example.com') for i in range(0, 400, 2)]
+                         + [(f'Other {i}', f'other{i}@example.com') for i in range(EXISTING - 200)])
+
+
+def run(method, **options):
+    cleanup()
+    write_csv()
+    importer = CSVImporter(TEST_DB, **options)
+    seed(importer)
+    if method == 'parallel':
+        result = importer.import_csv_parallel(TEST_CSV, workers=2, chunk_bytes=4000)
+    else:
+        result = getattr(importer, method)(TEST_CSV)
+    stats = importer.last_import_stats
+    users = importer.count_users()
+    importer.close()
+    cleanup()
+    return result, stats, users
+
+
+def test_breakdown_is_the_same_for_every_path():
+    results = {method: run(method) for method in ('import_csv', 'import_csv_fast', 'parallel')}
+    results['no_dedup'] = run('import_csv_fast', dedup=False)
+
+    reference = results['import_csv']
+    result, stats, users = reference
+    assert result[0] + result[1] == 1000
+    assert stats['duplicates'] == stats['duplicates_in_file'] + stats['duplicates_in_db']
+    assert stats['duplicates_in_file'] > 0 and stats['duplicates_in_db'] > 0
+    assert users == EXISTING + result[0]
+
+    for name, (other_result, other_stats, other_users) in results.items():
+        assert other_result == result, name
+        assert other_users == users, name
+        if name != 'no_dedup':
+            assert other_stats == stats, name
+    # without dedup sqlite still catches them, we just can't say where from
+    assert results['no_dedup'][1]['duplicates'] == stats['duplicates']
+    assert results['no_dedup'][1]['duplicates_in_file'] == 0
+
+
+def test_counts_match_a_hand_count():
+    cleanup()
+    write_csv()
+    with CSVImporter(TEST_DB) as importer:
+        with importer.db.writer() as conn:
+            conn.executemany("INSERT INTO users (name, email) VALUES (?, ?)",
+                             [(f'Old {i}', f'user{i}@example.com') for i in range(200)])
+        imported, skipped = importer.import_csv_fast(TEST_CSV)
+        stats = importer.last_import_stats
+    expected = expected_counts()
+    assert imported == expected['imported']
+    assert stats['invalid'] == expected['invalid']
+    assert stats['duplicates_in_file'] == expected['in_file']
+    assert stats['duplicates_in_db'] == expected['in_db']
+    assert skipped == expected['invalid'] + expected['in_file'] + expected['in_db']
+    cleanup()
+
+
+def write_rows(path, emails):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'email'])
+        for i, email in enumerate(emails):
+            writer.writerow([f'User {i}', email])
+
+
+def test_second_import_counts_against_the_db():
+    cleanup()
+    with CSVImporter(TEST_DB) as importer:
+        seed(importer)
+        write_rows(TEST_CSV, [f'user{i}@example.com' for i in range(400, 600)])
+        assert importer.import_csv_fast(TEST_CSV) == (200, 0)
+        
+        # the last file's emails are database ones now
+        write_rows(TEST_CSV, [f'user{i}@example.com' for i in range(550, 650)] + ['user640@example.com'])
+        assert importer.import_csv_fast(TEST_CSV) == (50, 51)
+        stats = importer.last_import_stats
+        assert stats['duplicates_in_db'] == 50 and stats['duplicates_in_file'] == 1
+        assert importer.import_csv(TEST_CSV) == (0, 101)
+        assert importer.last_import_stats['duplicates_in_db'] == 101
+    cleanup()
+
+
+def test_outside_changes_are_seen():
+    cleanup()
+    with CSVImporter(TEST_DB) as importer:
+        # big enough that nothing small-file specific kicks in
+        write_rows(TEST_CSV, ['a@x.com', 'b@x.com'] + [f'user{i}@example.com' for i in range(40000)])
+        assert importer.import_csv_fast(TEST_CSV) == (40002, 0)
+        
+        # someone else renames a stored email - it's free to import again
+        conn = sqlite3.connect(TEST_DB)
+        with conn:
+            conn.execute("UPDATE users SET email = 'z@x.com' WHERE email = 'a@x.com'")
+        conn.close()
+        for method in ('import_csv_fast', 'import_csv'):
+            write_rows(TEST_CSV, ['a@x.com', 'b@x.com'])
+            expected = (1, 1) if method == 'import_csv_fast' else (0, 2)
+            assert getattr(importer, method)(TEST_CSV) == expected, method
+            assert importer.last_import_stats['duplicates_in_db'] == expected[1]
+        with importer.db.reader() as conn:
+            emails = {row[0] for row in conn.execute("SELECT email FROM users WHERE email LIKE '_@x.com'")}
+        assert emails == {'a@x.com', 'b@x.com', 'z@x.com'}
+    cleanup()
+
+
+def test_failed_import_leaves_no_duplicates():
+    cleanup()
+    with CSVImporter(TEST_DB) as importer:
+        seed(importer)
+        write_rows(TEST_CSV, [f'user{i}@example.com' for i in range(400, 500)])
+        
+        write_batch = importer._write_batch
+        
+        def failing(valid):
+            with importer.db.writer():
+                write_batch(valid)
+                raise RuntimeError("simulated crash")
+        
+        importer._write_batch = failing
+        assert importer.import_csv_fast(TEST_CSV) == (0, 0)
+        importer._write_batch = write_batch
+        # the batch rolled back, so nothing counts as a duplicate next time
+        assert importer.import_csv_fast(TEST_CSV) == (100, 0)
+    cleanup()
+
+
+def test_small_imports_into_an_empty_table():
+    cleanup()
+    with CSVImporter(TEST_DB) as importer:
+        write_rows(TEST_CSV, ['user0@example.com', 'user1@example.com', 'user1@example.com'])
+        for method in ('import_csv_fast', 'import_csv'):
+            with importer.db.writer() as conn:
+                conn.execute("DELETE FROM users")
+            assert getattr(importer, method)(TEST_CSV) == (2, 1), method
+            stats = importer.last_import_stats
+            assert stats['duplicates_in_db'] == 0 and stats['duplicates_in_file'] == 1
+    cleanup()
@@ -0,0 +1,150 @@
+# test_http_cache.py - conditional GET response cache against the local mock API
+
+import sys
+import os
+import time
+import shutil
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'StudentScore-API'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from book_api import BookAPI
+from student_scores_simple import StudentScoreProcessor
+from http_cache import ResponseCache
+from http_client import make_session
+from mock_api import MockAPIServer, make_posts
+
+TEST_DB = "test_cache_books.db"
+CACHE_DIR = "test_http_cache"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+def test_etag_revalidation_skips_store():
+    cleanup()
+    with MockAPIServer(num_posts=30) as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'), cache=ResponseCache(CACHE_DIR))
+        
+        books = book_api.fetch_books_from_api()
+        assert len(books) == 10
+        assert not book_api.last_fetch_unchanged
+        book_api.store_books(books)
+        book_api.commit_fetch()
+        
+        # nothing changed upstream -> 304, no books to store
+        assert book_api.fetch_books_from_api() == []
+        assert book_api.last_fetch_unchanged
+        assert server.not_modified == 1
+        
+        # upstream changes -> full body again
+        server.resources['posts'] = make_posts(31)[1:]
+        books = book_api.fetch_books_from_api()
+        assert books[0]['title'] == 'post title 2'
+        assert not book_api.last_fetch_unchanged
+        book_api.close()
+    cleanup()
+
+
+def test_failed_store_is_refetched():
+    cleanup()
+    with MockAPIServer(num_posts=30) as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'), cache=ResponseCache(CACHE_DIR))
+        books = book_api.fetch_books_from_api()
+        assert len(books) == 10
+        # the store blows up, so the response mustn't be kept
+        book_api.commit_fetch(stored=False)
+        book_api.close()
+        
+        # fetched but never committed (say the process died) - not kept either
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'), cache=ResponseCache(CACHE_DIR))
+        assert len(book_api.fetch_books_from_api()) == 10
+        book_api.close()
+        
+        # next run gets the full body, not a 304, and stores it
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'), cache=ResponseCache(CACHE_DIR))
+        books = book_api.fetch_books_from_api()
+        assert len(books) == 10 and not book_api.last_fetch_unchanged
+        assert server.not_modified == 0
+        assert book_api.store_books(books) == 10
+        book_api.commit_fetch()
+        assert book_api.count_books() == 10
+        
+        # and only now is an unchanged feed a 304
+        assert book_api.fetch_books_from_api() == []
+        assert book_api.last_fetch_unchanged
+        book_api.close()
+    cleanup()
+
+
+def test_last_modified_only_server():
+    cleanup()
+    with MockAPIServer(num_users=5, send_etag=False) as server:
+        processor = StudentScoreProcessor(api_url=server.url('users'), cache=ResponseCache(CACHE_DIR))
+        students = processor.fetch_scores()
+        assert len(students) == 5 and not processor.last_fetch_unchanged
+        # a 304 is still reported from the cached body, it just isn't downloaded again
+        cached = processor.fetch_scores()
+        assert processor.last_fetch_unchanged
+        assert server.not_modified == 1
+        assert [s['name'] for s in cached] == [s['name'] for s in students]
+    cleanup()
+
+
+def test_ttl_only_mode():
+    cleanup()
+    with MockAPIServer() as server:
+        cache = ResponseCache(CACHE_DIR, ttl=0.2, ttl_only=True)
+        session = make_session()
+        url = server.url('posts')
+        
+        assert not cache.get(session, url).not_modified
+        second = cache.get(session, url)
+        assert second.from_cache and second.not_modified
+        assert len(server.hits) == 1
+        
+        time.sleep(0.25)
+        # expired, refetched in full - no validators sent in ttl_only mode
+        assert not cache.get(session, url).not_modified
+        assert len(server.hits) == 2
+        assert server.not_modified == 0
+    cleanup()
+
+
+def test_lru_eviction():
+    cleanup()
+    with MockAPIServer(num_posts=50) as server:
+        session = make_session()
+        url = server.url('posts')
+        body_size = len(session.get(url).content)
+        cache = ResponseCache(CACHE_DIR, max_bytes=body_size * 2)
+        
+        cache.get(session, url, params={'shard': 1})
+        time.sleep(0.01)
+        cache.get(session, url, params={'shard': 2})
+        time.sleep(0.01)
+        # touch shard 1 so shard 2 becomes the least recently used
+        cache.get(session, url, params={'shard': 1})
+        time.sleep(0.01)
+        cache.get(session, url, params={'shard': 3})
+        
+        bodies = [name for name in os.listdir(CACHE_DIR) if name.endswith('.body')]
+        assert len(bodies) == 2
+        assert cache.get(session, url, params={'shard': 1}).not_modified
+        assert not cache.get(session, url, params={'shard': 2}).not_modified
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_etag_revalidation_skips_store()
+    test_failed_store_is_refetched()
+    test_last_modified_only_server()
+    test_ttl_only_mode()
+    test_lru_eviction()
+    print("HTTP cache tests passed")
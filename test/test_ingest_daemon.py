@@ -0,0 +1,185 @@
+# test_ingest_daemon.py - the asyncio ingestion daemon against the local
+# mock API and a temporary drop directory
+
+import sys
+import os
+import csv
+import time
+import shutil
+import asyncio
+import threading
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Ingest-Daemon'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ingest_daemon import IngestDaemon
+from mock_api import MockAPIServer
+
+BOOK_DB = "test_daemon_books.db"
+USERS_DB = "test_daemon_users.db"
+DROP_DIR = "test_daemon_drop"
+STATS = "test_daemon_stats.json"
+
+
+def cleanup():
+    for db in (BOOK_DB, USERS_DB):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db + suffix):
+                os.remove(db + suffix)
+    if os.path.exists(STATS):
+        os.remove(STATS)
+    shutil.rmtree(DROP_DIR, ignore_errors=True)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'email'])
+        for i in range(rows):
+            writer.writerow([f'User {i}', f'user{i}@example.com'])
+
+
+def make_daemon(server, **options):
+    settings = dict(book_db=BOOK_DB, users_db=USERS_DB, drop_dir=DROP_DIR, stats_path=STATS,
+                    book_api_url=server.url('posts'), student_api_url=server.url('users'),
+                    book_interval=60, student_interval=60, poll_interval=0.05)
+    settings.update(options)
+    return IngestDaemon(**settings)
+
+
+def run_until(daemon, condition, timeout=10):
+    # run the daemon, call stop() once condition(daemon) holds
+    async def watch():
+        deadline = time.monotonic() + timeout
+        while not condition(daemon) and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        daemon.stop()
+
+    async def both():
+        stats, _ = await asyncio.gather(daemon.run(), watch())
+        return stats
+
+    return asyncio.run(both())
+
+
+def test_daemon_ingests_all_sources():
+    cleanup()
+    os.makedirs(DROP_DIR)
+    write_csv(os.path.join(DROP_DIR, 'users.csv'), 300)
+    with open(os.path.join(DROP_DIR, 'notes.txt'), 'w') as f:
+        f.write('not a csv')
+
+    with MockAPIServer(num_posts=250, num_users=10) as server:
+        daemon = make_daemon(server, page_size=40)
+        stats = run_until(daemon, lambda d: d.stats['csv_imported'] and d.stats['student_batches']
+                          and d.stats['books_inserted'] == 250)
+
+    assert stats['books_inserted'] == 250
+    assert stats['book_pages'] == 7
+    assert stats['student_batches'] == 1
+    assert stats['csv_imported'] == 1
+    # imported files move to done/, anything else is left alone
+    assert sorted(os.listdir(os.path.join(DROP_DIR, 'done'))) == ['users.csv']
+    assert os.path.exists(os.path.join(DROP_DIR, 'notes.txt'))
+    assert os.path.exists(STATS)
+
+    # the daemon closed its connections; the data is all there
+    from book_api import BookAPI
+    from csv_import import CSVImporter
+    with BookAPI(BOOK_DB) as book_api:
+        assert book_api.count_books() == 250
+    with CSVImporter(USERS_DB) as importer:
+        assert importer.count_users() == 300
+    cleanup()
+
+
+def test_backpressure_and_drain():
+    cleanup()
+    with MockAPIServer(num_posts=500) as server:
+        daemon = make_daemon(server, page_size=10, queue_size=2)
+        # a slow writer: the fetch thread has to wait for it
+        write_books = daemon._write_books
+        written = threading.Event()
+
+        def slow_write(page):
+            time.sleep(0.05)
+            write_books(page)
+            written.set()
+
+        daemon._write_books = slow_write
+        stats = run_until(daemon, lambda d: written.is_set())
+        requests_made = len(server.hits)
+
+    # never more queued than the queue holds, and the fetch stopped early
+    assert stats['max_queue_depth'] <= 2
+    assert stats['book_pages'] < 50
+    # ...but every page that was queued got written before run() returned
+    assert stats['books_inserted'] == stats['book_pages'] * 10
+    from book_api import BookAPI
+    with BookAPI(BOOK_DB) as book_api:
+        assert book_api.count_books() == stats['book_pages'] * 10
+    # the fetch thread stopped asking for pages too
+    assert requests_made < 50
+    cleanup()
+
+
+def test_incomplete_csv_is_retried_then_failed():
+    cleanup()
+    os.makedirs(DROP_DIR)
+    write_csv(os.path.join(DROP_DIR, 'broken.csv'), 50)
+
+    with MockAPIServer(num_posts=10) as server:
+        daemon = make_daemon(server)
+        daemon._import_csv = lambda path: False
+        stats = run_until(daemon, lambda d: d.stats['csv_failed'])
+
+    assert stats['csv_failed'] == 1
+    assert stats['csv_imported'] == 0
+    assert os.listdir(os.path.join(DROP_DIR, 'failed')) == ['broken.csv']
+    cleanup()
+
+
+def test_stop_mid_csv_resumes_on_next_start():
+    cleanup()
+    os.makedirs(DROP_DIR)
+    path = os.path.join(DROP_DIR, 'big.csv')
+    write_csv(path, 5000)
+
+    with MockAPIServer(num_posts=10) as server:
+        daemon = make_daemon(server, csv_batch_size=500)
+        write_batch = daemon.importer._write_batch
+        batches = []
+
+        def write_and_stop(valid):
+            # SIGTERM arrives while the second batch is being written
+            result = write_batch(valid)
+            batches.append(len(valid))
+            if len(batches) == 2:
+                daemon.stop()
+            return result
+
+        daemon.importer._write_batch = write_and_stop
+        started = time.monotonic()
+        stats = run_until(daemon, lambda d: d._stopping.is_set())
+        # stopped right after that batch instead of importing the rest first
+        assert time.monotonic() - started < 5
+        assert batches == [500, 500]
+        assert stats['csv_imported'] == 0 and stats['csv_failed'] == 0
+
+        # still in the drop dir, checkpointed part of the way through
+        assert os.path.exists(path)
+        from csv_import import CSVImporter
+        with CSVImporter(USERS_DB) as importer:
+            checkpoint = importer.get_checkpoint(path)
+            assert checkpoint['imported'] == 1000 and not checkpoint['completed']
+            assert importer.count_users() == 1000
+
+        # the next run carries on from there
+        daemon = make_daemon(server, csv_batch_size=500)
+        stats = run_until(daemon, lambda d: d.stats['csv_imported'])
+
+    assert stats['csv_imported'] == 1
+    assert os.listdir(os.path.join(DROP_DIR, 'done')) == ['big.csv']
+    with CSVImporter(USERS_DB) as importer:
+        assert importer.count_users() == 5000
+    cleanup()
@@ -0,0 +1,65 @@
+# test_keyset_iter.py - streaming keyset pagination for books and users
+
+import sys
+import os
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+
+from book_api import BookAPI
+from csv_import import CSVImporter
+
+BOOKS_DB = "test_keyset_books.db"
+USERS_DB = "test_keyset_users.db"
+
+
+def cleanup():
+    for path in (BOOKS_DB, USERS_DB):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def test_iter_books_matches_get_all():
+    cleanup()
+    book_api = BookAPI(BOOKS_DB)
+    book_api.store_books_bulk({'title': f'Book {i:04d}', 'author': 'A', 'year': 2000,
+                               'description': 'd'} for i in range(1050))
+    book_api.store_books([{'title': None, 'description': 'no title'}])
+    
+    streamed = list(book_api.iter_books(fetch_size=100))
+    assert streamed == book_api.get_all_books()
+    assert len(streamed) == 1051
+    assert book_api.count_books() == 1051
+    
+    after = list(book_api.iter_books(fetch_size=100, after='Book 1047'))
+    assert [book['title'] for book in after] == ['Book 1048', 'Book 1049']
+    
+    book_api.display_books(fetch_size=300)
+    book_api.close()
+    cleanup()
+
+
+def test_iter_users_handles_repeated_names():
+    cleanup()
+    importer = CSVImporter(USERS_DB)
+    with importer.db.writer() as conn:
+        # lots of people with the same name so pages split inside a name
+        conn.executemany("INSERT INTO users (name, email) VALUES (?, ?)",
+                         [(f'Name {i % 7}', f'user{i}@example.com') for i in range(500)])
+    
+    streamed = list(importer.iter_users(fetch_size=30))
+    assert len(streamed) == 500
+    assert len({user['id'] for user in streamed}) == 500
+    keys = [(user['name'], user['id']) for user in streamed]
+    assert keys == sorted(keys)
+    
+    importer.display_users(fetch_size=64)
+    importer.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_iter_books_matches_get_all()
+    test_iter_users_handles_repeated_names()
+    print("Keyset iteration tests passed")
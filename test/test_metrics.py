@@ -0,0 +1,135 @@
+# test_metrics.py - metrics registry, exports and the pipeline instrumentation
+
+import sys
+import os
+import csv
+import json
+import time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from book_api import BookAPI
+from csv_import import CSVImporter
+from metrics import Metrics, metrics
+from mock_api import MockAPIServer
+
+TEST_DB = "test_metrics.db"
+TEST_CSV = "test_metrics.csv"
+
+
+def cleanup():
+    for path in (TEST_DB, TEST_DB + "-wal", TEST_DB + "-shm", TEST_CSV):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def values(snapshot, kind, name):
+    return {tuple(sorted(m['labels'].items())): m for m in snapshot[kind] if m['name'] == name}
+
+
+def test_disabled_records_nothing():
+    registry = Metrics(enabled=False)
+    registry.inc('rows_total', 5)
+    registry.observe('rows_per_second', 10)
+    with registry.timer('stage_seconds', stage='store'):
+        pass
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == [] and snapshot['histograms'] == []
+
+    # the disabled path is just an attribute check - 100k calls should be instant
+    started = time.perf_counter()
+    for _ in range(100000):
+        registry.inc('rows_total')
+        with registry.timer('stage_seconds'):
+            pass
+    assert time.perf_counter() - started < 1.0
+
+
+def test_counters_histograms_and_exports():
+    registry = Metrics(enabled=True)
+    registry.inc('rows_skipped_total', 2, reason='invalid')
+    registry.inc('rows_skipped_total', 3, reason='invalid')
+    registry.inc('rows_skipped_total', reason='duplicate')
+    registry.set_buckets('sizes', (10, 100))
+    for value in (5, 50, 500):
+        registry.observe('sizes', value, kind='x')
+
+    snapshot = json.loads(registry.to_json())
+    skipped = values(snapshot, 'counters', 'rows_skipped_total')
+    assert skipped[(('reason', 'invalid'),)]['value'] == 5
+    assert skipped[(('reason', 'duplicate'),)]['value'] == 1
+
+    sizes = values(snapshot, 'histograms', 'sizes')[(('kind', 'x'),)]
+    assert sizes['count'] == 3 and sizes['sum'] == 555
+    # buckets are cumulative, like Prometheus expects
+    assert sizes['buckets'] == {'10': 1, '100': 2, '+Inf': 3}
+
+    text = registry.to_prometheus()
+    assert "# TYPE data_api_rows_skipped_total counter" in text
+    assert 'data_api_rows_skipped_total{reason="invalid"} 5' in text
+    assert "# TYPE data_api_sizes histogram" in text
+    assert 'data_api_sizes_bucket{kind="x",le="+Inf"} 3' in text
+    assert 'data_api_sizes_count{kind="x"} 3' in text
+
+
+def test_timer_and_profiler_hooks():
+    registry = Metrics(enabled=True)
+    events = []
+    registry.add_hook(lambda event, name, labels, seconds: events.append((event, name, labels)))
+    with registry.timer('stage_seconds', stage='parse'):
+        time.sleep(0.01)
+
+    assert events == [('start', 'stage_seconds', {'stage': 'parse'}),
+                      ('stop', 'stage_seconds', {'stage': 'parse'})]
+    timing = values(registry.snapshot(), 'histograms', 'stage_seconds')[(('stage', 'parse'),)]
+    assert timing['count'] == 1 and timing['sum'] >= 0.01
+
+
+def test_pipelines_report_stages(tmp_path):
+    cleanup()
+    metrics.reset()
+    metrics.enable()
+    try:
+        with MockAPIServer(num_posts=30) as server:
+            book_api = BookAPI(TEST_DB, api_url=server.url('posts'))
+            stats = book_api.store_books_bulk(book_api.iter_books_from_api(page_size=10))
+            assert stats['stored'] == 30
+            assert len(book_api.get_all_books()) == 30
+            book_api.close()
+
+        with open(TEST_CSV, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'email'])
+            writer.writerows([['A', 'a@example.com'], ['B', 'bad'], ['C', 'a@example.com']])
+        importer = CSVImporter(TEST_DB)
+        assert importer.import_csv_fast(TEST_CSV) == (1, 2)
+        importer.close()
+
+        snapshot = metrics.snapshot()
+        stages = values(snapshot, 'histograms', 'stage_seconds')
+        assert stages[(('pipeline', 'books'), ('stage', 'fetch'))]['count'] == 4
+        assert (('pipeline', 'users'), ('stage', 'validate')) in stages
+
+        sqlite_time = values(snapshot, 'histograms', 'sqlite_seconds')
+        assert (('op', 'store'), ('pipeline', 'books')) in sqlite_time
+        assert (('op', 'query'), ('pipeline', 'books')) in sqlite_time
+
+        http = values(snapshot, 'counters', 'http_bytes_received_total')
+        assert sum(m['value'] for m in http.values()) > 0
+
+        skipped = values(snapshot, 'counters', 'rows_skipped_total')
+        assert skipped[(('pipeline', 'users'), ('reason', 'invalid'))]['value'] == 1
+        assert skipped[(('pipeline', 'users'), ('reason', 'duplicate'))]['value'] == 1
+        stored = values(snapshot, 'counters', 'rows_stored_total')
+        assert stored[(('pipeline', 'books'),)]['value'] == 30
+
+        metrics.dump('pipelines', directory=str(tmp_path))
+        assert (tmp_path / 'pipelines.prom').read_text().startswith('# TYPE')
+        assert json.loads((tmp_path / 'pipelines.json').read_text())['counters']
+    finally:
+        metrics.disable()
+        metrics.reset()
+        cleanup()
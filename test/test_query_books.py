@@ -0,0 +1,90 @@
+# test_query_books.py - author/year filters, and proof they never scan the table
+
+import sys
+import os
+import itertools
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Book-API'))
+
+from book_api import BookAPI, QUERY_ORDERS
+
+TEST_DB = "test_query_books.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def make_books():
+    return [{'title': f'Book {i:03d}', 'author': f'Author {i % 5}',
+             'year': 1990 + i % 30, 'description': 'x'} for i in range(300)]
+
+
+def test_filters_and_ordering():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    books = make_books()
+    book_api.store_books_bulk(books)
+    
+    result = book_api.query_books(author='Author 2', year_from=2000, year_to=2005)
+    expected = sorted(b['title'] for b in books
+                      if b['author'] == 'Author 2' and 2000 <= b['year'] <= 2005)
+    assert [b['title'] for b in result] == expected
+    assert set(result[0]) == {'title', 'author', 'year'}
+    
+    by_year = book_api.query_books(year_from=2015, order_by='year', descending=True, limit=5)
+    assert [b['year'] for b in by_year] == [2019] * 5
+    assert by_year[0]['title'] > by_year[1]['title']
+    
+    two_authors = book_api.query_books(author=['Author 0', 'Author 1'], order_by='author')
+    assert len(two_authors) == 120
+    assert two_authors[0]['author'] == 'Author 0' and two_authors[-1]['author'] == 'Author 1'
+    
+    page = book_api.query_books(limit=10, offset=10)
+    assert [b['title'] for b in page] == [f'Book {i:03d}' for i in range(10, 20)]
+    
+    try:
+        book_api.query_books(order_by='description')
+        assert False, "unsupported order_by should raise"
+    except ValueError:
+        pass
+    book_api.close()
+    cleanup()
+
+
+def test_no_query_scans_the_table():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    book_api.store_books_bulk(make_books())
+    
+    filters = [
+        {},
+        {'author': 'Author 1'},
+        {'author': ['Author 1', 'Author 3']},
+        {'year_from': 2000},
+        {'year_to': 2000},
+        {'year_from': 2000, 'year_to': 2010},
+        {'author': 'Author 1', 'year_from': 2000},
+        {'author': 'Author 1', 'year_from': 2000, 'year_to': 2010},
+    ]
+    with book_api.db.reader() as conn:
+        for where, order_by, descending in itertools.product(filters, QUERY_ORDERS, (False, True)):
+            sql, params = book_api._build_book_query(order_by=order_by, descending=descending,
+                                                     limit=10, **where)
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            for step in plan:
+                if step.startswith(('SCAN books', 'SEARCH books')):
+                    # index-only, never the table rows
+                    assert 'COVERING INDEX' in step, (where, order_by, plan)
+                if where:
+                    # a filtered query must seek into an index, not walk one
+                    assert not step.startswith('SCAN'), (where, order_by, plan)
+    book_api.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_filters_and_ordering()
+    test_no_query_scans_the_table()
+    print("Query tests passed")
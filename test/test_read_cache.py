@@ -0,0 +1,106 @@
+# test_read_cache.py - write-invalidated LRU cache in front of the read methods
+
+import sys
+import os
+import sqlite3
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+sys.path.append(os.path.join(ROOT, 'common'))
+
+from book_api import BookAPI
+from csv_import import CSVImporter
+
+TEST_DB = "test_read_cache.db"
+TEST_CSV = "test_read_cache.csv"
+
+
+def cleanup():
+    for path in (TEST_DB, TEST_DB + "-wal", TEST_DB + "-shm", TEST_CSV):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def book(i, author='Author 1', year=2020):
+    return {'title': f'Book {i:03d}', 'author': author, 'year': year, 'description': 'x'}
+
+
+def test_books_cached_until_write():
+    cleanup()
+    with BookAPI(TEST_DB) as book_api:
+        book_api.store_books_bulk([book(i) for i in range(5)])
+
+        assert len(book_api.get_all_books()) == 5
+        assert len(book_api.get_all_books()) == 5
+        stats = book_api.read_cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 1)
+
+        # callers can't corrupt the cached list
+        book_api.get_all_books().clear()
+        assert len(book_api.get_all_books()) == 5
+
+        # our own write drops the cache
+        book_api.store_books([book(99)])
+        assert len(book_api.get_all_books()) == 6
+        assert book_api.read_cache.stats()['invalidations'] == 1
+    cleanup()
+
+
+def test_external_write_invalidates():
+    cleanup()
+    with BookAPI(TEST_DB) as book_api:
+        book_api.store_books_bulk([book(i) for i in range(3)])
+        assert book_api.count_books() == 3
+
+        # another process/connection writes behind our back - data_version sees it
+        conn = sqlite3.connect(TEST_DB)
+        with conn:
+            conn.execute("DELETE FROM books WHERE title = 'Book 000'")
+        conn.close()
+
+        assert book_api.count_books() == 2
+        assert [b['title'] for b in book_api.get_all_books()] == ['Book 001', 'Book 002']
+    cleanup()
+
+
+def test_query_books_lru_eviction():
+    cleanup()
+    with BookAPI(TEST_DB, read_cache_size=2) as book_api:
+        book_api.store_books_bulk([book(i, year=2000 + i % 3) for i in range(9)])
+
+        for year in (2000, 2001, 2002):
+            assert len(book_api.query_books(year_from=year, year_to=year)) == 3
+        assert book_api.read_cache.stats()['entries'] == 2
+
+        # 2002 and 2001 are still cached, 2000 was evicted
+        book_api.query_books(year_from=2002, year_to=2002)
+        book_api.query_books(year_from=2001, year_to=2001)
+        assert book_api.read_cache.hits == 2
+        book_api.query_books(year_from=2000, year_to=2000)
+        assert book_api.read_cache.misses == 4
+    cleanup()
+
+
+def test_disabled_cache_always_reads():
+    cleanup()
+    with BookAPI(TEST_DB, read_cache_size=0) as book_api:
+        book_api.store_books([book(1)])
+        book_api.get_all_books()
+        book_api.get_all_books()
+        assert book_api.read_cache.stats()['hits'] == 0
+    cleanup()
+
+
+def test_users_invalidated_by_import():
+    cleanup()
+    with open(TEST_CSV, 'w') as f:
+        f.write("name,email\nAlice,alice@example.com\nBob,bob@example.com\n")
+    with CSVImporter(TEST_DB) as importer:
+        assert importer.get_all_users() == []
+        assert importer.count_users() == 0
+
+        importer.import_csv(TEST_CSV)
+        assert [u['name'] for u in importer.get_all_users()] == ['Alice', 'Bob']
+        assert importer.count_users() == 2
+        assert importer.read_cache.stats()['invalidations'] == 1
+    cleanup()
@@ -0,0 +1,150 @@
+# test_records.py - slotted Book/User/Student records behave like the dicts
+# they replaced and are smaller
+
+import sys
+import os
+import json
+import pickle
+import sqlite3
+import logging
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+sys.path.append(os.path.join(ROOT, 'benchmarks'))
+
+from records import Book, User, Student
+from book_api import BookAPI
+from csv_import import CSVImporter
+
+TEST_DB = "test_records.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def test_dict_compatible():
+    book = Book('Dune', 'Frank Herbert', 1965, 'Sand')
+    as_dict = {'title': 'Dune', 'author': 'Frank Herbert', 'year': 1965, 'description': 'Sand'}
+    assert book == as_dict and as_dict == book
+    assert dict(book) == as_dict
+    assert list(book) == list(book.keys()) == ['title', 'author', 'year', 'description']
+    assert len(book) == 4
+    assert book['year'] == 1965 and book.get('year') == 1965
+    # unset fields aren't keys
+    assert 'created_at' not in book and book.get('created_at', 'n/a') == 'n/a'
+    assert 'get' not in book
+    try:
+        book['created_at']
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+
+    book['year'] = 1966
+    assert book['year'] == 1966
+    try:
+        book['isbn'] = '123'
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+    assert Book.from_dict(as_dict) == as_dict
+    assert book.copy() == book and book.copy() is not book
+    assert pickle.loads(pickle.dumps(book)) == book
+    assert repr(Student('Ann', 90)) == "Student(name='Ann', score=90)"
+    # no per-instance __dict__ - that's the point
+    assert not hasattr(book, '__dict__')
+
+
+def test_json_round_trip():
+    records = [Book('Dune', 'Frank Herbert', 1965, 'Sand'), User(id=1, name='Ann', email='ann@example.com'),
+               Student('Ann', 90)]
+    for record in records:
+        as_dict = record.to_dict()
+        assert type(as_dict) is dict and as_dict == record
+        assert type(record).from_dict(json.loads(json.dumps(as_dict))) == record
+    # the records themselves aren't dicts, so json needs to_dict()
+    try:
+        json.dumps(records[0])
+        assert False, "expected TypeError"
+    except TypeError:
+        pass
+    assert json.loads(json.dumps([r.to_dict() for r in records]))[2] == {'name': 'Ann', 'score': 90}
+
+
+def test_row_factory():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, created_at TEXT)")
+    conn.execute("INSERT INTO users (name, email) VALUES ('Ann', 'ann@example.com')")
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, id FROM users")
+    cursor.row_factory = User.row_factory(cursor)
+    user = cursor.fetchone()
+    assert isinstance(user, User)
+    assert dict(user) == {'id': 1, 'name': 'Ann'}
+    # columns the record has no field for are refused up front
+    cursor.execute("SELECT name, email AS mail FROM users")
+    try:
+        User.row_factory(cursor)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+def test_pipelines_return_records():
+    cleanup()
+    with BookAPI(TEST_DB) as book_api:
+        book_api.store_books([{'title': f'Book {i}', 'author': 'A', 'year': 2000 + i,
+                               'description': 'x'} for i in range(5)])
+        books = book_api.get_all_books()
+        assert all(isinstance(book, Book) for book in books)
+        assert books[0]['title'] == 'Book 0' and 'content_hash' in books[0]
+        assert all(isinstance(book, Book) for book in book_api.iter_books(fetch_size=2))
+        assert book_api.query_books(year_from=2003) == [
+            {'title': 'Book 3', 'author': 'A', 'year': 2003},
+            {'title': 'Book 4', 'author': 'A', 'year': 2004}]
+        assert isinstance(book_api._map_book({'title': 't', 'userId': 1, 'id': 1}), Book)
+    cleanup()
+
+    with CSVImporter(TEST_DB) as importer:
+        with importer.db.writer() as conn:
+            conn.execute("INSERT INTO users (name, email) VALUES ('Ann', 'ann@example.com')")
+        users = importer.get_all_users()
+        assert isinstance(users[0], User) and users[0]['email'] == 'ann@example.com'
+        assert all(isinstance(user, User) for user in importer.iter_users())
+    cleanup()
+
+
+class CapturedLog(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_failure_logs_name_the_record():
+    cleanup()
+    log = CapturedLog()
+    logger = logging.getLogger('book_api')
+    logger.addHandler(log)
+    try:
+        with BookAPI(TEST_DB) as book_api:
+            bad = Book('Broken', 'A', object(), 'x')
+            assert book_api.store_books_bulk([Book('Fine', 'A', 2000, 'x'), bad])['failed'] == 1
+            assert book_api.sync_books([bad])['failed'] == 1
+    finally:
+        logger.removeHandler(log)
+    assert any("Failed to store book 'Broken'" in message for message in log.messages)
+    assert any("Failed to sync book 'Broken'" in message for message in log.messages)
+    assert not any("'Unknown'" in message for message in log.messages)
+    cleanup()
+
+
+def test_records_are_smaller():
+    from record_memory import run
+    for result in run(2000, seed=1):
+        assert result['record_bytes_per_record'] < result['dict_bytes_per_record'], result['record']
@@ -0,0 +1,192 @@
+# test_request_control.py - retries, Retry-After, AIMD concurrency and the
+# circuit breaker, against the mock API with injected throttling
+
+import sys
+import os
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'StudentScore-API'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from request_control import (RequestController, RetryPolicy, AIMDLimiter, CircuitBreaker,
+                             CircuitOpenError, parse_retry_after)
+from http_client import make_session
+from book_api import BookAPI
+from student_scores_simple import StudentScoreProcessor
+from mock_api import MockAPIServer
+
+TEST_DB = "test_request_control.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def controller(**options):
+    # records the waits instead of sleeping through them
+    waits = []
+    options.setdefault('retry', RetryPolicy(base_delay=0.01))
+    http = RequestController(make_session(), sleep=waits.append, **options)
+    return http, waits
+
+
+def test_retries_throttled_requests_and_honors_retry_after():
+    cleanup()
+    with MockAPIServer(num_posts=50, faults=[429, 503], retry_after=2) as server:
+        http, waits = controller()
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'), http=http)
+        books = book_api.fetch_books_from_api()
+        assert len(books) == 10
+        assert len(server.hits) == 3
+        # waited what the server asked for, plus a little jitter
+        assert len(waits) == 2 and all(2 <= wait <= 2.01 for wait in waits)
+
+        # a whole paged run survives throttling mid-stream too
+        server.faults.extend([429, 500, 429])
+        assert len(list(book_api.iter_books_from_api(page_size=10))) == 50
+    book_api.close()
+    cleanup()
+
+
+def test_gives_up_after_max_attempts():
+    with MockAPIServer(faults=[503] * 10) as server:
+        http, waits = controller(retry=RetryPolicy(max_attempts=3, base_delay=0.01))
+        response = http.get(server.url('users'))
+        assert response.status_code == 503
+        assert len(server.hits) == 3 and len(waits) == 2
+
+        # the fetch methods still just log and return nothing
+        processor = StudentScoreProcessor(api_url=server.url('users'), http=http)
+        assert processor.fetch_scores() == []
+
+        # by now that's 5 failures in a row, so the breaker is open
+        assert http.breaker(server.url('users')).state == CircuitBreaker.OPEN
+
+    with MockAPIServer() as server:
+        # a 404 isn't worth retrying
+        http, waits = controller()
+        assert http.get(server.url('missing')).status_code == 404
+        assert len(server.hits) == 0 and waits == []
+
+
+def test_backoff_has_full_jitter():
+    policy = RetryPolicy(base_delay=0.5, max_delay=3)
+    for retry in range(1, 8):
+        delays = [policy.backoff(retry) for _ in range(200)]
+        cap = min(3, 0.5 * 2 ** (retry - 1))
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap / 2
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_aimd_limiter():
+    limiter = AIMDLimiter(initial_limit=4, max_limit=10, latency_target=0.5)
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release(0.01)
+    assert 9 <= limiter.limit <= 10
+    # a burst of throttled responses in one round trip halves it once
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(0.01, overloaded=True)
+    assert limiter.decreases == 1
+    assert 4.5 <= limiter.limit <= 5
+    # so does latency above the target
+    limiter._last_decrease = float('-inf')
+    limiter.acquire()
+    limiter.release(5.0)
+    assert limiter.limit < 3
+
+
+def test_steady_error_rate_lowers_limit():
+    now = [0.0]
+
+    def run(errors_every, **options):
+        # fast responses, one round trip apart, every nth one an error
+        limiter = AIMDLimiter(initial_limit=16, max_limit=64, latency_target=1.0,
+                              clock=lambda: now[0], **options)
+        for i in range(1, 401):
+            limiter.acquire()
+            now[0] += 0.01
+            limiter.release(0.01, overloaded=errors_every and i % errors_every == 0)
+        return limiter
+
+    # one error in ten: the averaged rate sits above 5% and the limit comes all the way down
+    limiter = run(10)
+    assert 0.05 < limiter.error_rate < 0.15
+    assert limiter.limit == 1
+    # going by the individual errors alone it recovers in between
+    assert run(10, error_threshold=None).limit > 2
+    # an occasional error stays under the threshold and changes nothing
+    assert run(100).error_rate < 0.05
+    assert run(100).limit == run(100, error_threshold=None).limit
+
+    # and once the errors stop, the limit grows back
+    limiter = run(10)
+    for _ in range(200):
+        limiter.acquire()
+        now[0] += 0.01
+        limiter.release(0.01)
+    assert limiter.error_rate < 0.05 and limiter.limit > 5
+
+
+def test_concurrency_settles_at_the_upstream_limit():
+    # the server takes 3 requests at a time and throttles the rest
+    with MockAPIServer(num_posts=400, delay=0.02, max_concurrent=3, retry_after=0) as server:
+        http = RequestController(make_session(pool_size=16),
+                                 retry=RetryPolicy(max_attempts=10, base_delay=0.01),
+                                 limiter_options={'initial_limit': 16})
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'), http=http)
+        books = book_api.fetch_books_concurrently(pages=range(1, 41), page_size=10,
+                                                  max_workers=16, per_host_limit=16)
+        # nothing lost to throttling
+        assert len(books) == 400
+        assert server.throttled > 0
+        # and the limit came down to about what the server takes
+        assert http.limiter(server.url('posts')).limit <= 6
+        assert http.stats()[server.url('posts').split('/')[2]]['circuit'] == 'closed'
+    book_api.close()
+    cleanup()
+
+
+def test_circuit_breaker():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=lambda: now[0])
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    now[0] = 10
+    # one probe at a time once the timeout is up
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_open_circuit_fails_fast():
+    with MockAPIServer(faults=[500] * 10) as server:
+        http, waits = controller(retry=RetryPolicy(max_attempts=10, base_delay=0.01),
+                                 breaker_options={'failure_threshold': 3, 'reset_timeout': 60})
+        try:
+            http.get(server.url('users'))
+            assert False, "expected CircuitOpenError"
+        except CircuitOpenError as e:
+            # still a RequestException, so existing error handling catches it
+            assert isinstance(e, requests.RequestException)
+        assert len(server.hits) == 3
+        processor = StudentScoreProcessor(api_url=server.url('users'), http=http)
+        assert processor.fetch_scores() == []
+        assert len(server.hits) == 3
@@ -0,0 +1,69 @@
+# test_score_stats.py - columnar numpy stats vs the plain Python fallback
+
+import sys
+import os
+import random
+import statistics
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'StudentScore-API'))
+
+import numpy as np
+
+from score_stats import ScoreTable
+from student_scores_simple import StudentScoreProcessor, _summarize_python
+
+
+def make_students(count, seed=3):
+    rng = random.Random(seed)
+    return [{'name': f'Student {i}', 'score': rng.randint(60, 100)} for i in range(count)]
+
+
+def test_summary_matches_python():
+    students = make_students(1001)
+    scores = [student['score'] for student in students]
+    
+    summary = ScoreTable.from_students(students).summary(bins=8)
+    fallback = _summarize_python(scores, (25, 50, 75, 90, 99), 8)
+    
+    assert summary['count'] == 1001
+    assert summary['min'] == min(scores)
+    assert summary['max'] == max(scores)
+    assert abs(summary['mean'] - statistics.fmean(scores)) < 1e-9
+    assert abs(summary['std'] - statistics.pstdev(scores)) < 1e-9
+    assert summary['median'] == statistics.median(scores)
+    assert sum(summary['histogram']['counts']) == 1001
+    
+    for key in ('mean', 'std', 'median', 'p25', 'p75', 'p90', 'p99', 'min', 'max'):
+        assert abs(summary[key] - fallback[key]) < 1e-9, key
+    assert summary['histogram']['counts'] == fallback['histogram']['counts']
+
+
+def test_round_trip_and_edge_cases():
+    students = make_students(5)
+    table = ScoreTable.from_students(students)
+    assert len(table) == 5
+    assert table.to_students() == students
+    assert ScoreTable([], []).summary() is None
+    
+    same = ScoreTable(['a', 'b'], [80, 80]).summary(bins=4)
+    assert same['std'] == 0
+    assert same['histogram']['counts'] == _summarize_python([80, 80], (), 4)['histogram']['counts']
+
+
+def test_processor_summarize_large():
+    processor = StudentScoreProcessor()
+    # a million scores goes straight into the columnar store
+    table = ScoreTable([None] * 1_000_000, np.random.default_rng(1).integers(60, 101, 1_000_000))
+    summary = table.summary()
+    assert 60 <= summary['p25'] <= summary['median'] <= summary['p90'] <= 100
+    
+    assert processor.summarize([]) is None
+    students = make_students(50)
+    summary = processor.summarize(students)
+    processor.display_summary(students, summary['mean'], summary)
+
+
+if __name__ == "__main__":
+    test_summary_matches_python()
+    test_round_trip_and_edge_cases()
+    test_processor_summarize_large()
+    print("Score stats tests passed")
@@ -0,0 +1,134 @@
+# test_score_stream.py - online aggregator vs exact stats
+
+import sys
+import os
+import random
+import statistics
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'StudentScore-API'))
+
+from score_stream import StreamingScoreStats, QuantileSketch
+from student_scores_simple import StudentScoreProcessor, _percentile
+
+CHECKPOINT = "test_score_stream.json"
+
+
+def make_scores(count, seed=11):
+    rng = random.Random(seed)
+    return [rng.randint(0, 100) for _ in range(count)]
+
+
+def test_matches_exact_stats():
+    scores = make_scores(20000)
+    stats = StreamingScoreStats(bins=10)
+    for i in range(0, len(scores), 1000):
+        stats.update_batch(scores[i:i + 1000])
+    
+    assert stats.count == 20000
+    assert abs(stats.mean - statistics.fmean(scores)) < 1e-9
+    assert abs(stats.std - statistics.pstdev(scores)) < 1e-9
+    assert (stats.min, stats.max) == (min(scores), max(scores))
+    assert sum(stats.histogram) == 20000
+    
+    ordered = sorted(scores)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        exact = _percentile(ordered, q * 100)
+        # within the sketch's relative accuracy (+ one rank of slack)
+        assert abs(stats.quantile(q) - exact) <= 0.02 * exact + 1, q
+
+
+def test_merge_equals_single_pass():
+    scores = make_scores(9000)
+    whole = StreamingScoreStats()
+    whole.update_batch(scores)
+    
+    parts = [StreamingScoreStats() for _ in range(3)]
+    for i, part in enumerate(parts):
+        part.update_batch(scores[i::3])
+    merged = StreamingScoreStats()
+    for part in parts:
+        merged.merge(part)
+    
+    assert merged.count == whole.count
+    assert abs(merged.mean - whole.mean) < 1e-9
+    assert abs(merged.variance - whole.variance) < 1e-6
+    assert merged.histogram == whole.histogram
+    assert merged.summary()['p90'] == whole.summary()['p90']
+
+
+def test_checkpoint_round_trip():
+    stats = StreamingScoreStats(hist_min=60, hist_max=100, bins=4)
+    stats.update_batch([55, 60, 75, 99, 100, 120, 0])
+    stats.save(CHECKPOINT)
+    restored = StreamingScoreStats.load(CHECKPOINT)
+    os.remove(CHECKPOINT)
+    
+    assert restored.to_dict() == stats.to_dict()
+    assert restored.underflow == 2 and restored.overflow == 1
+    # resumed aggregator keeps going
+    restored.update(80)
+    assert restored.count == 8
+
+
+def test_numpy_input_checkpoints():
+    import numpy as np
+    stats = StreamingScoreStats()
+    stats.update_batch(np.array([70, 95, 61], dtype=np.int32))
+    stats.update(np.float32(88.5))
+    stats.update_batch(np.array([[1.5, 2.5]])[0])
+    assert type(stats.min) is float and type(stats.max) is int
+    stats.save(CHECKPOINT)
+    restored = StreamingScoreStats.load(CHECKPOINT)
+    os.remove(CHECKPOINT)
+    assert restored.to_dict() == stats.to_dict()
+    assert (restored.min, restored.max, restored.count) == (1.5, 95, 6)
+
+
+def test_sketch_stays_bounded_and_handles_signs():
+    sketch = QuantileSketch(relative_accuracy=0.05, max_buckets=50)
+    for value in range(-1000, 100000, 7):
+        sketch.add(value)
+    assert len(sketch.positive) + len(sketch.negative) <= 50
+    assert sketch.quantile(0) < 0
+    assert sketch.quantile(1) > 90000
+
+
+def test_sketch_collapses_mostly_negative_values():
+    values = list(range(-100000, 0, 7)) + [5, 50]
+    sketch = QuantileSketch(relative_accuracy=0.05, max_buckets=50)
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.positive) + len(sketch.negative) <= 50
+    assert sketch.count == len(values)
+    # the folding happens at the low end, the top stays accurate
+    assert abs(sketch.quantile(1) - 50) <= 50 * 0.05
+
+    # merging two big negative halves folds many buckets in one go
+    left = QuantileSketch(relative_accuracy=0.05, max_buckets=50)
+    right = QuantileSketch(relative_accuracy=0.05, max_buckets=50)
+    for value in values:
+        (left if value < -300 else right).add(value)
+    left.merge(right)
+    assert len(left.positive) + len(left.negative) <= 50
+    assert left.count == len(values)
+    assert abs(left.quantile(1) - 50) <= 50 * 0.05
+    assert QuantileSketch.from_dict(left.to_dict()).quantile(0.5) == left.quantile(0.5)
+
+
+def test_processor_aggregate_generator():
+    processor = StudentScoreProcessor()
+    feed = ({'name': f'S{i}', 'score': 60 + i % 41} for i in range(5000))
+    stats = processor.aggregate(feed)
+    stats = processor.aggregate([{'name': 'late', 'score': 100}], stats)
+    assert stats.count == 5001
+    assert stats.max == 100
+
+
+if __name__ == "__main__":
+    test_matches_exact_stats()
+    test_merge_equals_single_pass()
+    test_checkpoint_round_trip()
+    test_numpy_input_checkpoints()
+    test_sketch_stays_bounded_and_handles_signs()
+    test_sketch_collapses_mostly_negative_values()
+    test_processor_aggregate_generator()
+    print("Score stream tests passed")
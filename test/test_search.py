@@ -0,0 +1,160 @@
+# test_search.py - FTS5 search index kept in sync with the books table
+
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Book-API'))
+
+from book_api import BookAPI
+
+TEST_DB = "test_search_books.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+BOOKS = [
+    {'title': 'Dragon Fire', 'author': 'A', 'year': 2001,
+     'description': 'A dragon burns the village down. The dragon flies away.'},
+    {'title': 'Quiet Garden', 'author': 'B', 'year': 2002,
+     'description': 'Nothing much happens, though a dragon is mentioned once.'},
+    {'title': 'Sea Stories', 'author': 'C', 'year': 2003,
+     'description': 'Boats, fish and the open sea.'},
+]
+
+
+def titles(results):
+    return [hit['title'] for hit in results]
+
+
+def test_search_ranks_and_snippets():
+    cleanup()
+    book_api = BookAPI(TEST_DB, search=True)
+    assert book_api.search_enabled
+    book_api.store_books(BOOKS)
+    
+    results = book_api.search('dragon')
+    assert titles(results) == ['Dragon Fire', 'Quiet Garden']
+    assert results[0]['score'] <= results[1]['score']
+    assert '[dragon]' in results[0]['snippet'].lower()
+    
+    assert titles(book_api.search('dragon', limit=1, offset=1)) == ['Quiet Garden']
+    assert titles(book_api.search('boat*')) == ['Sea Stories']
+    assert book_api.search('"unbalanced') == []
+    book_api.close()
+    cleanup()
+
+
+def test_index_follows_replace_update_and_delete():
+    cleanup()
+    book_api = BookAPI(TEST_DB, search=True)
+    book_api.store_books(BOOKS)
+    
+    # INSERT OR REPLACE of the same title
+    book_api.store_books([{'title': 'Sea Stories', 'author': 'C', 'year': 2003,
+                           'description': 'Now about submarines.'}])
+    assert book_api.search('fish') == []
+    assert titles(book_api.search('submarines')) == ['Sea Stories']
+    
+    # in-place UPDATE from sync_books, then a delete via full snapshot
+    changed = dict(BOOKS[1], description='All about tulips.')
+    book_api.sync_books([BOOKS[0], changed], full_snapshot=True)
+    assert titles(book_api.search('dragon')) == ['Dragon Fire']
+    assert titles(book_api.search('tulips')) == ['Quiet Garden']
+    assert book_api.search('submarines') == []
+    
+    with book_api.db.reader() as conn:
+        conn.execute("INSERT INTO books_fts (books_fts) VALUES ('integrity-check')")
+    book_api.close()
+    cleanup()
+
+
+def test_existing_database_gets_indexed():
+    cleanup()
+    conn = sqlite3.connect(TEST_DB)
+    conn.execute("CREATE TABLE books (title TEXT PRIMARY KEY, author TEXT, year INTEGER, "
+                 "description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO books (title, description) VALUES ('Old Book', 'written before search')")
+    conn.commit()
+    conn.close()
+    
+    book_api = BookAPI(TEST_DB, search=True)
+    assert titles(book_api.search('search')) == ['Old Book']
+    book_api.rebuild_search_index()
+    assert titles(book_api.search('old')) == ['Old Book']
+    book_api.close()
+    cleanup()
+
+
+def search_triggers(book_api):
+    with book_api.db.reader() as conn:
+        return {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'books_fts%'")}
+
+
+def test_search_is_opt_in():
+    cleanup()
+    with BookAPI(TEST_DB) as book_api:
+        assert not book_api.search_enabled
+        book_api.store_books(BOOKS)
+        assert book_api.search('dragon') == []
+        with book_api.db.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'books_fts%'").fetchone()[0] == 0
+    
+    # turning it on indexes what's there; after that the index is kept in
+    # step even by a BookAPI that didn't ask for it
+    with BookAPI(TEST_DB, search=True) as book_api:
+        assert titles(book_api.search('dragon')) == ['Dragon Fire', 'Quiet Garden']
+    with BookAPI(TEST_DB) as book_api:
+        assert book_api.search_enabled
+        book_api.store_books([dict(BOOKS[2], description='Now about submarines.')])
+        assert titles(book_api.search('submarines')) == ['Sea Stories']
+    cleanup()
+
+
+def test_bulk_store_can_defer_the_index():
+    cleanup()
+    book_api = BookAPI(TEST_DB, search=True)
+    triggers = search_triggers(book_api)
+    assert len(triggers) == 3
+    book_api.store_books(BOOKS)
+    
+    more = [{'title': f'Book {i}', 'author': 'D', 'year': 2004, 'description': f'volume {i} of the saga'}
+            for i in range(50)]
+    result = book_api.store_books_bulk(more + [dict(BOOKS[2], description='Now about submarines.')],
+                                       chunk_size=20, defer_search=True)
+    assert result['stored'] == 51
+    assert search_triggers(book_api) == triggers
+    assert len(book_api.search('saga', limit=100)) == 50
+    assert titles(book_api.search('submarines')) == ['Sea Stories']
+    assert book_api.search('fish') == []
+    
+    # a failed transaction puts the triggers back with it
+    def broken():
+        yield more[0]
+        raise RuntimeError("feed died")
+    try:
+        book_api.store_books_bulk(broken(), defer_search=True)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    assert search_triggers(book_api) == triggers
+    book_api.store_books([{'title': 'Late Arrival', 'author': 'E', 'year': 2005, 'description': 'comet'}])
+    assert titles(book_api.search('comet')) == ['Late Arrival']
+    
+    with book_api.db.reader() as conn:
+        conn.execute("INSERT INTO books_fts (books_fts) VALUES ('integrity-check')")
+    book_api.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_search_ranks_and_snippets()
+    test_index_follows_replace_update_and_delete()
+    test_existing_database_gets_indexed()
+    test_search_is_opt_in()
+    test_bulk_store_can_defer_the_index()
+    print("Search tests passed")
@@ -0,0 +1,182 @@
+# test_snapshot.py - columnar snapshot export, the mmap loader and
+# incremental refresh
+
+import sys
+import os
+import sqlite3
+import numpy as np
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'Book-API'))
+sys.path.append(os.path.join(ROOT, 'CSV-Import'))
+
+from snapshot import Snapshot, export_snapshot, NULL_INT, NULL_CODE
+from book_api import BookAPI
+from csv_import import CSVImporter
+
+BOOK_DB = "test_snapshot_books.db"
+USERS_DB = "test_snapshot_users.db"
+SNAPSHOT = "test_snapshot.dat"
+FULL_SNAPSHOT = "test_snapshot_full.dat"
+
+
+def cleanup():
+    for db in (BOOK_DB, USERS_DB):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db + suffix):
+                os.remove(db + suffix)
+    for path in (SNAPSHOT, FULL_SNAPSHOT):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def make_books(count, start=0):
+    return [{'title': f'Book {i}', 'author': f'Author {i % 7}',
+             'year': None if i % 11 == 0 else 1950 + i % 70, 'description': f'About book {i}'}
+            for i in range(start, start + count)]
+
+
+def add_users(importer, start, count):
+    with importer.db.writer() as conn:
+        conn.executemany("INSERT INTO users (name, email) VALUES (?, ?)",
+                         [(f'User {i}', f'user{i}@example.com') for i in range(start, start + count)])
+
+
+def snapshot_rows(snap, table):
+    # decode every column back into sorted row tuples
+    columns = []
+    for name in snap.columns(table):
+        if snap._column_meta(table, name)['kind'] == 'string':
+            columns.append(snap.strings(table, name))
+        else:
+            columns.append(snap.column(table, name).tolist())
+    return sorted(zip(*columns), key=repr)
+
+
+def test_export_and_load():
+    cleanup()
+    with BookAPI(BOOK_DB) as book_api, CSVImporter(USERS_DB) as importer:
+        book_api.store_books(make_books(200))
+        add_users(importer, 0, 50)
+        books = book_api.get_all_books()
+        users = importer.get_all_users()
+
+    summary = export_snapshot(SNAPSHOT, books_db=BOOK_DB, users_db=USERS_DB)
+    assert summary['books'] == {'rows': 200, 'read': 200, 'mode': 'full'}
+    assert summary['users'] == {'rows': 50, 'read': 50, 'mode': 'full'}
+
+    with Snapshot(SNAPSHOT) as snap:
+        assert sorted(snap.tables) == ['books', 'users']
+        years = snap.column('books', 'year')
+        # a read-only view into the mapped file, not a copy
+        assert isinstance(years, np.ndarray) and years.dtype == np.int64
+        assert not years.flags.owndata and not years.flags.writeable
+        titles = snap.strings('books', 'title')
+        by_title = {book['title']: book for book in books}
+        for title, year in zip(titles, years.tolist()):
+            expected = by_title[title]['year']
+            assert year == (NULL_INT if expected is None else expected)
+
+        # filter on a string column through its codes, no decoding
+        authors = snap.column('books', 'author')
+        assert len(snap.dictionary('books', 'author')) == 7
+        code = snap.code('books', 'author', 'Author 3')
+        assert int((authors == code).sum()) == sum(book['author'] == 'Author 3' for book in books)
+        assert snap.code('books', 'author', 'Nobody') is None
+        assert NULL_CODE not in authors
+
+        assert snap.column('users', 'id').tolist() == sorted(user['id'] for user in users)
+        assert sorted(snap.strings('users', 'email')) == sorted(user['email'] for user in users)
+        assert (snap.column('users', 'created_at') > 0).all()
+    cleanup()
+
+
+def test_incremental_refresh_matches_full_export():
+    cleanup()
+    book_api = BookAPI(BOOK_DB, change_log=True)
+    importer = CSVImporter(USERS_DB)
+    book_api.store_books(make_books(300))
+    add_users(importer, 0, 100)
+    export_snapshot(SNAPSHOT, books_db=BOOK_DB, users_db=USERS_DB)
+
+    # updates, inserts, replaces and deletes on books; appends on users
+    changed = make_books(300)
+    changed[5]['description'] = 'rewritten'
+    changed[6]['author'] = 'Someone New'
+    changed += make_books(20, start=300)
+    del changed[10:15]
+    book_api.sync_books(changed, full_snapshot=True)
+    book_api.store_books([dict(make_books(1, start=42)[0], year=2024)])
+    add_users(importer, 100, 25)
+
+    snap = Snapshot(SNAPSHOT)
+    old_years = snap.column('books', 'year')
+    summary = snap.refresh()
+    assert summary['books']['mode'] == 'incremental'
+    # 2 updated + 20 new + 5 deleted + 1 replaced - the deleted ones aren't read back
+    assert summary['books']['read'] == 23
+    assert summary['books']['rows'] == 315
+    assert summary['users'] == {'rows': 125, 'read': 25, 'mode': 'incremental'}
+    # arrays from before the refresh still read the old file
+    assert len(old_years) == 300
+
+    export_snapshot(FULL_SNAPSHOT, books_db=BOOK_DB, users_db=USERS_DB)
+    with Snapshot(FULL_SNAPSHOT) as full:
+        for table in ('books', 'users'):
+            assert snapshot_rows(snap, table) == snapshot_rows(full, table), table
+    assert 'Someone New' in snap.dictionary('books', 'author')
+
+    # nothing changed since - nothing is read
+    summary = snap.refresh()
+    assert summary['books'] == {'rows': 315, 'read': 0, 'mode': 'unchanged'}
+    assert summary['users']['mode'] == 'unchanged'
+    snap.close()
+
+    # too many changes at once -> a plain full export
+    book_api.store_books(make_books(400))
+    assert export_snapshot(SNAPSHOT, books_db=BOOK_DB)['books']['mode'] == 'full'
+    book_api.close()
+    importer.close()
+    cleanup()
+
+
+def schema(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+    conn.close()
+    return rows
+
+
+def test_export_leaves_the_schema_alone():
+    cleanup()
+    with BookAPI(BOOK_DB) as book_api:
+        assert not book_api.change_log_enabled
+        book_api.store_books(make_books(50))
+    before = schema(BOOK_DB)
+    assert export_snapshot(SNAPSHOT, books_db=BOOK_DB)['books'] == {'rows': 50, 'read': 50, 'mode': 'full'}
+    assert schema(BOOK_DB) == before
+
+    # no log to refresh from, so every export reads the whole table
+    with BookAPI(BOOK_DB) as book_api:
+        book_api.store_books([dict(make_books(1)[0], author='Someone New')] + make_books(5, start=50))
+    with Snapshot(SNAPSHOT) as snap:
+        assert snap.refresh()['books'] == {'rows': 55, 'read': 55, 'mode': 'full'}
+        assert 'Someone New' in snap.dictionary('books', 'author')
+    assert schema(BOOK_DB) == before
+    cleanup()
+
+
+def test_rejects_other_files():
+    cleanup()
+    with open(SNAPSHOT, 'wb') as f:
+        f.write(b'not a snapshot at all, just some bytes')
+    try:
+        Snapshot(SNAPSHOT)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    # a bad file in the way is simply replaced by a full export
+    with BookAPI(BOOK_DB) as book_api:
+        book_api.store_books(make_books(10))
+    assert export_snapshot(SNAPSHOT, books_db=BOOK_DB)['books']['mode'] == 'full'
+    cleanup()
@@ -0,0 +1,58 @@
+# test_startup.py - the student score tools should start fast and leave
+# numpy/matplotlib alone until a chart or the vectorized stats need them
+
+import sys
+import os
+import json
+import subprocess
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds allowed for importing a tool module in a fresh interpreter.
+# the whole plotting stack alone is well over this, so a heavy import
+# sneaking back in at module level fails here
+STARTUP_BUDGET = float(os.environ.get('STARTUP_BUDGET_SECONDS', '0.5'))
+
+HEAVY_MODULES = ('numpy', 'matplotlib')
+
+MEASURE = """
+import sys, time, json
+sys.path.insert(0, {path!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module):
+    # best of three fresh interpreters, so one slow disk read doesn't fail the run
+    runs = []
+    for _ in range(3):
+        code = MEASURE.format(path=os.path.join(ROOT, 'StudentScore-API'), module=module, heavy=HEAVY_MODULES)
+        output = subprocess.run([sys.executable, '-c', code], check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return min(runs, key=lambda run: run['seconds'])
+
+
+def test_student_scores_startup():
+    result = measure_import('student_scores')
+    assert result['loaded'] == []
+    assert result['seconds'] < STARTUP_BUDGET, f"import took {result['seconds']:.3f}s"
+
+
+def test_student_scores_simple_startup():
+    result = measure_import('student_scores_simple')
+    assert result['loaded'] == []
+    assert result['seconds'] < STARTUP_BUDGET, f"import took {result['seconds']:.3f}s"
+
+
+def test_summary_loads_numpy_on_demand():
+    code = (f"import sys; sys.path.insert(0, {os.path.join(ROOT, 'StudentScore-API')!r})\n"
+            "import student_scores\n"
+            "p = student_scores.StudentScoreProcessor()\n"
+            "s = p.summarize([{'name': 'a', 'score': 70}, {'name': 'b', 'score': 90}])\n"
+            "print(s['mean'], 'numpy' in sys.modules, 'matplotlib' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True).stdout
+    assert output.split() == ['80.0', 'True', 'False']
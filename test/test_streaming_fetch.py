@@ -0,0 +1,139 @@
+# test_streaming_fetch.py - paginated/streaming fetch against the local mock API
+
+import sys
+import os
+import time
+import types
+import itertools
+import threading
+import requests
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Book-API'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from book_api import BookAPI, _prefetched
+from mock_api import MockAPIServer, make_posts
+
+TEST_DB = "test_streaming_books.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def test_pagination_modes():
+    cleanup()
+    with MockAPIServer(num_posts=250) as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'))
+        
+        for mode in ('page', 'offset', 'cursor'):
+            books = book_api.iter_books_from_api(page_size=40, pagination=mode)
+            assert isinstance(books, types.GeneratorType)
+            titles = [book['title'] for book in books]
+            assert len(titles) == 250, mode
+            assert titles[0] == 'post title 1'
+            assert titles[-1] == 'post title 250'
+        
+        limited = list(book_api.iter_books_from_api(page_size=40, max_pages=2))
+        assert len(limited) == 80
+    book_api.close()
+    cleanup()
+
+
+def test_ingest_from_api():
+    cleanup()
+    with MockAPIServer(num_posts=1234) as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'))
+        result = book_api.ingest_from_api(page_size=100, chunk_size=300)
+        assert result['stored'] == 1234
+        assert result['failed'] == 0
+        # 12 full pages + 1 short one
+        assert len(server.hits) == 13
+    assert len(book_api.get_all_books()) == 1234
+    book_api.close()
+    cleanup()
+
+
+def test_stream_raises_api_errors():
+    cleanup()
+    with MockAPIServer() as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('missing'))
+        try:
+            list(book_api.iter_books_from_api())
+            assert False, "expected RequestException"
+        except requests.RequestException:
+            pass
+    book_api.close()
+    cleanup()
+
+
+def test_failed_page_stores_and_deletes_nothing():
+    cleanup()
+    with MockAPIServer(num_posts=250) as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'))
+        assert book_api.ingest_from_api(page_size=100)['stored'] == 250
+        
+        # page 2 of 3 fails after its retries
+        get = book_api.http.get
+        def flaky_get(url, params=None, **kwargs):
+            if params and params.get('_page') == 2:
+                raise requests.ConnectionError("connection reset")
+            return get(url, params=params, **kwargs)
+        book_api.http.get = flaky_get
+        server.resources['posts'] = [dict(post, body='rewritten') for post in make_posts(300)]
+        
+        for consume in (lambda: book_api.ingest_from_api(page_size=100),
+                        lambda: book_api.ingest_from_api(page_size=100, prefetch=False),
+                        lambda: book_api.sync_books(book_api.iter_books_from_api(page_size=100),
+                                                    full_snapshot=True)):
+            try:
+                consume()
+                assert False, "expected RequestException"
+            except requests.RequestException:
+                pass
+            # the first page's changes aren't committed, nothing after it is deleted
+            assert book_api.count_books() == 250
+            assert not any(book['description'] == 'rewritten' for book in book_api.iter_books())
+    book_api.close()
+    cleanup()
+
+
+def test_prefetch_raises_producer_errors():
+    cleanup()
+    with MockAPIServer() as server:
+        book_api = BookAPI(TEST_DB, api_url=server.url('posts'))
+        for prefetch in (False, True):
+            try:
+                book_api.ingest_from_api(pagination='bogus', prefetch=prefetch)
+                assert False, "expected ValueError"
+            except ValueError:
+                pass
+    book_api.close()
+    cleanup()
+
+
+def prefetch_threads():
+    return [t for t in threading.enumerate() if t.name == 'book-prefetch']
+
+
+def test_abandoned_prefetch_stops_producer():
+    # an endless producer and a consumer that walks away after a few items
+    items = _prefetched(itertools.count(), maxsize=4)
+    assert [next(items) for _ in range(3)] == [0, 1, 2]
+    assert len(prefetch_threads()) == 1
+    items.close()
+    deadline = time.monotonic() + 2
+    while prefetch_threads() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert prefetch_threads() == []
+
+
+if __name__ == "__main__":
+    test_pagination_modes()
+    test_ingest_from_api()
+    test_stream_raises_api_errors()
+    test_failed_page_stores_and_deletes_nothing()
+    test_prefetch_raises_producer_errors()
+    test_abandoned_prefetch_stops_producer()
+    print("Streaming fetch tests passed")
@@ -3,7 +3,7 @@
 
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'StudentScore-API'))
 
 from student_scores_simple import StudentScoreProcessor
 
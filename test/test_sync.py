@@ -0,0 +1,133 @@
+# test_sync.py - checks the incremental sync mode in book_api.py
+
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Book-API'))
+
+from book_api import BookAPI
+
+TEST_DB = "test_sync_books.db"
+
+
+def cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DB + suffix):
+            os.remove(TEST_DB + suffix)
+
+
+def make_books(count, changed=()):
+    return [
+        {
+            'title': f'Book {i}',
+            'author': f'Author {i % 3}',
+            'year': 2000 + i,
+            'description': 'changed' if i in changed else f'Description {i}'
+        }
+        for i in range(count)
+    ]
+
+
+def test_sync_only_writes_changes():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    
+    counts = book_api.sync_books(make_books(50))
+    assert counts['inserted'] == 50
+    assert counts['updated'] == counts['unchanged'] == counts['deleted'] == 0
+    
+    with book_api.db.writer() as conn:
+        conn.execute("UPDATE books SET created_at = '2001-01-01 00:00:00'")
+    
+    # second run with two changed books and five new ones
+    counts = book_api.sync_books(make_books(55, changed={3, 7}), chunk_size=20)
+    assert counts == {'inserted': 5, 'updated': 2, 'unchanged': 48, 'deleted': 0, 'failed': 0}
+    
+    books = {book['title']: book for book in book_api.get_all_books()}
+    assert books['Book 3']['description'] == 'changed'
+    # updated in place, not deleted and re-inserted
+    assert books['Book 3']['created_at'] == '2001-01-01 00:00:00'
+    
+    book_api.close()
+    cleanup()
+
+
+def test_unchanged_sync_does_not_write():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    book_api.sync_books(make_books(20))
+    
+    with book_api.db.writer() as conn:
+        before = conn.total_changes
+    counts = book_api.sync_books(make_books(20))
+    with book_api.db.writer() as conn:
+        after = conn.total_changes
+    
+    assert counts['unchanged'] == 20
+    assert before == after
+    book_api.close()
+    cleanup()
+
+
+def test_full_snapshot_deletes_missing_rows():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    book_api.sync_books(make_books(10))
+    
+    snapshot = make_books(10)[2:]
+    snapshot.append({'title': None, 'author': 'nobody'})
+    counts = book_api.sync_books(snapshot, full_snapshot=True)
+    assert counts == {'inserted': 0, 'updated': 0, 'unchanged': 8, 'deleted': 2, 'failed': 1}
+    assert len(book_api.get_all_books()) == 8
+    book_api.close()
+    cleanup()
+
+
+def test_store_books_sets_hash_and_old_db_is_migrated():
+    cleanup()
+    # database from before the content_hash column existed
+    conn = sqlite3.connect(TEST_DB)
+    conn.execute("""
+        CREATE TABLE books (
+            title TEXT PRIMARY KEY, author TEXT, year INTEGER,
+            description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    conn.close()
+    
+    book_api = BookAPI(TEST_DB)
+    book_api.store_books(make_books(5))
+    counts = book_api.sync_books(make_books(5))
+    assert counts['unchanged'] == 5
+    book_api.close()
+    cleanup()
+
+
+def test_full_snapshot_keeps_rows_of_invalid_records():
+    cleanup()
+    book_api = BookAPI(TEST_DB)
+    book_api.sync_books([{'title': 'Keep', 'author': 'A', 'year': 2000, 'description': 'x'},
+                         {'title': 'Gone', 'author': 'B', 'year': 2001, 'description': 'y'}])
+    
+    # 'Keep' is still in the feed, just broken this time - its row stays
+    counts = book_api.sync_books([{'title': 'Keep', 'author': 'A', 'year': object()}],
+                                 full_snapshot=True)
+    assert counts == {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 1, 'failed': 1}
+    assert [book['title'] for book in book_api.get_all_books()] == ['Keep']
+    
+    # a record we can't get a title out of at all: delete nothing
+    counts = book_api.sync_books(['not a book'], full_snapshot=True)
+    assert counts['failed'] == 1 and counts['deleted'] == 0
+    assert book_api.count_books() == 1
+    book_api.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    test_sync_only_writes_changes()
+    test_unchanged_sync_does_not_write()
+    test_full_snapshot_deletes_missing_rows()
+    test_full_snapshot_keeps_rows_of_invalid_records()
+    test_store_books_sets_hash_and_old_db_is_migrated()
+    print("Sync tests passed")